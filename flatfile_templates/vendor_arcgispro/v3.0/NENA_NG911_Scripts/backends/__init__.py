@@ -0,0 +1,38 @@
+import importlib
+
+from . import arcgis
+from . import geopackage
+from . import upgrade
+from .base import FieldState, TemplateBackend, UnsupportedOperation, WorkspaceState
+
+# arcgis modules
+ArcpyBackend = arcgis.ArcpyBackend
+
+# geopackage modules
+WriteGeoPackage = geopackage.write_geopackage
+
+# upgrade modules
+PlanUpgrade = upgrade.plan_upgrade
+UpgradeWorkspace = upgrade.upgrade_workspace
+UpgradeGeoPackage = upgrade.upgrade_geopackage
+FormatUpgradeReport = upgrade.format_report
+
+# Aliases of the modules run as `python -m backends.<module>`, imported on first
+# use: importing them with the package would load them twice when they are run
+LAZY_ALIASES = {
+    # plan modules
+    'CompilePlan': ('plan', 'compile_plan'),
+    'LoadCostModel': ('plan', 'load_cost_model'),
+    'SaveCostModel': ('plan', 'save_cost_model'),
+    # recording modules
+    'RecordingBackend': ('recording', 'RecordingBackend')
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_ALIASES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module_name, attribute = LAZY_ALIASES[name]
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), attribute)
+    globals()[name] = value
+    return value
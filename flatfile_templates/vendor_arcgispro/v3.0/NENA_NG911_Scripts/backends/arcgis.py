@@ -0,0 +1,330 @@
+"""
+| Name:      arcgis.py
+| Purpose:   Writes NENA template domains and feature classes to a File
+|            geodatabase with ArcPy geoprocessing tools. Fields are added to
+|            a feature class with AddFields and coded values are loaded into a
+|            domain with TableToDomain, instead of one AddField or
+|            AddCodedValueToDomain call for each field and coded value. The
+|            few values of small domains are added directly, TableToDomain
+|            then takes more calls than it saves.
+|
+| Notes:     arcpy is imported when an ArcpyBackend is created rather than
+|            when this module is imported, so the batching can be exercised
+|            on any operating system with backends.recording.
+"""
+
+import os
+
+from .base import FieldState, TemplateBackend, WorkspaceState
+
+# ==============================================================================
+# ARCGIS Constants
+# ==============================================================================
+# Data Model Schema data types to Esri data types
+ESRI_FIELD_TYPES = {
+    'TEXT': 'TEXT',
+    'DATETIME': 'DATE',
+    'INTEGER': 'LONG',
+    'REAL': 'DOUBLE'
+}
+
+# Scratch table used to load coded values with TableToDomain
+DOMAIN_TABLE_WORKSPACE = 'memory'
+DOMAIN_CODE_FIELD = 'Code'
+DOMAIN_DESCRIPTION_FIELD = 'Description'
+
+# Coded values from which TableToDomain (CreateTable, AddFields, InsertCursor,
+# TableToDomain and Delete) takes fewer calls than AddCodedValueToDomain
+DOMAIN_TABLE_MIN_VALUES = 6
+
+
+def esri_field_type(field_type):
+    """ Converts a Data Model Schema data type to the Esri equivalent
+    :param field_type Schema data type [TEXT | DATETIME | INTEGER | REAL]
+    :returns:         Esri data type
+    """
+    if field_type not in ESRI_FIELD_TYPES:
+        raise ValueError(f'{field_type} not recognized domain data type.')
+    return ESRI_FIELD_TYPES[field_type]
+
+
+def field_batches(fields, nullable_only=False):
+    """ Groups fields into AddFields batches while keeping the field order.
+        AddFields cannot set nullability or the required flag, so fields
+        that are not nullable or are required are added with AddField.
+    :param fields         Sequence of FieldSpec objects
+    :param nullable_only  Add every field as nullable, e.g. to a table
+                          that already has rows
+    :returns:             List of (batched, fields) tuples
+    """
+    batches = []
+    for field in fields:
+        batched = nullable_only or (field.is_nullable and not field.is_required)
+        if batches and batches[-1][0] == batched:
+            batches[-1][1].append(field)
+        else:
+            batches.append((batched, [field]))
+    return batches
+
+
+class ArcpyBackend(TemplateBackend):
+    """ Writes NENA template layers and domains to a File geodatabase """
+
+    def __init__(self, workspace, spatial_reference, editor_tracking=True, arcpy_module=None):
+        if arcpy_module is None:
+            import arcpy as arcpy_module
+        self.arcpy = arcpy_module
+        self.workspace = workspace
+        self.spatial_reference = spatial_reference
+        self.editor_tracking = editor_tracking
+
+    def create_domain(self, domain):
+        """ Creates a domain, loading all of its coded values with one
+            TableToDomain call
+        :param domain     Domain object
+        :returns:         Number of domain values written
+        """
+        management = self.arcpy.management
+        field_type = esri_field_type(domain.field_type)
+
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-domain.htm
+        management.CreateDomain(
+            in_workspace=self.workspace,
+            domain_name=domain.name,
+            domain_description=domain.description,
+            field_type=field_type,
+            domain_type=domain.domain_type
+        )
+        if not domain.values:
+            return 0
+
+        if domain.is_coded:
+            return self.load_coded_values(domain, sorted(domain.values.items()), update_option='REPLACE')
+
+        if domain.is_range:
+            # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/set-value-for-range-domain.htm
+            management.SetValueForRangeDomain(
+                in_workspace=self.workspace,
+                domain_name=domain.name,
+                min_value=domain.min_value,
+                max_value=domain.max_value
+            )
+            return 1
+
+        raise ValueError('Could not determine domain type.')
+
+    def load_coded_values(self, domain, values, update_option):
+        """ Loads coded values into a domain with a single TableToDomain call,
+            or one AddCodedValueToDomain call per value below
+            DOMAIN_TABLE_MIN_VALUES values
+        :param domain         Domain object
+        :param values         Sorted list of (code, description) tuples
+        :param update_option  TableToDomain update option [APPEND | REPLACE]
+        :returns:             Number of coded values written
+        """
+        management = self.arcpy.management
+        if len(values) < DOMAIN_TABLE_MIN_VALUES:
+            for code, description in values:
+                # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-coded-value-to-domain.htm
+                management.AddCodedValueToDomain(
+                    in_workspace=self.workspace,
+                    domain_name=domain.name,
+                    code=code,
+                    code_description=description
+                )
+            return len(values)
+
+        field_type = esri_field_type(domain.field_type)
+        table = os.path.join(DOMAIN_TABLE_WORKSPACE, f'{domain.name}_values')
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-table.htm
+        management.CreateTable(
+            out_path=DOMAIN_TABLE_WORKSPACE,
+            out_name=f'{domain.name}_values'
+        )
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-fields.htm
+        management.AddFields(
+            in_table=table,
+            field_description=[
+                [DOMAIN_CODE_FIELD, field_type, DOMAIN_CODE_FIELD,
+                 max(len(str(code)) for code, _ in values) if field_type == 'TEXT' else '', '', ''],
+                [DOMAIN_DESCRIPTION_FIELD, 'TEXT', DOMAIN_DESCRIPTION_FIELD,
+                 max(len(str(description)) for _, description in values), '', '']
+            ]
+        )
+        # https://pro.arcgis.com/en/pro-app/latest/arcpy/data-access/insertcursor-class.htm
+        with self.arcpy.da.InsertCursor(table, [DOMAIN_CODE_FIELD, DOMAIN_DESCRIPTION_FIELD]) as cursor:
+            for value in values:
+                cursor.insertRow(value)
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/table-to-domain.htm
+        management.TableToDomain(
+            in_table=table,
+            code_field=DOMAIN_CODE_FIELD,
+            description_field=DOMAIN_DESCRIPTION_FIELD,
+            in_workspace=self.workspace,
+            domain_name=domain.name,
+            domain_description=domain.description,
+            update_option=update_option
+        )
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/delete.htm
+        management.Delete(table)
+        return len(values)
+
+    def create_feature_class(self, layer, **kwargs):
+        """ Creates a feature class, adding consecutive nullable fields and
+            their default values with one AddFields call
+        :param layer      LayerPlan object
+        :returns:         n/a
+        """
+        management = self.arcpy.management
+        fc = layer.feature_class
+        fc_path = os.path.join(self.workspace, fc.name)
+
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-feature-class.htm
+        management.CreateFeatureclass(
+            out_path=self.workspace,
+            out_name=fc.name,
+            geometry_type=fc.geometry_type,
+            has_m="Yes" if fc.has_m else "No",
+            has_z="Yes" if fc.has_z else "No",
+            spatial_reference=self.spatial_reference,
+            out_alias=fc.alias
+        )
+
+        self.write_fields(fc_path, layer.fields, dict(layer.defaults))
+
+        if self.editor_tracking and 'DateUpdate' in fc.fields_by_name:
+            # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/enable-editor-tracking.htm
+            management.EnableEditorTracking(
+                in_dataset=fc_path,
+                last_edit_date_field="DateUpdate",
+                record_dates_in='UTC'
+            )
+
+    def describe(self):
+        """ Describes the domains, feature classes and fields of the File
+            geodatabase
+        :returns:         WorkspaceState object
+        """
+        arcpy = self.arcpy
+        state = WorkspaceState()
+        # https://pro.arcgis.com/en/pro-app/latest/arcpy/data-access/listdomains.htm
+        for domain in arcpy.da.ListDomains(self.workspace):
+            if domain.domainType == 'CodedValue':
+                state.domains[domain.name] = frozenset(str(code) for code in domain.codedValues)
+            else:
+                state.domains[domain.name] = None
+
+        arcpy.env.workspace = self.workspace
+        for name in arcpy.ListFeatureClasses() or []:
+            fc_path = os.path.join(self.workspace, name)
+            # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/listfields.htm
+            state.feature_classes[name] = {
+                field.name: FieldState(field.name, domain=field.domain, default=field.defaultValue)
+                for field in arcpy.ListFields(fc_path)
+            }
+            # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/get-count.htm
+            state.rows[name] = int(arcpy.management.GetCount(fc_path)[0])
+            if arcpy.metadata.Metadata(fc_path).title:
+                state.metadata.add(name)
+        return state
+
+    def add_coded_values(self, domain, codes):
+        """ Appends missing coded values with load_coded_values()
+        :param domain     Domain object
+        :param codes      Codes of domain.values to add
+        :returns:         Number of coded values written
+        """
+        return self.load_coded_values(domain, [(code, domain.values[code]) for code in codes], update_option='APPEND')
+
+    def add_fields(self, layer, fields, **kwargs):
+        """ Adds fields to an existing feature class. Fields are added as
+            nullable when the feature class already has rows.
+        :param layer      LayerPlan object
+        :param fields     FieldSpec objects to add
+        :returns:         Description of the added fields
+        """
+        fc_path = os.path.join(self.workspace, layer.name)
+        rows = int(self.arcpy.management.GetCount(fc_path)[0])
+        self.write_fields(fc_path, fields, dict(layer.defaults), nullable_only=rows > 0)
+        detail = ', '.join(field.name for field in fields)
+        if rows:
+            detail += f' (added as nullable, the feature class has {rows} rows)'
+        return detail
+
+    def assign_default(self, layer, field_name, default_value):
+        """ Assigns a default value to an existing field """
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/assign-default-to-field.htm
+        self.arcpy.management.AssignDefaultToField(
+            in_table=os.path.join(self.workspace, layer.name),
+            field_name=field_name,
+            default_value=default_value
+        )
+        return default_value
+
+    def assign_domain(self, layer, field_name, domain_name):
+        """ Assigns a domain to an existing field """
+        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/assign-domain-to-field.htm
+        self.arcpy.management.AssignDomainToField(
+            in_table=os.path.join(self.workspace, layer.name),
+            field_name=field_name,
+            domain_name=domain_name
+        )
+        return domain_name
+
+    def set_metadata(self, layer, **kwargs):
+        """ Writes the feature class title, summary, description and tags """
+        fc = layer.feature_class
+        # https://pro.arcgis.com/en/pro-app/latest/arcpy/metadata/metadata-class.htm
+        fc_md = self.arcpy.metadata.Metadata(os.path.join(self.workspace, fc.name))
+        fc_md.title = fc.alias
+        fc_md.summary = fc.description
+        fc_md.description = fc.description
+        fc_md.tags = ", ".join(fc.keywords)
+        fc_md.save()
+        return fc.alias
+
+    def write_fields(self, fc_path, fields, defaults, nullable_only=False):
+        """ Adds fields and their default values to a feature class, adding
+            consecutive nullable fields with one AddFields call
+        :param fc_path        Path of the feature class
+        :param fields         FieldSpec objects to add
+        :param defaults       Dictionary of default values by field name
+        :param nullable_only  Add every field as nullable
+        :returns:             n/a
+        """
+        management = self.arcpy.management
+        for batched, fields in field_batches(fields, nullable_only=nullable_only):
+            if batched:
+                # Field precision and scale are ignored by File geodatabases
+                # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-fields.htm
+                management.AddFields(
+                    in_table=fc_path,
+                    field_description=[
+                        [field.name, esri_field_type(field.field_type), field.alias,
+                         field.length or '', defaults.get(field.name, ''), field.domain]
+                        for field in fields
+                    ]
+                )
+                continue
+
+            for field in fields:
+                # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-field.htm
+                management.AddField(
+                    in_table=fc_path,
+                    field_name=field.name,
+                    field_type=esri_field_type(field.field_type),
+                    field_precision=field.precision,
+                    field_scale=field.scale,
+                    field_length=field.length,
+                    field_alias=field.alias,
+                    field_is_nullable=field.is_nullable,
+                    field_is_required=field.is_required,
+                    field_domain=field.domain
+                )
+                if field.name in defaults:
+                    # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/assign-default-to-field.htm
+                    management.AssignDefaultToField(
+                        in_table=fc_path,
+                        field_name=field.name,
+                        default_value=defaults[field.name]
+                    )
@@ -0,0 +1,153 @@
+"""
+| Name:      base.py
+| Purpose:   Interface shared by the template backends. A backend receives
+|            the resolved schema objects (Domain and LayerPlan) and is free to
+|            batch the underlying operations, so create_ng911_template.py and
+|            create_ng911_gpkg.py do not issue per-field or per-coded-value
+|            calls themselves. Backends also describe an existing workspace
+|            and apply individual changes to it, which backends.upgrade uses
+|            to upgrade a template in place.
+"""
+
+# ==============================================================================
+# BASE Constants
+# ==============================================================================
+# SQL reserved words that ArcGIS renames with a trailing underscore when it
+# creates a field, e.g. the Row field of the address layers is written as Row_
+ESRI_RESERVED_WORDS = frozenset([
+    'ADD', 'ALTER', 'AND', 'AS', 'ASC', 'BETWEEN', 'BY', 'COLUMN', 'CREATE', 'DATE', 'DELETE', 'DESC', 'DISTINCT',
+    'DROP', 'EXISTS', 'FOR', 'FROM', 'GROUP', 'HAVING', 'IN', 'INSERT', 'INTO', 'IS', 'LIKE', 'NOT', 'NULL', 'OR',
+    'ORDER', 'ROW', 'SELECT', 'SET', 'TABLE', 'UPDATE', 'VALUES', 'WHERE'
+])
+
+
+def match_field(name, columns):
+    """ Finds the existing column of a schema field, ignoring case and the
+        reserved word renames of ArcGIS
+    :param name       Schema field name
+    :param columns    Mapping or set keyed by the lowercase column names
+    :returns:         Lowercase name of the matching column, or None
+    """
+    key = name.lower()
+    if key in columns:
+        return key
+    if name.upper() in ESRI_RESERVED_WORDS and f'{key}_' in columns:
+        return f'{key}_'
+    return None
+
+
+class UnsupportedOperation(Exception):
+    """ Raised by a backend for a change it cannot apply to the existing
+        workspace. The upgrade reports the operation as skipped, while the
+        NotImplementedError of a missing backend method fails it.
+    """
+
+
+class FieldState(object):
+    """ An existing field of a feature class """
+    __slots__ = ('name', 'domain', 'default')
+
+    def __init__(self, name, domain=None, default=None):
+        self.name = name
+        self.domain = domain or ''
+        self.default = default
+
+    def __repr__(self):
+        return f'FieldState({self.name!r})'
+
+
+class WorkspaceState(object):
+    """ The domains, feature classes, fields and metadata of an existing
+        workspace, as described by a backend
+    """
+    __slots__ = ('domains', 'feature_classes', 'rows', 'metadata', 'stores_empty_domains')
+
+    def __init__(self, stores_empty_domains=True):
+        # {domain name: frozenset of codes, or None for RANGE domains}
+        self.domains = {}
+        # {feature class name: {field name: FieldState}}
+        self.feature_classes = {}
+        # {feature class name: number of rows}
+        self.rows = {}
+        # Names of the feature classes that already have metadata
+        self.metadata = set()
+        # False when the workspace cannot store a domain without values
+        self.stores_empty_domains = stores_empty_domains
+
+    def __repr__(self):
+        return f'WorkspaceState({len(self.domains)} domains, {len(self.feature_classes)} feature classes)'
+
+
+class TemplateBackend(object):
+    """ Writes NENA template domains and feature classes to a workspace """
+
+    def open(self):
+        """ Prepares the workspace for writing
+        :returns:         The backend
+        """
+        return self
+
+    def create_domain(self, domain):
+        """ Creates a CODED or RANGE domain and its values
+        :param domain     Domain object
+        :returns:         Number of domain values written
+        """
+        raise NotImplementedError
+
+    def create_feature_class(self, layer, **kwargs):
+        """ Creates a feature class with its fields, default values and
+            editor tracking
+        :param layer      LayerPlan object
+        :returns:         n/a
+        """
+        raise NotImplementedError
+
+    def describe(self):
+        """ Describes the domains and feature classes of the workspace
+        :returns:         WorkspaceState object
+        """
+        raise NotImplementedError
+
+    def add_coded_values(self, domain, codes):
+        """ Adds coded values to an existing CODED domain
+        :param domain     Domain object
+        :param codes      Codes of domain.values to add
+        :returns:         Number of coded values written
+        """
+        raise NotImplementedError
+
+    def add_fields(self, layer, fields):
+        """ Adds fields to an existing feature class
+        :param layer      LayerPlan object
+        :param fields     FieldSpec objects to add
+        :returns:         Description of how the fields were added
+        """
+        raise NotImplementedError
+
+    def assign_default(self, layer, field_name, default_value):
+        """ Assigns a default value to an existing field
+        :param field_name Name of the existing field, ArcGIS renames reserved words
+        :returns:         Description of the change
+        :raises:          UnsupportedOperation if the workspace cannot change it
+        """
+        raise NotImplementedError
+
+    def assign_domain(self, layer, field_name, domain_name):
+        """ Assigns a domain to an existing field
+        :param field_name Name of the existing field, ArcGIS renames reserved words
+        :returns:         Description of the change
+        :raises:          UnsupportedOperation if the workspace cannot change it
+        """
+        raise NotImplementedError
+
+    def set_metadata(self, layer, **kwargs):
+        """ Writes the feature class metadata
+        :returns:         Description of the change
+        """
+        raise NotImplementedError
+
+    def commit(self):
+        """ Finalizes the workspace """
+
+    def rollback(self):
+        """ Discards the pending changes, where the backend supports it """
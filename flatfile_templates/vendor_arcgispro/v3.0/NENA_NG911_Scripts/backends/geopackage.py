@@ -0,0 +1,445 @@
+"""
+| Name:      geopackage.py
+| Purpose:   Writes a NENA NG9-1-1 GIS Data Model GeoPackage directly from
+|            the compiled flatfile_schema_v3.yaml schema using sqlite3. The
+|            layer DDL mirrors the GeoPackage created by ArcGIS Pro, and the
+|            CODED and RANGE domains are written to the GeoPackage Schema
+|            extension (gpkg_data_columns / gpkg_data_column_constraints).
+|
+| Notes:     This code is not dependent on ArcGIS Pro. The whole GeoPackage is
+|            written in a single transaction to a temporary file which then
+|            replaces the output path.
+"""
+
+import os
+import re
+import sqlite3
+from textwrap import dedent
+from time import perf_counter
+
+from .base import FieldState, TemplateBackend, UnsupportedOperation, WorkspaceState, match_field
+
+# ==============================================================================
+# GEOPACKAGE Constants
+# ==============================================================================
+GPKG_APPLICATION_ID = 0x47504B47       # 'GPKG'
+GPKG_USER_VERSION = 10400              # GeoPackage 1.4.0
+OBJECTID_FIELD = 'OBJECTID'
+GEOMETRY_FIELD = 'Shape'
+TIMESTAMP_SQL = "strftime('%Y-%m-%dT%H:%M:%fZ','now')"
+
+# Esri geometry types to GeoPackage geometry types, as written by CopyFeatures
+GEOMETRY_TYPES = {
+    'POINT': 'POINT',
+    'MULTIPOINT': 'MULTIPOINT',
+    'POLYLINE': 'MULTILINESTRING',
+    'POLYGON': 'MULTIPOLYGON'
+}
+
+# Known spatial references (srs_name, organization, organization_coordsys_id, definition, description)
+SPATIAL_REFERENCES = {
+    4326: (
+        'GCS_WGS_1984', 'EPSG', 4326,
+        'GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",SPHEROID["WGS_1984",6378137.0,298.257223563]],'
+        'PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]]',
+        'WGS 1984'
+    )
+}
+
+GPKG_CORE_DDL = (
+    """CREATE TABLE gpkg_spatial_ref_sys (srs_name TEXT NOT NULL,srs_id INTEGER NOT NULL PRIMARY KEY,organization TEXT NOT NULL,organization_coordsys_id INTEGER NOT NULL,definition TEXT NOT NULL,description TEXT)""",
+    f"""CREATE TABLE gpkg_contents (table_name TEXT NOT NULL PRIMARY KEY,data_type TEXT NOT NULL,identifier TEXT UNIQUE,description TEXT DEFAULT '',last_change DATETIME NOT NULL DEFAULT ({TIMESTAMP_SQL}),min_x DOUBLE,min_y DOUBLE,max_x DOUBLE,max_y DOUBLE,srs_id INTEGER,CONSTRAINT fk_gc_r_srs_id FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))""",
+    """CREATE TABLE gpkg_geometry_columns (table_name TEXT NOT NULL,column_name TEXT NOT NULL,geometry_type_name TEXT NOT NULL,srs_id INTEGER NOT NULL,z TINYINT NOT NULL,m TINYINT NOT NULL,CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name),CONSTRAINT uk_gc_table_name UNIQUE (table_name),CONSTRAINT fk_gc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents (table_name),CONSTRAINT fk_gc_srs FOREIGN KEY (srs_id) REFERENCES gpkg_spatial_ref_sys (srs_id))""",
+    """CREATE TABLE gpkg_extensions (table_name TEXT,column_name TEXT,extension_name TEXT NOT NULL,definition TEXT NOT NULL,scope TEXT NOT NULL,CONSTRAINT ge_tce UNIQUE (table_name,column_name,extension_name))""",
+    """CREATE TABLE gpkg_data_columns (table_name TEXT NOT NULL,column_name TEXT NOT NULL,name TEXT,title TEXT,description TEXT,mime_type TEXT,constraint_name TEXT,CONSTRAINT pk_gdc PRIMARY KEY (table_name,column_name),CONSTRAINT fk_gdc_tn FOREIGN KEY (table_name) REFERENCES gpkg_contents (table_name))""",
+    """CREATE TABLE gpkg_data_column_constraints (constraint_name TEXT NOT NULL,constraint_type TEXT NOT NULL /* 'range' || 'enum' | 'glob' */,value TEXT,min NUMERIC,min_is_inclusive BOOLEAN,max NUMERIC,max_is_inclusive BOOLEAN,description TEXT,CONSTRAINT gdcc_ntv UNIQUE (constraint_name,constraint_type,value))""",
+    """CREATE TABLE gpkg_metadata (id INTEGER CONSTRAINT m_pk PRIMARY KEY ASC AUTOINCREMENT NOT NULL UNIQUE,md_scope TEXT NOT NULL DEFAULT 'dataset',md_standard_uri TEXT NOT NULL,mime_type TEXT NOT NULL DEFAULT 'text/xml',metadata TEXT NOT NULL)""",
+    f"""CREATE TABLE gpkg_metadata_reference (reference_scope TEXT NOT NULL,table_name TEXT,column_name TEXT,row_id_value INTEGER,timestamp DATETIME NOT NULL DEFAULT ({TIMESTAMP_SQL}),md_file_id INTEGER NOT NULL,md_parent_id INTEGER,CONSTRAINT crmr_mfi_fk FOREIGN KEY (md_file_id) REFERENCES gpkg_metadata(id),CONSTRAINT crmr_mpi_fk FOREIGN KEY (md_parent_id) REFERENCES gpkg_metadata(id))"""
+)
+
+GPKG_SCHEMA_EXTENSIONS = (
+    ('gpkg_data_columns', None, 'gpkg_schema', 'http://www.geopackage.org/spec/#extension_schema', 'read-write'),
+    ('gpkg_data_column_constraints', None, 'gpkg_schema', 'http://www.geopackage.org/spec/#extension_schema', 'read-write'),
+    ('gpkg_metadata', None, 'gpkg_metadata', 'http://www.geopackage.org/spec/#extension_metadata', 'read-write'),
+    ('gpkg_metadata_reference', None, 'gpkg_metadata', 'http://www.geopackage.org/spec/#extension_metadata', 'read-write')
+)
+
+RTREE_EXTENSION = ('gpkg_rtree_index', 'http://www.geopackage.org/spec/#extension_rtree', 'write-only')
+
+# RTree spatial index triggers, as written by ArcGIS Pro (GeoPackage 1.4 F.3)
+RTREE_TRIGGERS = (
+    'CREATE TRIGGER "rtree_{t}_{c}_insert" AFTER INSERT ON "{t}" WHEN (new."{c}" NOT NULL AND NOT ST_IsEmpty(NEW."{c}")) BEGIN INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES (NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}"));END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update2" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update4" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" ISNULL OR ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id IN (OLD."{i}", NEW."{i}"); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update5" AFTER UPDATE ON "{t}" WHEN OLD."{i}" != NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}")) BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; INSERT OR REPLACE INTO "rtree_{t}_{c}" VALUES ( NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update6" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}")) AND (OLD."{c}" NOTNULL AND NOT ST_IsEmpty(OLD."{c}")) BEGIN UPDATE "rtree_{t}_{c}" SET minx = ST_MinX(NEW."{c}"), maxx = ST_MaxX(NEW."{c}"), miny = ST_MinY(NEW."{c}"), maxy = ST_MaxY(NEW."{c}") WHERE id = NEW."{i}"; END',
+    'CREATE TRIGGER "rtree_{t}_{c}_update7" AFTER UPDATE OF "{c}" ON "{t}" WHEN OLD."{i}" = NEW."{i}" AND (NEW."{c}" NOTNULL AND NOT ST_IsEmpty(NEW."{c}")) AND (OLD."{c}" ISNULL OR ST_IsEmpty(OLD."{c}")) BEGIN INSERT INTO "rtree_{t}_{c}" VALUES ( NEW."{i}", ST_MinX(NEW."{c}"), ST_MaxX(NEW."{c}"), ST_MinY(NEW."{c}"), ST_MaxY(NEW."{c}")); END',
+    'CREATE TRIGGER "rtree_{t}_{c}_delete" AFTER DELETE ON "{t}" WHEN old."{c}" NOT NULL BEGIN DELETE FROM "rtree_{t}_{c}" WHERE id = OLD."{i}"; END'
+)
+
+# UTC date tracking on DateUpdate, the GeoPackage equivalent of EnableEditorTracking
+EDITOR_TRACKING_TRIGGER = (
+    'CREATE TRIGGER "{t}_DateUpdate_tracking" AFTER UPDATE ON "{t}" WHEN NEW."DateUpdate" IS OLD."DateUpdate" '
+    'BEGIN UPDATE "{t}" SET "DateUpdate" = ' + TIMESTAMP_SQL + ' WHERE "{i}" = NEW."{i}"; END'
+)
+
+
+def sql_literal(value):
+    """ Returns a value as an SQL literal for DEFAULT clauses
+    :param value      Default value
+    :returns:         SQL literal string
+    """
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'{}'".format(str(value).replace("'", "''"))
+
+
+def column_ddl(field, nullable=None):
+    """ Returns the column definition of a field, mirroring the type checks
+        ArcGIS Pro writes to GeoPackage feature tables
+    :param field      FieldSpec object
+    :param nullable   Overrides field.is_nullable
+    :returns:         Column definition string
+    """
+    name = f'[{field.name}]'
+    nullable = field.is_nullable if nullable is None else nullable
+    if field.field_type == 'TEXT':
+        type_check = f"typeof({name}) = 'text'"
+        if nullable:
+            type_check = f"({type_check} or typeof({name}) = 'null')"
+        ddl = f'{name} TEXT({field.length})'
+        check = f'{type_check} and not length({name}) > {field.length}'
+    elif field.field_type == 'INTEGER':
+        type_check = f"typeof({name}) = 'integer'"
+        if nullable:
+            type_check = f"({type_check} or typeof({name}) = 'null')"
+        ddl = f'{name} MEDIUMINT'
+        check = f'{type_check} and {name} >= -2147483648 and {name} <= 2147483647'
+    elif field.field_type == 'REAL':
+        check = f"typeof({name}) = 'real'"
+        if nullable:
+            check = f"{check} or typeof({name}) = 'null'"
+        ddl = f'{name} DOUBLE'
+    elif field.field_type == 'DATETIME':
+        type_check = f"typeof({name}) = 'text'"
+        if nullable:
+            type_check = f"({type_check} or typeof({name}) = 'null')"
+        ddl = f'{name} DATETIME'
+        check = f"{type_check} and strftime('%Y-%m-%dT%H:%M:%fZ',{name})"
+    else:
+        raise ValueError(f'{field.field_type} not recognized field data type.')
+
+    if field.default:
+        ddl += f' default {sql_literal(field.default)}'
+    ddl += f' check({check})'
+    if not nullable:
+        ddl += ' not null'
+    return ddl
+
+
+def parse_srs_name(definition):
+    """ Returns the name of a WKT spatial reference definition
+    :param definition WKT spatial reference
+    :returns:         Spatial reference name or 'Unknown'
+    """
+    match = re.match(r'\s*\w+\["([^"]+)"', definition or '')
+    return match.group(1) if match else 'Unknown'
+
+
+class GeoPackageWriter(TemplateBackend):
+    """ Writes NENA template layers and domains to a new GeoPackage """
+
+    def __init__(self, path, srs_id=4326, srs_definition=None, spatial_index=True, editor_tracking=True):
+        self.path = path
+        self.srs_id = int(srs_id)
+        self.srs_definition = srs_definition.split(';')[0] if srs_definition else None
+        self.spatial_index = spatial_index
+        self.editor_tracking = editor_tracking
+        self.constrained_domains = set()
+        self.connection = None
+
+    def open(self, upgrade=False):
+        """ Creates the GeoPackage core tables in a new transaction
+        :param upgrade    Open an existing GeoPackage and only create the
+                          core tables, spatial references and extensions it
+                          is missing
+        :returns:         The writer
+        """
+        self.connection = sqlite3.connect(self.path, isolation_level=None)
+        cursor = self.connection.cursor()
+        if not upgrade:
+            cursor.execute(f'PRAGMA application_id = {GPKG_APPLICATION_ID}')
+            cursor.execute(f'PRAGMA user_version = {GPKG_USER_VERSION}')
+            cursor.execute('PRAGMA journal_mode = MEMORY')
+        cursor.execute('BEGIN')
+        for ddl in GPKG_CORE_DDL:
+            cursor.execute(ddl.replace('CREATE TABLE', 'CREATE TABLE IF NOT EXISTS', 1) if upgrade else ddl)
+
+        spatial_refs = [
+            ('Undefined Cartesian', -1, 'NONE', -1, 'undefined', None),
+            ('Undefined Geographic', 0, 'NONE', 0, 'undefined', None)
+        ]
+        # GeoPackage requirement 11: WGS 84 is always defined next to the undefined references
+        for srs_id in [4326] + ([self.srs_id] if self.srs_id not in (-1, 0, 4326) else []):
+            if srs_id in SPATIAL_REFERENCES and (srs_id != self.srs_id or self.srs_definition is None):
+                srs_name, organization, org_id, definition, description = SPATIAL_REFERENCES[srs_id]
+                spatial_refs.append((srs_name, srs_id, organization, org_id, definition, description))
+            else:
+                definition = self.srs_definition or 'undefined'
+                spatial_refs.append((parse_srs_name(definition), srs_id, 'EPSG', srs_id, definition, None))
+        extensions = GPKG_SCHEMA_EXTENSIONS
+        if upgrade:
+            existing_srs = {row[0] for row in cursor.execute('SELECT srs_id FROM gpkg_spatial_ref_sys')}
+            spatial_refs = [srs for srs in spatial_refs if srs[1] not in existing_srs]
+            existing_extensions = set(cursor.execute('SELECT table_name, column_name, extension_name FROM gpkg_extensions'))
+            extensions = [ext for ext in extensions if ext[:3] not in existing_extensions]
+        cursor.executemany('INSERT INTO gpkg_spatial_ref_sys VALUES (?, ?, ?, ?, ?, ?)', spatial_refs)
+        cursor.executemany('INSERT INTO gpkg_extensions VALUES (?, ?, ?, ?, ?)', extensions)
+        return self
+
+    def create_domain(self, domain):
+        """ Writes a CODED or RANGE domain to gpkg_data_column_constraints
+        :param domain     Domain object
+        :returns:         Number of constraint rows written
+        """
+        rows = []
+        description = dedent(domain.description or '').strip()
+        if domain.is_coded and domain.values:
+            for code, code_description in sorted(domain.values.items(), key=lambda item: str(item[0])):
+                rows.append((domain.name, 'enum', str(code), None, None, None, None, code_description))
+        elif domain.is_range and domain.values:
+            rows.append((domain.name, 'range', None, domain.min_value, 1, domain.max_value, 1, description))
+        if rows:
+            self.connection.executemany(
+                'INSERT INTO gpkg_data_column_constraints VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+            self.constrained_domains.add(domain.name)
+        return len(rows)
+
+    def create_feature_class(self, layer, field_definitions=None, description=None):
+        """ Creates a feature table and registers it in the GeoPackage
+        :param layer              LayerPlan object
+        :param field_definitions  Optional dictionary of FieldDefinition
+                                  objects used for column descriptions
+        :param description        Optional gpkg_contents description
+        :returns:                 n/a
+        """
+        fc = layer.feature_class
+        cursor = self.connection.cursor()
+        geometry_type = GEOMETRY_TYPES[fc.geometry_type]
+        columns = [
+            f'[{OBJECTID_FIELD}] INTEGER primary key autoincrement not null',
+            f'[{GEOMETRY_FIELD}] {geometry_type}'
+        ]
+        columns.extend(column_ddl(field) for field in layer.fields)
+        cursor.execute(f'CREATE TABLE [{fc.name}] ({", ".join(columns)})')
+
+        cursor.execute(
+            'INSERT INTO gpkg_contents (table_name, data_type, identifier, description, srs_id) VALUES (?, ?, ?, ?, ?)',
+            (fc.name, 'features', fc.name, description, self.srs_id)
+        )
+        cursor.execute(
+            'INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, ?, ?)',
+            (fc.name, GEOMETRY_FIELD, geometry_type, self.srs_id, 1 if fc.has_z else 0, 1 if fc.has_m else 0)
+        )
+
+        cursor.executemany(
+            'INSERT INTO gpkg_data_columns VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [self.data_column(fc.name, field, field_definitions) for field in layer.fields]
+        )
+
+        if self.spatial_index:
+            cursor.execute(
+                f'CREATE VIRTUAL TABLE "rtree_{fc.name}_{GEOMETRY_FIELD}" USING RTREE (id,minx,maxx,miny,maxy)')
+            for trigger in RTREE_TRIGGERS:
+                cursor.execute(trigger.format(t=fc.name, c=GEOMETRY_FIELD, i=OBJECTID_FIELD))
+            cursor.execute('INSERT INTO gpkg_extensions VALUES (?, ?, ?, ?, ?)',
+                           (fc.name, GEOMETRY_FIELD) + RTREE_EXTENSION)
+
+        if self.editor_tracking and 'DateUpdate' in layer.feature_class.fields_by_name:
+            cursor.execute(EDITOR_TRACKING_TRIGGER.format(t=fc.name, i=OBJECTID_FIELD))
+
+    def describe(self):
+        """ Describes the feature tables, columns and domain constraints of
+            the GeoPackage
+        :returns:         WorkspaceState object
+        """
+        state = WorkspaceState(stores_empty_domains=False)
+        cursor = self.connection.cursor()
+        coded = {}
+        for name, constraint_type, value in cursor.execute(
+                'SELECT constraint_name, constraint_type, value FROM gpkg_data_column_constraints'):
+            if constraint_type == 'enum':
+                coded.setdefault(name, set()).add(value)
+            else:
+                state.domains[name] = None
+        state.domains.update((name, frozenset(codes)) for name, codes in coded.items())
+        self.constrained_domains.update(state.domains)
+
+        constraints = {
+            (table, column): constraint_name
+            for table, column, constraint_name in cursor.execute(
+                'SELECT table_name, column_name, constraint_name FROM gpkg_data_columns')
+        }
+        geometry_columns = dict(cursor.execute('SELECT table_name, column_name FROM gpkg_geometry_columns'))
+        tables = cursor.execute("SELECT table_name, description FROM gpkg_contents WHERE data_type = 'features'").fetchall()
+        for table, description in tables:
+            fields = {}
+            for _, name, _, _, default, pk in cursor.execute(f'PRAGMA table_info([{table}])').fetchall():
+                if pk or name == geometry_columns.get(table):
+                    continue
+                fields[name] = FieldState(name, domain=constraints.get((table, name)), default=default)
+            state.feature_classes[table] = fields
+            state.rows[table] = cursor.execute(f'SELECT count(*) FROM [{table}]').fetchone()[0]
+            if description:
+                state.metadata.add(table)
+        return state
+
+    def add_coded_values(self, domain, codes):
+        """ Writes the enum rows of missing coded values
+        :param domain     Domain object
+        :param codes      Codes of domain.values to add
+        :returns:         Number of constraint rows written
+        """
+        rows = [(domain.name, 'enum', str(code), None, None, None, None, domain.values[code]) for code in codes]
+        self.connection.executemany(
+            'INSERT INTO gpkg_data_column_constraints VALUES (?, ?, ?, ?, ?, ?, ?, ?)', rows)
+        self.constrained_domains.add(domain.name)
+        return len(rows)
+
+    def add_fields(self, layer, fields, field_definitions=None, description=None):
+        """ Adds columns to an existing feature table. Columns that are not
+            nullable are added as nullable when the table already has rows.
+        :param layer              LayerPlan object
+        :param fields             FieldSpec objects to add
+        :param field_definitions  Optional dictionary of FieldDefinition
+                                  objects used for column descriptions
+        :param description        Unused, see set_metadata()
+        :returns:                 Description of the added columns
+        """
+        name = layer.name
+        cursor = self.connection.cursor()
+        rows = cursor.execute(f'SELECT count(*) FROM [{name}]').fetchone()[0]
+        relaxed = []
+        for field in fields:
+            nullable = field.is_nullable
+            if not nullable and rows and not field.default:
+                nullable = True
+                relaxed.append(field.name)
+            cursor.execute(f'ALTER TABLE [{name}] ADD COLUMN {column_ddl(field, nullable=nullable)}')
+        cursor.executemany(
+            'INSERT OR IGNORE INTO gpkg_data_columns VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [self.data_column(name, field, field_definitions) for field in fields]
+        )
+        detail = ', '.join(field.name for field in fields)
+        if relaxed:
+            detail += f' ({", ".join(relaxed)} added as nullable, the table has {rows} rows)'
+        return detail
+
+    def assign_default(self, layer, field_name, default_value):
+        raise UnsupportedOperation('SQLite cannot change the default value of an existing column')
+
+    def assign_domain(self, layer, field_name, domain_name):
+        """ Points an existing column at a domain constraint """
+        if domain_name not in self.constrained_domains:
+            raise UnsupportedOperation(f'{domain_name} has no values to constrain')
+        cursor = self.connection.cursor()
+        cursor.execute('UPDATE gpkg_data_columns SET constraint_name = ? WHERE table_name = ? AND column_name = ?',
+                       (domain_name, layer.name, field_name))
+        if not cursor.rowcount:
+            field = next(field for field in layer.fields if match_field(field.name, {field_name.lower()}))
+            cursor.execute('INSERT INTO gpkg_data_columns VALUES (?, ?, ?, ?, ?, ?, ?)',
+                           (layer.name, field_name, field_name, field.alias, None, None, domain_name))
+        return domain_name
+
+    def set_metadata(self, layer, field_definitions=None, description=None):
+        """ Writes the missing layer and column descriptions """
+        cursor = self.connection.cursor()
+        cursor.execute("UPDATE gpkg_contents SET description = ? WHERE table_name = ? AND (description IS NULL OR description = '')",
+                       (description, layer.name))
+        cursor.executemany(
+            'INSERT OR IGNORE INTO gpkg_data_columns VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [self.data_column(layer.name, field, field_definitions) for field in layer.fields]
+        )
+        cursor.executemany(
+            'UPDATE gpkg_data_columns SET description = ? WHERE table_name = ? AND column_name = ? AND description IS NULL',
+            [(row[4], row[0], row[1]) for row in
+             (self.data_column(layer.name, field, field_definitions) for field in layer.fields) if row[4]]
+        )
+        return f'{len(layer.fields)} column descriptions'
+
+    def data_column(self, table, field, field_definitions=None):
+        """ Returns the gpkg_data_columns row of a field """
+        definition = (field_definitions or {}).get(field.name)
+        field_description = dedent(definition.description).strip() if definition and definition.description else None
+        constraint_name = field.domain if field.domain in self.constrained_domains else None
+        return table, field.name, field.name, field.alias, field_description, None, constraint_name
+
+    def commit(self):
+        """ Commits the transaction and closes the GeoPackage """
+        self.connection.execute('COMMIT')
+        self.connection.close()
+        self.connection = None
+
+    def rollback(self):
+        """ Rolls back the transaction and closes the GeoPackage """
+        if self.connection is not None:
+            if self.connection.in_transaction:
+                self.connection.execute('ROLLBACK')
+            self.connection.close()
+            self.connection = None
+
+
+def write_geopackage(output_path, schema, profile, srs_id=4326, srs_definition=None,
+                     include_metadata=True, spatial_index=True, editor_tracking=True):
+    """ Writes a complete NENA template GeoPackage in a single transaction
+    :param output_path      Path of the GeoPackage to create
+    :param schema           Schema object
+    :param profile          Profile object with the layers to materialize
+    :param srs_id           Spatial reference EPSG code
+    :param srs_definition   Optional WKT spatial reference definition
+    :param include_metadata Write layer and column descriptions
+    :param spatial_index    Create RTree spatial indexes
+    :param editor_tracking  Create DateUpdate tracking triggers
+    :returns:               Dictionary of write statistics
+    """
+    start = perf_counter()
+    tmp_path = f'{output_path}.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    writer = GeoPackageWriter(
+        tmp_path,
+        srs_id=srs_id,
+        srs_definition=srs_definition,
+        spatial_index=spatial_index,
+        editor_tracking=editor_tracking
+    )
+    constraint_rows = 0
+    try:
+        writer.open()
+        for domain in profile.domains:
+            constraint_rows += writer.create_domain(domain)
+        for layer in profile.layers:
+            writer.create_feature_class(
+                layer,
+                field_definitions=schema.fields_by_name if include_metadata else None,
+                description=layer.feature_class.description.strip() if include_metadata else None
+            )
+        writer.commit()
+    except Exception:
+        writer.rollback()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, output_path)
+
+    return {
+        "path": output_path,
+        "layers": len(profile.layers),
+        "fields": sum(len(layer.fields) for layer in profile.layers),
+        "domains": len(writer.constrained_domains),
+        "constraints": constraint_rows,
+        "seconds": perf_counter() - start
+    }
@@ -0,0 +1,349 @@
+"""
+| Name:      plan.py
+| Purpose:   Compiles a resolved profile into the ordered list of operations
+|            a template build performs (create workspace, create domain, add
+|            values, create layer, add fields, assign defaults, enable
+|            tracking, write metadata) without executing anything. Each
+|            operation carries a cost estimate, so the build time of a run,
+|            or of many runs, can be predicted before committing to it.
+|
+| Notes:     Estimates start from DEFAULT_OPERATION_COSTS and are calibrated
+|            by the timings the template builders record on every build.
+|            Calibration factors are kept per backend in
+|            cache/plan_costs.json. Builds running in parallel, such as batch
+|            workers, replay their timings onto the stored factors under a
+|            lock file, so no run's calibration is lost. Run `python -m backends.plan` from the
+|            NENA_NG911_Scripts folder to print a plan as JSON.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from time import sleep, time
+
+# ==============================================================================
+# PLAN Constants
+# ==============================================================================
+PLAN_COSTS_PATH = None                 # Overrides the default calibration file (NENA_NG911_Scripts/cache/plan_costs.json)
+PLAN_COSTS_VERSION = 1                 # Increment when the operation list or default costs change
+CALIBRATION_WEIGHT = 0.3               # Weight of the latest timed run in the calibration factors
+PLAN_COSTS_LOCK_SECONDS = 10           # Age after which a calibration lock file is considered abandoned
+
+# Plan operations, in the order they are applied to a layer
+PLAN_ACTIONS = (
+    'create_workspace',
+    'create_domain',
+    'add_values',
+    'create_layer',
+    'add_fields',
+    'assign_defaults',
+    'enable_tracking',
+    'write_metadata',
+    'copy_features'
+)
+
+# Uncalibrated (fixed seconds, seconds per unit) of each operation by backend
+DEFAULT_OPERATION_COSTS = {
+    'arcpy': {
+        'create_workspace': (1.5, 0.0),
+        'create_domain': (0.35, 0.0),
+        'add_values': (0.9, 0.002),
+        'create_layer': (0.8, 0.0),
+        'add_fields': (0.6, 0.04),
+        'assign_defaults': (0.0, 0.3),
+        'enable_tracking': (0.4, 0.0),
+        'write_metadata': (0.25, 0.001),
+        'copy_features': (0.5, 0.0)
+    },
+    'geopackage': {
+        'create_workspace': (0.01, 0.0),
+        'create_domain': (0.0002, 0.0),
+        'add_values': (0.0002, 0.00002),
+        'create_layer': (0.0008, 0.0),
+        'add_fields': (0.0, 0.00005),
+        'assign_defaults': (0.0, 0.0),
+        'enable_tracking': (0.0, 0.0),
+        'write_metadata': (0.0002, 0.00002),
+        'copy_features': (0.0, 0.0)
+    }
+}
+
+
+class PlanOperation(object):
+    """ A single operation of a build plan """
+    __slots__ = ('step', 'action', 'target', 'units', 'estimate')
+
+    def __init__(self, step, action, target, units=1, estimate=0.0):
+        self.step = step
+        self.action = action
+        self.target = target
+        self.units = units
+        self.estimate = estimate
+
+    def as_dict(self):
+        return {
+            "step": self.step,
+            "action": self.action,
+            "target": self.target,
+            "units": self.units,
+            "estimate": round(self.estimate, 6)
+        }
+
+    def __repr__(self):
+        return f'PlanOperation({self.step}, {self.action!r}, {self.target!r})'
+
+
+class CostModel(object):
+    """ Estimates the seconds of plan operations for a backend. Estimates are
+        the default costs multiplied by a calibration factor per action.
+    """
+    __slots__ = ('backend', 'costs', 'factors', 'runs', 'observations')
+
+    def __init__(self, backend='arcpy', factors=None, runs=0):
+        if backend not in DEFAULT_OPERATION_COSTS:
+            raise ValueError(f'{backend} not recognized plan backend.')
+        self.backend = backend
+        self.costs = DEFAULT_OPERATION_COSTS[backend]
+        self.factors = dict(factors or {})
+        self.runs = runs
+        self.observations = []
+
+    def base_estimate(self, action, units=1):
+        """ Returns the uncalibrated seconds of an operation """
+        fixed, per_unit = self.costs[action]
+        return fixed + per_unit * units
+
+    def estimate(self, action, units=1):
+        """ Returns the calibrated seconds of an operation """
+        return self.base_estimate(action, units) * self.factors.get(action, 1.0)
+
+    def observe(self, operations, seconds):
+        """ Calibrates the factors of the actions of a group of operations
+            from the measured seconds of the whole group
+        :param operations PlanOperation objects executed together
+        :param seconds    Measured seconds of the group
+        :returns:         n/a
+        """
+        base = sum(self.base_estimate(operation.action, operation.units) for operation in operations)
+        if base <= 0 or seconds <= 0:
+            return
+        actions = sorted({operation.action for operation in operations})
+        ratio = seconds / base
+        self.observations.append((actions, ratio))
+        self.calibrate(actions, ratio)
+
+    def calibrate(self, actions, ratio):
+        """ Moves the factors of actions towards a measured/estimated ratio
+        :param actions    Action names
+        :param ratio      Measured seconds divided by the uncalibrated estimate
+        :returns:         n/a
+        """
+        for action in actions:
+            factor = self.factors.get(action)
+            self.factors[action] = ratio if factor is None else (
+                (1 - CALIBRATION_WEIGHT) * factor + CALIBRATION_WEIGHT * ratio)
+
+    def __repr__(self):
+        return f'CostModel({self.backend!r}, {self.runs} calibrated runs)'
+
+
+def get_costs_path():
+    """ Returns the calibration file path based on the default location or
+        the PLAN_COSTS_PATH constant
+    :returns:         Calibration file path
+    """
+    if PLAN_COSTS_PATH is None:
+        return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache', 'plan_costs.json'))
+    return PLAN_COSTS_PATH
+
+
+def read_costs():
+    """ Returns the stored calibration factors of every backend """
+    path = get_costs_path()
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            costs = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return costs.get("backends", {}) if costs.get("version") == PLAN_COSTS_VERSION else {}
+
+
+def load_cost_model(backend='arcpy'):
+    """ Returns the calibrated cost model of a backend
+    :param backend    Backend name [arcpy | geopackage]
+    :returns:         CostModel object
+    """
+    stored = read_costs().get(backend, {})
+    return CostModel(backend, factors=stored.get("factors"), runs=stored.get("runs", 0))
+
+
+@contextmanager
+def costs_lock(path):
+    """ Holds a lock file next to the calibration file, removing locks left
+        behind by interrupted processes
+    :param path       Calibration file path
+    """
+    lock_path = f'{path}.lock'
+    while True:
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time() - os.path.getmtime(lock_path) > PLAN_COSTS_LOCK_SECONDS:
+                    os.remove(lock_path)
+                    continue
+            except OSError:
+                continue
+            sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(lock_path)
+
+
+def save_cost_model(cost_model):
+    """ Replays the observations of a cost model onto the stored calibration
+        factors, counting one more calibrated run. The stored factors are
+        re-read under a lock, so parallel builds do not overwrite each other
+    :param cost_model CostModel object, updated to the stored factors
+    :returns:         n/a
+    """
+    path = get_costs_path()
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    with costs_lock(path):
+        costs = read_costs()
+        stored = costs.get(cost_model.backend, {})
+        cost_model.factors = dict(stored.get("factors") or {})
+        for actions, ratio in cost_model.observations:
+            cost_model.calibrate(actions, ratio)
+        cost_model.runs = stored.get("runs", 0) + 1
+        cost_model.observations = []
+        costs[cost_model.backend] = {"factors": cost_model.factors, "runs": cost_model.runs}
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump({"version": PLAN_COSTS_VERSION, "backends": costs}, f, indent=2)
+        os.replace(tmp_path, path)
+
+
+class BuildPlan(object):
+    """ The ordered operations of a template build """
+    __slots__ = ('profile', 'backend', 'databases', 'operations', 'calibrated_runs')
+
+    def __init__(self, profile, backend, databases, operations, calibrated_runs=0):
+        self.profile = profile
+        self.backend = backend
+        self.databases = databases
+        self.operations = operations
+        self.calibrated_runs = calibrated_runs
+
+    @property
+    def estimated_seconds(self):
+        return sum(operation.estimate for operation in self.operations)
+
+    def operations_for(self, target, actions=None):
+        """ Returns the operations on a target, optionally limited to actions """
+        return [operation for operation in self.operations
+                if operation.target == target and (actions is None or operation.action in actions)]
+
+    def seconds_by_action(self):
+        """ Returns the estimated seconds and operation count of each action """
+        totals = {}
+        for operation in self.operations:
+            count, seconds = totals.get(operation.action, (0, 0.0))
+            totals[operation.action] = (count + 1, seconds + operation.estimate)
+        return {action: totals[action] for action in PLAN_ACTIONS if action in totals}
+
+    def as_dict(self):
+        return {
+            "cldxf_support": self.profile.cldxf_support,
+            "primary": self.profile.primary,
+            "backend": self.backend,
+            "databases": self.databases,
+            "calibrated_runs": self.calibrated_runs,
+            "estimated_seconds": round(self.estimated_seconds, 3),
+            "actions": {
+                action: {"operations": count, "estimated_seconds": round(seconds, 3)}
+                for action, (count, seconds) in self.seconds_by_action().items()
+            },
+            "operations": [operation.as_dict() for operation in self.operations]
+        }
+
+    def to_json(self, indent=2):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def __repr__(self):
+        return f'BuildPlan({self.profile!r}, {len(self.operations)} operations, {self.estimated_seconds:.1f}s)'
+
+
+def compile_plan(profile, db_name='NG911_GISDataModelTemplate_v3', file_type='Both', include_metadata=True,
+                 editor_tracking=True, backend='arcpy', cost_model=None):
+    """ Compiles a profile into the ordered operations of a template build
+    :param profile          Profile object with the layers to materialize
+    :param db_name          Name of the template database, without extension
+    :param file_type        Database format option of create_ng911_template.py
+                            [Both | File geodatabase (.gdb) | GeoPackage (.gpkg)]
+    :param include_metadata Plan database and layer metadata
+    :param editor_tracking  Plan UTC editor tracking on DateUpdate fields
+    :param backend          Backend name [arcpy | geopackage]
+    :param cost_model       Optional CostModel object, loaded from the
+                            calibration file when omitted
+    :returns:               BuildPlan object
+    """
+    if cost_model is None:
+        cost_model = load_cost_model(backend)
+    operations = []
+
+    def add(action, target, units=1):
+        operations.append(PlanOperation(
+            len(operations) + 1, action, target, units, cost_model.estimate(action, units)))
+
+    # The arcpy builder always creates the File geodatabase, the GeoPackage
+    # is copied from it
+    if backend == 'geopackage':
+        databases = [f'{db_name}.gpkg']
+    elif file_type in ('Both', 'GeoPackage (.gpkg)'):
+        databases = [f'{db_name}.gdb', f'{db_name}.gpkg']
+    else:
+        databases = [f'{db_name}.gdb']
+    for database in databases:
+        add('create_workspace', database)
+    if include_metadata and backend == 'arcpy':
+        add('write_metadata', databases[0])
+
+    for domain in profile.domains:
+        add('create_domain', domain.name)
+        if domain.values:
+            add('add_values', domain.name, len(domain.values) if domain.is_coded else 1)
+
+    for layer in profile.layers:
+        add('create_layer', layer.name)
+        add('add_fields', layer.name, len(layer.fields))
+        if layer.defaults:
+            add('assign_defaults', layer.name, len(layer.defaults))
+        if editor_tracking and backend == 'arcpy' and 'DateUpdate' in layer.feature_class.fields_by_name:
+            add('enable_tracking', layer.name)
+        if include_metadata and backend == 'arcpy':
+            add('write_metadata', layer.name)
+
+    if len(databases) > 1:
+        for layer in profile.layers:
+            add('copy_features', layer.name)
+    if include_metadata and databases[-1].endswith('.gpkg'):
+        add('write_metadata', f'{databases[-1]}.xml', len(profile.layers))
+
+    return BuildPlan(profile, backend, databases, operations, calibrated_runs=cost_model.runs)
+
+
+if __name__ == '__main__':
+    import sys
+
+    from schema import LoadSchema, ResolveProfile
+
+    # python -m backends.plan [cldxf_support] [primary] [backend]
+    args = sys.argv[1:] + ['Combined', 'false', 'arcpy'][len(sys.argv) - 1:]
+    plan = compile_plan(ResolveProfile(LoadSchema(), args[0], args[1]), backend=args[2])
+    print(plan.to_json())
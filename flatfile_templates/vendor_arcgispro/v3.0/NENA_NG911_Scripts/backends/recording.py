@@ -0,0 +1,186 @@
+"""
+| Name:      recording.py
+| Purpose:   Recording stand-in for arcpy. RecordingBackend runs the real
+|            ArcpyBackend batching logic against RecordingArcpy, which keeps
+|            every geoprocessing call instead of executing it, so call counts
+|            and batching behavior can be checked without ArcGIS Pro.
+|
+| Notes:     Run `python -m backends.recording` from the NENA_NG911_Scripts
+|            folder to report the geoprocessing calls issued per profile. It
+|            exits with code 1 when they differ from expected_call_count().
+"""
+
+import sys
+from collections import Counter
+from types import SimpleNamespace
+
+from .arcgis import DOMAIN_TABLE_MIN_VALUES, ArcpyBackend, field_batches
+
+# ==============================================================================
+# RECORDING Constants
+# ==============================================================================
+# Calls of a TableToDomain load: CreateTable, AddFields, InsertCursor, TableToDomain and Delete
+TABLE_TO_DOMAIN_CALLS = 5
+
+
+class RecordingToolbox(object):
+    """ Records calls to any tool of an arcpy toolbox (e.g. management) """
+
+    def __init__(self, recorder, alias):
+        self._recorder = recorder
+        self._alias = alias
+
+    def __getattr__(self, tool):
+        def record(*args, **kwargs):
+            self._recorder.record(f'{self._alias}.{tool}', args, kwargs)
+            return self._recorder.results.get(f'{self._alias}.{tool}')
+        return record
+
+
+class RecordingInsertCursor(object):
+    """ Records the rows written through arcpy.da.InsertCursor """
+
+    def __init__(self, recorder, in_table, field_names):
+        self.rows = []
+        recorder.record('da.InsertCursor', (in_table, field_names), {"rows": self.rows})
+
+    def insertRow(self, row):
+        self.rows.append(tuple(row))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+class RecordingMetadata(object):
+    """ Records the item metadata saved through arcpy.metadata.Metadata """
+
+    def __init__(self, recorder, uri=None):
+        self._recorder = recorder
+        self.uri = uri
+        self.title = self.summary = self.description = self.tags = self.credits = ''
+
+    def save(self):
+        self._recorder.record('metadata.save', (self.uri,), {
+            "title": self.title,
+            "summary": self.summary,
+            "description": self.description,
+            "tags": self.tags
+        })
+
+
+class RecordingArcpy(object):
+    """ Stand-in for the arcpy module that records geoprocessing calls. The
+        recorded workspace is empty: listing functions return no items.
+    """
+
+    def __init__(self):
+        self.calls = []
+        # Return values of recorded tools, by tool name
+        self.results = {'management.GetCount': ['0']}
+        self.management = RecordingToolbox(self, 'management')
+        self.da = SimpleNamespace(
+            InsertCursor=lambda in_table, field_names: RecordingInsertCursor(self, in_table, field_names),
+            ListDomains=lambda workspace=None: []
+        )
+        self.metadata = SimpleNamespace(Metadata=lambda uri=None: RecordingMetadata(self, uri))
+        self.env = SimpleNamespace(workspace=None)
+
+    def ListFeatureClasses(self, *args, **kwargs):
+        return []
+
+    def ListFields(self, *args, **kwargs):
+        return []
+
+    def record(self, tool, args, kwargs):
+        self.calls.append((tool, args, kwargs))
+
+    def call_counts(self):
+        """ Returns the number of calls per tool
+        :returns:         Counter of tool names
+        """
+        return Counter(tool for tool, _, _ in self.calls)
+
+    def reset(self):
+        self.calls = []
+
+
+class RecordingBackend(ArcpyBackend):
+    """ ArcpyBackend that records its geoprocessing calls """
+
+    def __init__(self, workspace='NG911_GISDataModelTemplate_v3.gdb', spatial_reference=None, editor_tracking=True):
+        super().__init__(workspace, spatial_reference, editor_tracking=editor_tracking,
+                         arcpy_module=RecordingArcpy())
+
+    @property
+    def calls(self):
+        return self.arcpy.calls
+
+    def call_counts(self):
+        return self.arcpy.call_counts()
+
+
+def unbatched_call_count(profile):
+    """ Returns the number of geoprocessing calls needed to create a profile
+        with one call per field, default value and coded value
+    :param profile    Profile object
+    :returns:         Number of calls
+    """
+    calls = 0
+    for domain in profile.domains:
+        calls += 1 + (len(domain.values) if domain.is_coded and domain.values else 0)
+        calls += 1 if domain.is_range and domain.values else 0
+    for layer in profile.layers:
+        calls += 1 + len(layer.fields) + len(layer.defaults)
+        calls += 1 if 'DateUpdate' in layer.feature_class.fields_by_name else 0
+    return calls
+
+
+def expected_call_count(profile, editor_tracking=True):
+    """ Returns the number of geoprocessing calls ArcpyBackend issues to
+        create a profile. Coded domains below DOMAIN_TABLE_MIN_VALUES values
+        take one AddCodedValueToDomain call per value, larger ones the
+        TABLE_TO_DOMAIN_CALLS calls of a TableToDomain load.
+    :param profile          Profile object
+    :param editor_tracking  Editor tracking is enabled on DateUpdate
+    :returns:               Number of calls
+    """
+    calls = 0
+    for domain in profile.domains:
+        calls += 1
+        if domain.is_coded and domain.values:
+            calls += len(domain.values) if len(domain.values) < DOMAIN_TABLE_MIN_VALUES else TABLE_TO_DOMAIN_CALLS
+        calls += 1 if domain.is_range and domain.values else 0
+    for layer in profile.layers:
+        defaults = dict(layer.defaults)
+        calls += 1
+        for batched, fields in field_batches(layer.fields):
+            calls += 1 if batched else sum(1 + (field.name in defaults) for field in fields)
+        calls += 1 if editor_tracking and 'DateUpdate' in layer.feature_class.fields_by_name else 0
+    return calls
+
+
+if __name__ == '__main__':
+    from schema import LoadSchema, ResolveProfile
+    from schema.profiles import CLDXF_OPTIONS, PRIMARY_OPTIONS
+
+    schema = LoadSchema()
+    mismatches = 0
+    for cldxf_support in CLDXF_OPTIONS:
+        for primary in PRIMARY_OPTIONS:
+            profile = ResolveProfile(schema, cldxf_support, primary)
+            backend = RecordingBackend().open()
+            for domain in profile.domains:
+                backend.create_domain(domain)
+            for layer in profile.layers:
+                backend.create_feature_class(layer)
+            backend.commit()
+            counts = backend.call_counts()
+            expected = expected_call_count(profile)
+            mismatches += sum(counts.values()) != expected
+            print(f'{cldxf_support:<9} primary={str(primary):<5} '
+                  f'{sum(counts.values()):>4} calls (expected {expected}, unbatched {unbatched_call_count(profile)}): '
+                  + ', '.join(f'{tool}={count}' for tool, count in sorted(counts.items())))
+    sys.exit(1 if mismatches else 0)
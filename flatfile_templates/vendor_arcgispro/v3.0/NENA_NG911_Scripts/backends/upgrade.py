@@ -0,0 +1,210 @@
+"""
+| Name:      upgrade.py
+| Purpose:   Upgrades an existing template in place. The workspace described
+|            by a backend is diffed against a resolved profile and only the
+|            missing domains, coded values, feature classes, fields, domain
+|            assignments, default values and metadata are applied, so the rows
+|            already loaded in the template are left untouched.
+|
+| Notes:     Operations a backend cannot apply in place (for example changing
+|            the default value of an existing GeoPackage column) raise
+|            UnsupportedOperation and are reported as skipped instead of
+|            failing the upgrade.
+"""
+
+from time import perf_counter
+
+from .base import UnsupportedOperation, match_field
+from .geopackage import GeoPackageWriter
+
+# ==============================================================================
+# UPGRADE Constants
+# ==============================================================================
+# Upgrade operations, in the order they are applied
+UPGRADE_ACTIONS = (
+    'create_domain',
+    'add_coded_values',
+    'create_feature_class',
+    'add_fields',
+    'assign_domain',
+    'assign_default',
+    'set_metadata'
+)
+
+# Operations that receive the field definitions and layer description
+LAYER_METADATA_ACTIONS = frozenset(['create_feature_class', 'add_fields', 'set_metadata'])
+
+
+class UpgradeOperation(object):
+    """ A single change applied by an upgrade """
+    __slots__ = ('action', 'target', 'args', 'status', 'detail', 'seconds')
+
+    def __init__(self, action, target, args):
+        self.action = action
+        self.target = target
+        self.args = args
+        self.status = 'pending'
+        self.detail = ''
+        self.seconds = 0.0
+
+    def __repr__(self):
+        return f'UpgradeOperation({self.action!r}, {self.target!r}, {self.status!r})'
+
+
+def plan_upgrade(state, profile, include_metadata=True):
+    """ Diffs an existing workspace against a profile
+    :param state            WorkspaceState object from backend.describe()
+    :param profile          Profile object with the layers to materialize
+    :param include_metadata Plan missing feature class metadata
+    :returns:               List of UpgradeOperation objects
+    """
+    operations = []
+    available_domains = set(state.domains)
+    for domain in profile.domains:
+        existing = state.domains.get(domain.name, False)
+        if existing is False:
+            if domain.values or state.stores_empty_domains:
+                operations.append(UpgradeOperation('create_domain', domain.name, (domain,)))
+                available_domains.add(domain.name)
+        elif domain.is_coded and domain.values:
+            missing = [code for code in sorted(domain.values) if str(code) not in (existing or ())]
+            if missing:
+                operations.append(UpgradeOperation('add_coded_values', domain.name, (domain, tuple(missing))))
+
+    for layer in profile.layers:
+        fields = state.feature_classes.get(layer.name)
+        if fields is None:
+            operations.append(UpgradeOperation('create_feature_class', layer.name, (layer,)))
+            if include_metadata:
+                operations.append(UpgradeOperation('set_metadata', layer.name, (layer,)))
+            continue
+
+        # Existing fields are matched ignoring case and the reserved word renames of ArcGIS (Row_ for Row)
+        columns = {name.lower(): existing for name, existing in fields.items()}
+        matches = {field.name: match_field(field.name, columns) for field in layer.fields}
+        missing_fields = tuple(field for field in layer.fields if matches[field.name] is None)
+        if missing_fields:
+            operations.append(UpgradeOperation('add_fields', layer.name, (layer, missing_fields)))
+
+        defaults = dict(layer.defaults)
+        for field in layer.fields:
+            if matches[field.name] is None:
+                continue
+            existing = columns[matches[field.name]]
+            if field.domain and not existing.domain and field.domain in available_domains:
+                operations.append(UpgradeOperation(
+                    'assign_domain', f'{layer.name}.{existing.name}', (layer, existing.name, field.domain)))
+            if field.name in defaults and existing.default in (None, ''):
+                operations.append(UpgradeOperation(
+                    'assign_default', f'{layer.name}.{existing.name}', (layer, existing.name, defaults[field.name])))
+
+        if include_metadata and layer.name not in state.metadata:
+            operations.append(UpgradeOperation('set_metadata', layer.name, (layer,)))
+
+    operations.sort(key=lambda operation: UPGRADE_ACTIONS.index(operation.action))
+    return operations
+
+
+def apply_upgrade(backend, operations, schema=None, include_metadata=True, log=None):
+    """ Applies the planned operations with a backend, timing each operation
+    :param backend          TemplateBackend object opened on the workspace
+    :param operations       List of UpgradeOperation objects
+    :param schema           Optional Schema object used for field descriptions
+    :param include_metadata Write layer and column descriptions
+    :param log              Optional logger
+    :returns:               List of UpgradeOperation objects
+    """
+    for operation in operations:
+        kwargs = {}
+        if operation.action in LAYER_METADATA_ACTIONS and include_metadata:
+            layer = operation.args[0]
+            kwargs = {
+                "field_definitions": schema.fields_by_name if schema is not None else None,
+                "description": layer.feature_class.description.strip()
+            }
+        start = perf_counter()
+        try:
+            result = getattr(backend, operation.action)(*operation.args, **kwargs)
+            operation.status = 'applied'
+            operation.detail = '' if result is None else str(result)
+        except UnsupportedOperation as e:
+            operation.status = 'skipped'
+            operation.detail = str(e)
+        operation.seconds = perf_counter() - start
+        if log:
+            log.info(format_operation(operation))
+    return operations
+
+
+def upgrade_workspace(backend, schema, profile, include_metadata=True, log=None):
+    """ Describes, diffs and upgrades an opened workspace. The backend is
+        committed when every operation succeeds and rolled back otherwise.
+    :param backend          TemplateBackend object opened on the workspace
+    :param schema           Schema object
+    :param profile          Profile object with the layers to materialize
+    :param include_metadata Write missing layer and column metadata
+    :param log              Optional logger
+    :returns:               Dictionary of upgrade statistics and operations
+    """
+    start = perf_counter()
+    try:
+        describe_start = perf_counter()
+        state = backend.describe()
+        describe_seconds = perf_counter() - describe_start
+        operations = plan_upgrade(state, profile, include_metadata=include_metadata)
+        apply_upgrade(backend, operations, schema=schema, include_metadata=include_metadata, log=log)
+        backend.commit()
+    except Exception:
+        backend.rollback()
+        raise
+
+    return {
+        "operations": operations,
+        "applied": sum(1 for operation in operations if operation.status == 'applied'),
+        "skipped": sum(1 for operation in operations if operation.status == 'skipped'),
+        "describe_seconds": describe_seconds,
+        "seconds": perf_counter() - start
+    }
+
+
+def upgrade_geopackage(path, schema, profile, srs_id=4326, srs_definition=None, include_metadata=True, log=None):
+    """ Upgrades an existing GeoPackage in place in a single transaction
+    :param path             Path of the existing GeoPackage
+    :param schema           Schema object
+    :param profile          Profile object with the layers to materialize
+    :param srs_id           Spatial reference EPSG code of new feature classes
+    :param srs_definition   Optional WKT spatial reference definition
+    :param include_metadata Write missing layer and column metadata
+    :param log              Optional logger
+    :returns:               Dictionary of upgrade statistics and operations
+    """
+    writer = GeoPackageWriter(path, srs_id=srs_id, srs_definition=srs_definition)
+    writer.open(upgrade=True)
+    return upgrade_workspace(writer, schema, profile, include_metadata=include_metadata, log=log)
+
+
+def format_operation(operation):
+    """ Returns a report line for an operation """
+    line = f'|- {operation.status.capitalize()} {operation.action} {operation.target} ({operation.seconds:.3f}s)'
+    if operation.detail:
+        line += f': {operation.detail}'
+    return line
+
+
+def format_report(stats):
+    """ Returns the report lines of an upgrade
+    :param stats      Dictionary returned by upgrade_workspace()
+    :returns:         List of report lines
+    """
+    if not stats["operations"]:
+        return ['Template is up to date, no upgrade operations applied.']
+    seconds_by_action = {}
+    for operation in stats["operations"]:
+        seconds_by_action[operation.action] = seconds_by_action.get(operation.action, 0.0) + operation.seconds
+    lines = [f'Applied {stats["applied"]} and skipped {stats["skipped"]} upgrade operations '
+             f'in {stats["seconds"]:.3f}s (describe {stats["describe_seconds"]:.3f}s).']
+    for action in UPGRADE_ACTIONS:
+        if action in seconds_by_action:
+            count = sum(1 for operation in stats["operations"] if operation.action == action)
+            lines.append(f'|- {action}: {count} operations in {seconds_by_action[action]:.3f}s')
+    return lines
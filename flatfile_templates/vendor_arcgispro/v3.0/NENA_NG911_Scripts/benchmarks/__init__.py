@@ -0,0 +1,5 @@
+from . import mock_arcpy
+
+# mock_arcpy modules
+MockArcpy = mock_arcpy.MockArcpy
+InstallMockArcpy = mock_arcpy.install
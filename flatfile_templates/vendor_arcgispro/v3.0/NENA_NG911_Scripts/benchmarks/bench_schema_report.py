@@ -0,0 +1,143 @@
+"""
+| Name:      bench_schema_report.py
+| Purpose:   Benchmarks the two rendering paths of the schema report in
+|            report.xlsx: the in-memory workbook styled cell by cell
+|            (build_schema_report) and the write-only workbook streamed a row
+|            at a time with shared named styles (write_schema_report). The wall time and the peak
+|            Python memory of each path are measured, and the two workbooks
+|            are compared cell by cell.
+|
+| Notes:     Run `python -m benchmarks.bench_schema_report` from the
+|            NENA_NG911_Scripts folder. The run fails when the workbooks
+|            differ in a sheet, column width, value, comment, font, fill or
+|            alignment.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import tracemalloc
+from shutil import rmtree
+from time import perf_counter
+
+from openpyxl import load_workbook
+
+from report import EvaluateRules, xlsx
+from schema import LoadSchema
+
+# ==============================================================================
+# BENCHMARK Constants
+# ==============================================================================
+BENCHMARK_REPEAT = 3                   # Timed runs per path, the fastest run is reported
+BENCHMARK_MAX_DIFFERENCES = 20         # Workbook differences listed in the report
+
+# Rendering paths by name
+REPORT_PATHS = {
+    'in_memory': xlsx.build_schema_report,
+    'write_only': xlsx.write_schema_report
+}
+
+
+def time_path(build, schema, findings, wb_file_path, repeat):
+    """ Returns the fastest seconds and the peak traced bytes of a path. The
+        peak is measured on a separate run, tracing slows the renderer down.
+    """
+    seconds = []
+    for _ in range(max(1, repeat)):
+        start = perf_counter()
+        build(schema, findings, wb_file_path)
+        seconds.append(perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        build(schema, findings, wb_file_path)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return min(seconds), peak
+
+
+def cell_look(cell):
+    """ Returns the value, comment and visible formatting of a cell """
+    return (
+        cell.value,
+        cell.comment.text if cell.comment else None,
+        bool(cell.font.b),
+        cell.fill.fill_type,
+        cell.fill.fgColor.rgb if cell.fill.fill_type else None,
+        cell.alignment.horizontal,
+        cell.alignment.vertical,
+        bool(cell.alignment.wrap_text)
+    )
+
+
+def compare_workbooks(path_a, path_b):
+    """ Compares the sheets, column widths and cells of two workbooks
+    :param path_a     Path of the first .xlsx workbook
+    :param path_b     Path of the second .xlsx workbook
+    :returns:         List of difference messages
+    """
+    wb_a = load_workbook(path_a)
+    wb_b = load_workbook(path_b)
+    if wb_a.sheetnames != wb_b.sheetnames:
+        return [f'sheets {wb_a.sheetnames} != {wb_b.sheetnames}']
+
+    differences = []
+    for ws_a, ws_b in zip(wb_a.worksheets, wb_b.worksheets):
+        for column in sorted(set(ws_a.column_dimensions) | set(ws_b.column_dimensions)):
+            width_a, width_b = ws_a.column_dimensions[column].width, ws_b.column_dimensions[column].width
+            if width_a != width_b:
+                differences.append(f'{ws_a.title}!{column}: width {width_a} != {width_b}')
+        max_row = max(ws_a.max_row, ws_b.max_row)
+        max_column = max(ws_a.max_column, ws_b.max_column)
+        for row in range(1, max_row + 1):
+            for column in range(1, max_column + 1):
+                look_a = cell_look(ws_a.cell(row, column))
+                look_b = cell_look(ws_b.cell(row, column))
+                if look_a != look_b:
+                    differences.append(f'{ws_a.title}!{ws_a.cell(row, column).coordinate}: {look_a} != {look_b}')
+    wb_a.close()
+    wb_b.close()
+    return differences
+
+
+def main(repeat=BENCHMARK_REPEAT):
+    """ Benchmarks both rendering paths and compares their workbooks
+    :param repeat     Timed runs per path
+    :returns:         List of workbook difference messages
+    """
+    schema = LoadSchema()
+    findings = EvaluateRules(schema)
+    folder = tempfile.mkdtemp(prefix='ng911_bench_report_')
+    try:
+        results = {}
+        for name, build in REPORT_PATHS.items():
+            wb_file_path = os.path.join(folder, f'{name}.xlsx')
+            seconds, peak = time_path(build, schema, findings, wb_file_path, repeat)
+            results[name] = (seconds, peak, os.path.getsize(wb_file_path))
+            print(f'{name:<12} {seconds:>8.3f}s {peak / 2 ** 20:>8.2f} MiB peak {results[name][2]:>9,} bytes')
+
+        base_seconds, base_peak, _ = results['in_memory']
+        seconds, peak, _ = results['write_only']
+        print(f'write_only is {base_seconds / seconds:.1f}x faster with '
+              f'{100 * (1 - peak / base_peak):.0f}% less peak memory')
+
+        differences = compare_workbooks(os.path.join(folder, 'in_memory.xlsx'), os.path.join(folder, 'write_only.xlsx'))
+    finally:
+        rmtree(folder, ignore_errors=True)
+
+    for difference in differences[:BENCHMARK_MAX_DIFFERENCES]:
+        print(f'DIFFERENCE {difference}')
+    if len(differences) > BENCHMARK_MAX_DIFFERENCES:
+        print(f'... {len(differences) - BENCHMARK_MAX_DIFFERENCES} more differences')
+    if not differences:
+        print('Workbooks match')
+    return differences
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the in-memory and write-only schema report paths.')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT, help='timed runs per path')
+    args = parser.parse_args()
+    sys.exit(1 if main(args.repeat) else 0)
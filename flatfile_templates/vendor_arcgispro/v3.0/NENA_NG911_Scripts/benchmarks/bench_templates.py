@@ -0,0 +1,293 @@
+"""
+| Name:      bench_templates.py
+| Purpose:   Benchmarks the template builders against MockArcpy. Every
+|            CLDXF/primary profile is built with create_ng911_template.py and
+|            the native create_ng911_gpkg.py, and each primary option with the
+|            v2.0a create_ng911_fgdb.py. The geoprocessing calls are counted
+|            per phase (workspace, domains, feature classes, fields, defaults,
+|            metadata, messages) and the wall time of each case is measured.
+|
+| Notes:     Run `python -m benchmarks.bench_templates` from the
+|            NENA_NG911_Scripts folder. The run fails when a phase makes more
+|            calls than benchmarks/baseline.json, or a case is slower than the
+|            baseline by more than BENCHMARK_TIME_TOLERANCE. Pass
+|            --update-baseline to store the current results. The v2.0a script
+|            is run in a separate interpreter because it has its own util
+|            package.
+"""
+
+import argparse
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import types
+from collections import Counter
+from shutil import rmtree
+from time import perf_counter
+
+from . import mock_arcpy
+
+# ==============================================================================
+# BENCHMARK Constants
+# ==============================================================================
+BENCHMARK_REPEAT = 3                   # Runs per case, the fastest run is reported
+BENCHMARK_TIME_TOLERANCE = 0.5         # Allowed slowdown over the baseline (0.5: 50%)
+BENCHMARK_TIME_SLACK = 0.05            # Allowed absolute slowdown in seconds, for very fast cases
+BENCHMARK_MESSAGE_SLACK = 10           # Allowed extra message calls, batches are flushed on elapsed time
+SCRIPTS_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+V2_FOLDER = os.path.abspath(os.path.join(SCRIPTS_FOLDER, '..', '..', 'v2.0a'))
+V2_SCHEMA_PATH = os.path.abspath(os.path.join(SCRIPTS_FOLDER, '..', '..', '..', 'schema', 'v2.0a', 'schema_fgdb_v2.py'))
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+PHASES = ('workspace', 'domains', 'feature_classes', 'fields', 'defaults', 'metadata', 'messages', 'other')
+
+# Phase of each recorded call, by tool name
+PHASE_TOOLS = {
+    'management.CreateFileGDB': 'workspace',
+    'management.CreateSQLiteDatabase': 'workspace',
+    'management.ClearWorkspaceCache': 'workspace',
+    'management.Delete': 'workspace',
+    'management.CreateDomain': 'domains',
+    'management.AddCodedValueToDomain': 'domains',
+    'management.SetValueForRangeDomain': 'domains',
+    'management.TableToDomain': 'domains',
+    'management.CreateFeatureclass': 'feature_classes',
+    'management.CreateTable': 'feature_classes',
+    'management.EnableEditorTracking': 'feature_classes',
+    'management.CopyFeatures': 'feature_classes',
+    'management.CreateRelationshipClass': 'feature_classes',
+    'management.AddField': 'fields',
+    'management.AddFields': 'fields',
+    'management.AssignDefaultToField': 'defaults',
+    'metadata.save': 'metadata',
+    'metadata.copy': 'metadata'
+}
+
+
+def call_phase(tool, args, kwargs):
+    """ Returns the benchmark phase of a recorded call. Calls on the scratch
+        tables used to load coded values belong to the domains phase.
+    """
+    if tool in mock_arcpy.MESSAGE_CALLS:
+        return 'messages'
+    target = kwargs.get('out_path') or kwargs.get('in_table') or (args[0] if args else '')
+    if isinstance(target, str) and target.startswith('memory'):
+        return 'domains'
+    return PHASE_TOOLS.get(tool, 'other')
+
+
+def phase_counts(calls):
+    """ Returns the number of recorded calls per phase """
+    counts = Counter(call_phase(tool, args, kwargs) for tool, args, kwargs in calls)
+    return {phase: counts[phase] for phase in PHASES if counts[phase]}
+
+
+def time_case(build, mock, repeat):
+    """ Runs a case repeat times in fresh output folders
+    :param build      Function building a template in an output folder
+    :param mock       MockArcpy object, or None for cases without arcpy
+    :param repeat     Number of runs
+    :returns:         Dictionary of calls per phase and fastest wall time
+    """
+    best = None
+    calls = []
+    for _ in range(repeat):
+        output_folder = tempfile.mkdtemp(prefix='ng911_bench_')
+        if mock is not None:
+            mock.reset()
+        try:
+            start = perf_counter()
+            build(output_folder)
+            seconds = perf_counter() - start
+        finally:
+            rmtree(output_folder, ignore_errors=True)
+        best = seconds if best is None else min(best, seconds)
+        calls = list(mock.calls) if mock is not None else []
+    counts = phase_counts(calls)
+    return {"calls": counts, "total_calls": sum(counts.values()), "seconds": round(best, 4)}
+
+
+def run_v3_cases(mock, repeat):
+    """ Benchmarks create_ng911_template.py and create_ng911_gpkg.py for
+        every CLDXF/primary profile
+    :param mock       Installed MockArcpy object
+    :param repeat     Runs per case
+    :returns:         Dictionary of case results
+    """
+    import create_ng911_gpkg
+    import create_ng911_template
+    from backends import plan
+    from schema.profiles import CLDXF_OPTIONS
+    import util.constants as CONSTANTS
+
+    # Keep the mock timings out of the plan cost calibration
+    plan.PLAN_COSTS_PATH = os.path.join(tempfile.mkdtemp(prefix='ng911_bench_'), 'plan_costs.json')
+    results = {}
+    for cldxf_support in CLDXF_OPTIONS:
+        for primary in ('true', 'false'):
+            params = {
+                "params_type": 'TOOLBOX',
+                "output_template_name": 'NG911_GISDataModelTemplate_v3',
+                "file_type": 'Both',
+                "gdb_version": 'CURRENT',
+                "cldxf_support": cldxf_support,
+                "spatial_reference_horizontal": CONSTANTS.SR_WGS84_HORIZONTAL,
+                "allow_overwrite": "true",
+                "primary": primary,
+                "include_metadata": "true",
+                "use_cache": "false"
+            }
+            results[f'template/{cldxf_support}/primary={primary}'] = time_case(
+                lambda output_folder: create_ng911_template.main(output_folder=output_folder, **params), mock, repeat)
+            params["params_type"] = 'CONSOLE'
+            results[f'gpkg/{cldxf_support}/primary={primary}'] = time_case(
+                lambda output_folder: create_ng911_gpkg.main(output_folder=output_folder, **params), None, repeat)
+    return results
+
+
+def run_v2_case(primary, latency, message_latency, repeat):
+    """ Benchmarks the v2.0a create_ng911_fgdb.py. Called in a separate
+        interpreter, see run_v2_cases().
+    :returns:         Dictionary of case results
+    """
+    mock = mock_arcpy.install(latency=latency, message_latency=message_latency)
+    # The v2.0a script imports its own util package and the v2.0a schema
+    # from flatfile_templates.schema.v2, which is stored as schema/v2.0a
+    for name in [name for name in sys.modules if name == 'util' or name.startswith('util.')]:
+        del sys.modules[name]
+    sys.path.insert(0, V2_FOLDER)
+    spec = importlib.util.spec_from_file_location('flatfile_templates.schema.v2.schema_fgdb_v2', V2_SCHEMA_PATH)
+    schema_module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(schema_module)
+    for package in ('flatfile_templates', 'flatfile_templates.schema', 'flatfile_templates.schema.v2'):
+        sys.modules.setdefault(package, types.ModuleType(package))
+    sys.modules[spec.name] = schema_module
+    # The metadata template is read relative to the v2.0a folder
+    os.chdir(V2_FOLDER)
+    import create_ng911_fgdb
+    import util.logger
+
+    # The v2.0a default log folder is a Windows relative path
+    util.logger.LOG_FOLDER_PATH = tempfile.mkdtemp(prefix='ng911_bench_logs_')
+
+    params = {
+        "params_type": 'TOOLBOX',
+        "output_name": 'NG911_GISDataModelTemplate_v2.0a',
+        "file_type": 'File Geodatabase (.gdb)',
+        "gdb_version": 'CURRENT',
+        "spatial_reference": create_ng911_fgdb.SR_WGS84,
+        "allow_overwrite": "true",
+        "primary": primary,
+        "include_metadata": "true"
+    }
+    return {f'fgdb_v2/primary={primary}': time_case(
+        lambda output_folder: create_ng911_fgdb.main(output_folder=output_folder, **params), mock, repeat)}
+
+
+def run_v2_cases(latency, message_latency, repeat):
+    """ Runs the v2.0a cases in separate interpreters
+    :returns:         Dictionary of case results, or of skipped cases
+    """
+    results = {}
+    for primary in ('true', 'false'):
+        process = subprocess.run(
+            [sys.executable, '-m', 'benchmarks.bench_templates', '--v2-case', primary,
+             '--latency', str(latency), '--message-latency', str(message_latency), '--repeat', str(repeat)],
+            cwd=SCRIPTS_FOLDER, capture_output=True, text=True
+        )
+        try:
+            results.update(json.loads(process.stdout.strip().splitlines()[-1]))
+        except (IndexError, ValueError):
+            # The v2.0a script calls exit() on errors
+            error = ((process.stderr or process.stdout).strip().splitlines() or ['no results'])[-1]
+            results[f'fgdb_v2/primary={primary}'] = {"skipped": error}
+    return results
+
+
+def compare_baseline(results, baseline):
+    """ Compares results with a baseline. Wall times are only compared when
+        the baseline was recorded with the same simulated latency.
+    :param results    Dictionary of case results
+    :param baseline   Dictionary read from baseline.json
+    :returns:         List of regression messages
+    """
+    regressions = []
+    compare_times = baseline.get("latency") == results["latency"]
+    for case, result in results["cases"].items():
+        expected = baseline["cases"].get(case)
+        if expected is None or "skipped" in result or "skipped" in expected:
+            continue
+        for phase, count in result["calls"].items():
+            if count > expected["calls"].get(phase, 0) + (BENCHMARK_MESSAGE_SLACK if phase == 'messages' else 0):
+                regressions.append(f'{case}: {count} {phase} calls, baseline {expected["calls"].get(phase, 0)}')
+        limit = expected["seconds"] * (1 + BENCHMARK_TIME_TOLERANCE) + BENCHMARK_TIME_SLACK
+        if compare_times and result["seconds"] > limit:
+            regressions.append(f'{case}: {result["seconds"]:.3f}s, baseline {expected["seconds"]:.3f}s')
+    return regressions
+
+
+def format_results(results):
+    """ Returns the report lines of a benchmark run """
+    lines = [f'Simulated latency: {results["latency"]["tool"]}s per tool call, '
+             f'{results["latency"]["message"]}s per message call']
+    for case, result in results["cases"].items():
+        if "skipped" in result:
+            lines.append(f'{case:<36} skipped: {result["skipped"]}')
+            continue
+        lines.append(f'{case:<36} {result["seconds"]:>8.3f}s {result["total_calls"]:>5} calls'
+                     + (': ' + ', '.join(f'{phase}={count}' for phase, count in result["calls"].items())
+                        if result["calls"] else ''))
+    return lines
+
+
+def main(latency=mock_arcpy.MOCK_TOOL_LATENCY, message_latency=mock_arcpy.MOCK_MESSAGE_LATENCY,
+         repeat=BENCHMARK_REPEAT, update_baseline=False, include_v2=True):
+    """ Runs the benchmarks and compares them with the baseline
+    :returns:         List of regression messages
+    """
+    logging.disable(logging.CRITICAL)
+    mock = mock_arcpy.install(latency=latency, message_latency=message_latency)
+    cases = run_v3_cases(mock, repeat)
+    if include_v2:
+        cases.update(run_v2_cases(latency, message_latency, repeat))
+    results = {"latency": {"tool": latency, "message": message_latency}, "cases": cases}
+    for line in format_results(results):
+        print(line)
+
+    if update_baseline:
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
+        print(f'Baseline written to {BASELINE_PATH}')
+        return []
+    if not os.path.exists(BASELINE_PATH):
+        print('No baseline, run with --update-baseline to create one.')
+        return []
+    with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+        regressions = compare_baseline(results, json.load(f))
+    for regression in regressions:
+        print(f'REGRESSION {regression}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks the NG9-1-1 template builders against a mock arcpy.')
+    parser.add_argument('--latency', type=float, default=mock_arcpy.MOCK_TOOL_LATENCY,
+                        help='seconds slept per geoprocessing call')
+    parser.add_argument('--message-latency', type=float, default=mock_arcpy.MOCK_MESSAGE_LATENCY,
+                        help='seconds slept per message or progressor call')
+    parser.add_argument('--repeat', type=int, default=BENCHMARK_REPEAT, help='runs per case')
+    parser.add_argument('--update-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--skip-v2', action='store_true', help='do not benchmark the v2.0a script')
+    parser.add_argument('--v2-case', choices=('true', 'false'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.v2_case:
+        logging.disable(logging.CRITICAL)
+        print(json.dumps(run_v2_case(args.v2_case, args.latency, args.message_latency, args.repeat)))
+        sys.exit(0)
+    sys.exit(1 if main(args.latency, args.message_latency, args.repeat, args.update_baseline, not args.skip_v2) else 0)
@@ -0,0 +1,127 @@
+"""
+| Name:      mock_arcpy.py
+| Purpose:   Stand-in for the arcpy module used to benchmark the template
+|            builders without ArcGIS Pro. MockArcpy extends the recording
+|            stand-in of backends.recording with the functions the scripts
+|            call (GetInstallInfo, Exists, messages and progressor) and
+|            sleeps a configurable latency on every recorded call, so the
+|            cost of extra geoprocessing and message calls shows in wall time.
+|
+| Notes:     install() registers a MockArcpy object as sys.modules['arcpy'];
+|            it must be called before a builder script is imported. File
+|            geodatabases and GeoPackages are created as empty folders and
+|            files so the scripts' os.path checks behave as with ArcGIS Pro.
+"""
+
+import os
+import shutil
+import sys
+from time import sleep
+from types import SimpleNamespace
+
+from backends.recording import RecordingArcpy, RecordingMetadata
+
+# ==============================================================================
+# MOCK ARCPY Constants
+# ==============================================================================
+MOCK_TOOL_LATENCY = 0.001              # Default seconds slept per geoprocessing call
+MOCK_MESSAGE_LATENCY = 0.0005          # Default seconds slept per message or progressor call
+MOCK_INSTALL_INFO = {'Version': '3.3', 'LicenseLevel': 'Advanced', 'ProductName': 'ArcGISPro'}
+
+# Calls that update the geoprocessing messages or progressor
+MESSAGE_CALLS = frozenset([
+    'AddMessage',
+    'AddWarning',
+    'AddError',
+    'SetProgressor',
+    'SetProgressorLabel',
+    'SetProgressorPosition'
+])
+
+
+class MockMetadata(RecordingMetadata):
+    """ Item metadata that can also be copied, as used by the v2.0a script """
+    isReadOnly = False
+
+    def copy(self, metadata):
+        self._recorder.record('metadata.copy', (self.uri,), {})
+
+
+class MockArcpy(RecordingArcpy):
+    """ Recording arcpy stand-in with simulated latency and workspaces """
+
+    def __init__(self, latency=MOCK_TOOL_LATENCY, message_latency=MOCK_MESSAGE_LATENCY):
+        super().__init__()
+        self.latency = latency
+        self.message_latency = message_latency
+        # {workspace path: [feature class names]}
+        self.workspaces = {}
+        self.metadata = SimpleNamespace(Metadata=lambda uri=None: MockMetadata(self, uri))
+        self.handlers = {
+            'management.CreateFileGDB': self._create_file_gdb,
+            'management.CreateSQLiteDatabase': self._create_sqlite_database,
+            'management.CreateFeatureclass': self._create_feature_class,
+            'management.Delete': self._delete
+        }
+
+    def record(self, tool, args, kwargs):
+        super().record(tool, args, kwargs)
+        handler = self.handlers.get(tool)
+        if handler:
+            handler(*args, **kwargs)
+        seconds = self.message_latency if tool in MESSAGE_CALLS else self.latency
+        if seconds:
+            sleep(seconds)
+
+    def reset(self):
+        super().reset()
+        self.workspaces = {}
+
+    # Side effects of the recorded tools
+    def _create_file_gdb(self, out_folder_path, out_name, out_version=None):
+        name = out_name if out_name.endswith('.gdb') else f'{out_name}.gdb'
+        os.makedirs(os.path.join(out_folder_path, name), exist_ok=True)
+
+    def _create_sqlite_database(self, out_database_name, spatial_type=None):
+        open(out_database_name, 'ab').close()
+
+    def _create_feature_class(self, out_path, out_name, **kwargs):
+        self.workspaces.setdefault(out_path, []).append(out_name)
+
+    def _delete(self, in_data, *args, **kwargs):
+        if os.path.isdir(in_data):
+            shutil.rmtree(in_data)
+        elif os.path.isfile(in_data):
+            os.remove(in_data)
+
+    # Functions called by the scripts
+    def GetInstallInfo(self):
+        return dict(MOCK_INSTALL_INFO)
+
+    def ProductInfo(self):
+        return 'ArcInfo'
+
+    def Exists(self, path):
+        return os.path.exists(path)
+
+    def ListFeatureClasses(self, *args, **kwargs):
+        return list(self.workspaces.get(self.env.workspace, []))
+
+    def GetParameterAsText(self, index):
+        return ''
+
+    def __getattr__(self, name):
+        if name in MESSAGE_CALLS:
+            return lambda *args, **kwargs: self.record(name, args, kwargs)
+        raise AttributeError(name)
+
+
+def install(latency=MOCK_TOOL_LATENCY, message_latency=MOCK_MESSAGE_LATENCY):
+    """ Registers a MockArcpy object as the arcpy module
+    :param latency          Seconds slept per geoprocessing call
+    :param message_latency  Seconds slept per message or progressor call
+    :returns:               MockArcpy object
+    """
+    mock = MockArcpy(latency=latency, message_latency=message_latency)
+    sys.modules['arcpy'] = mock
+    return mock
@@ -0,0 +1,110 @@
+# check_ng911_gpkg.py
+"""
+| Name:      Check NG9-1-1 GeoPackages v3
+| Purpose:   Checks whether GeoPackages, for example the submissions of local
+|            agencies, conform to the NG9-1-1 GIS Data Model (v3.0): missing
+|            layers, extra fields, field types and lengths, geometry types
+|            and Z flags, and missing domain constraints. A folder is
+|            searched for .gpkg files and every file is checked concurrently.
+|
+| Notes:     This code only uses the Python standard library and PyYAML and
+|            can be run on any operating system. Only the GeoPackage metadata
+|            tables are read, never the rows (see report.conformance). The
+|            findings of every file are written to a JSON report.
+|
+| Author:    NENA Data Structures Committee, DS-GIS Template Working Group
+"""
+import json
+import os
+from sys import exit
+from time import perf_counter
+
+from report import CheckGeoPackages, CountFindings, FindGeoPackages
+from schema import LoadSchema, ResolveProfile
+from util import CreateLogger, TemplateError
+
+
+def format_result(result):
+    """ Returns a report line for a GeoPackage """
+    counts = CountFindings(result["findings"])
+    line = (f'|- {result["status"]:<7} {counts["FAIL"]:>4} FAIL {counts["WARN"]:>4} WARN '
+            f'{result["seconds"]:>7.3f}s {result["path"]}')
+    if result["error"]:
+        line += f': {result["error"]}'
+    return line
+
+
+def main(**params):
+    """
+    Main module
+    :param params    Dictionary of script parameters
+    :returns:        Dictionary of check statistics and results
+    :raises:         TemplateError when no GeoPackage is found
+    """
+    # Create log file
+    log, logfile = CreateLogger(logname=os.path.splitext(os.path.basename(__file__))[0])
+    log.info('============================================================')
+    log.info(f'Base Path: {__file__}')
+    log.info(' ')
+
+    start = perf_counter()
+    schema = LoadSchema(log=log)
+    # The layers of the profile are required, every layer of the CLDXF option is allowed
+    profile = ResolveProfile(schema, params["cldxf_support"], params["primary"])
+    layers = ResolveProfile(schema, params["cldxf_support"], 'false').layers_by_name
+
+    paths = FindGeoPackages(params["input_path"])
+    if not paths:
+        log.error(f'No GeoPackage found in {params["input_path"]}')
+        raise TemplateError(f'No GeoPackage found in {params["input_path"]}')
+    log.info(f'Checking {len(paths)} GeoPackages...')
+    kwargs = {"workers": int(params["workers"])} if params.get("workers") else {}
+    results = CheckGeoPackages(paths, schema, profile, layers, **kwargs)
+    for result in results:
+        log.info(format_result(result))
+
+    stats = {
+        "cldxf_support": params["cldxf_support"],
+        "primary": params["primary"],
+        "files": len(results),
+        "passed": sum(1 for result in results if result["status"] in ('passed', 'warned')),
+        "failed": sum(1 for result in results if result["status"] in ('failed', 'error')),
+        "seconds": perf_counter() - start,
+        "results": [dict(result, counts=CountFindings(result["findings"]),
+                         findings=[finding.as_dict() for finding in result["findings"]]) for result in results]
+    }
+    log.info(f'{stats["passed"]} of {stats["files"]} GeoPackages conform, {stats["failed"]} do not, '
+             f'in {stats["seconds"]:.2f}s.')
+
+    report_path = params.get("report") or os.path.join(
+        params["input_path"] if os.path.isdir(params["input_path"]) else os.path.dirname(params["input_path"]),
+        'ng911_conformance.json')
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    log.info(f'Conformance report written to {report_path}')
+    return stats
+
+
+if __name__ == '__main__':
+    """  Transfers console parameters to the script.
+
+    :returns params    Dictionary of script parameters
+               input_path: GeoPackage, or folder searched for GeoPackages
+               cldxf_support: CLXDF support options [Combined | CLDXF-CA | CLDXF-US]
+               primary: Only require the primary Service Boundary layers [true|false]
+               workers: Number of GeoPackages checked in parallel [8]
+               report: Path of the JSON report [<input_path>/ng911_conformance.json]
+    """
+    console_params = {
+        "input_path": os.path.expanduser('~'),
+        "cldxf_support": 'Combined',  # Combined | CLDXF-CA | CLDXF-US
+        "primary": "true",
+        "workers": '',
+        "report": ''
+    }
+    try:
+        stats = main(**console_params)
+    except TemplateError:
+        exit(1)
+    if stats["failed"]:
+        exit(1)
@@ -0,0 +1,265 @@
+# create_ng911_batch.py
+"""
+| Name:      Create NG9-1-1 Templates in Batch v3
+| Purpose:   Creates many NG9-1-1 GIS data model templates, for example one
+|            per county with its own output folder, name and spatial
+|            reference, from a CSV or JSON manifest of main(**params)
+|            parameter sets. The schema is compiled once and the builds are
+|            run in a pool of worker processes, each of which imports the
+|            builder, creates its logger and loads the compiled schema once.
+|
+| Notes:     A CSV manifest has one row per template and one column per
+|            parameter. A JSON manifest is either a list of parameter sets or
+|            an object with "defaults" applied to every set in "jobs". The
+|            "builder" parameter selects create_ng911_template.py (template,
+|            requires ArcGIS Pro) or create_ng911_gpkg.py (gpkg).
+|
+| Author:    NENA Data Structures Committee, DS-GIS Template Working Group
+"""
+import csv
+import importlib
+import json
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from sys import exit
+from time import perf_counter
+
+from schema import LoadSchema
+from util import CreateLogger, TemplateError
+
+import util.constants as CONSTANTS
+
+# ==============================================================================
+# BATCH Constants
+# ==============================================================================
+BATCH_MAX_WORKERS = None               # Default worker processes (None: number of CPUs)
+
+# Builder modules by the "builder" job parameter
+BUILDERS = {
+    'template': 'create_ng911_template',
+    'gpkg': 'create_ng911_gpkg'
+}
+
+# Parameters applied to every job unless set in the manifest
+JOB_DEFAULTS = {
+    "builder": 'template',
+    "params_type": 'CONSOLE',
+    "file_type": 'Both',
+    "gdb_version": 'CURRENT',
+    "cldxf_support": 'Combined',
+    "spatial_reference_horizontal": CONSTANTS.SR_WGS84_HORIZONTAL,
+    "allow_overwrite": "false",
+    "primary": "false",
+    "include_metadata": "true",
+    "use_cache": "true"
+}
+
+# Logger and compiled schema of a worker process
+_WORKER = {}
+
+
+def read_manifest(manifest_path):
+    """ Reads the parameter sets of a CSV or JSON manifest
+    :param manifest_path  Path of the .csv or .json manifest
+    :returns:             List of parameter dictionaries
+    """
+    if manifest_path.lower().endswith('.csv'):
+        with open(manifest_path, 'r', encoding='utf-8-sig', newline='') as f:
+            jobs = [{key: value for key, value in row.items() if value not in (None, '')} for row in csv.DictReader(f)]
+        defaults = {}
+    else:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if isinstance(manifest, list):
+            jobs, defaults = manifest, {}
+        else:
+            jobs, defaults = manifest["jobs"], manifest.get("defaults", {})
+
+    params_list = []
+    for job in jobs:
+        params = dict(JOB_DEFAULTS, **defaults)
+        params.update(job)
+        # Toolbox style 'true' | 'false' strings, as in console_params
+        for key, value in params.items():
+            if isinstance(value, bool):
+                params[key] = 'true' if value else 'false'
+        if "srs_id" in params:
+            params["srs_id"] = int(params["srs_id"])
+        params["params_type"] = 'CONSOLE'
+        if params["builder"] not in BUILDERS:
+            raise TemplateError(f'{params["builder"]} not recognized builder. Options are {", ".join(BUILDERS)}.')
+        if not params.get("output_folder") or not params.get("output_template_name"):
+            raise TemplateError(f'Manifest job {len(params_list) + 1} requires output_folder and output_template_name.')
+        params_list.append(params)
+    return params_list
+
+
+def init_worker():
+    """ Imports the builders and creates the logger and compiled schema once
+        per worker process
+    """
+    log, logfile = CreateLogger(logname=f'{os.path.splitext(os.path.basename(__file__))[0]}-{os.getpid()}')
+    _WORKER["log"] = log
+    _WORKER["schema"] = LoadSchema(log=log)
+    _WORKER["builders"] = {}
+    _WORKER["import_errors"] = {}
+    for name, module in BUILDERS.items():
+        try:
+            _WORKER["builders"][name] = importlib.import_module(module)
+        except ImportError as e:
+            # create_ng911_template.py requires ArcGIS Pro
+            _WORKER["import_errors"][name] = f'The {name} builder could not be imported: {e}'
+
+
+def job_status(result):
+    """ Returns the status of a finished job from the builder result """
+    if result.get("cached"):
+        return 'cached'
+    if "estimated_seconds" in result:
+        return 'planned'
+    if "operations" in result or "upgrades" in result:
+        return 'upgraded'
+    return 'built'
+
+
+def run_job(job, params):
+    """ Runs a single manifest job in a worker process
+    :param job        Job number in the manifest
+    :param params     Dictionary of main(**params) parameters
+    :returns:         Dictionary of job results
+    """
+    if not _WORKER:
+        init_worker()
+    log = _WORKER["log"]
+    builder_params = {key: value for key, value in params.items() if key != 'builder'}
+    report = {
+        "job": job,
+        "builder": params["builder"],
+        "name": Path(params["output_template_name"]).stem,
+        "output_folder": params["output_folder"],
+        "pid": os.getpid(),
+        "status": 'failed',
+        "error": '',
+        "paths": []
+    }
+    start = perf_counter()
+    try:
+        builder = _WORKER["builders"].get(params["builder"])
+        if builder is None:
+            raise TemplateError(_WORKER["import_errors"][params["builder"]])
+        log.info(f'Batch job {job}: {report["name"]} ({report["builder"]})')
+        result = builder.run(builder_params, log, schema=_WORKER["schema"]) or {}
+        report["status"] = job_status(result)
+        report["paths"] = result.get("paths") or ([result["path"]] if result.get("path") else [])
+    except TemplateError as e:
+        report["error"] = str(e)
+    except Exception as e:
+        log.error(traceback.format_exc())
+        report["error"] = f'{type(e).__name__}: {e}'
+    report["seconds"] = perf_counter() - start
+    return report
+
+
+def run_batch(params_list, workers=None, log=None):
+    """ Runs the manifest jobs in a process pool
+    :param params_list  List of parameter dictionaries from read_manifest()
+    :param workers      Number of worker processes, 1 runs the jobs in this
+                        process
+    :param log          Optional logger
+    :returns:           Dictionary of batch statistics and job results
+    """
+    workers = max(1, min(workers or BATCH_MAX_WORKERS or os.cpu_count() or 1, len(params_list) or 1))
+    start = perf_counter()
+    results = []
+    if workers == 1:
+        for job, params in enumerate(params_list, 1):
+            results.append(run_job(job, params))
+            if log:
+                log.info(format_job(results[-1]))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+            futures = [pool.submit(run_job, job, params) for job, params in enumerate(params_list, 1)]
+            for future in as_completed(futures):
+                results.append(future.result())
+                if log:
+                    log.info(format_job(results[-1]))
+    results.sort(key=lambda result: result["job"])
+    return {
+        "workers": workers,
+        "jobs": len(results),
+        "succeeded": sum(1 for result in results if result["status"] != 'failed'),
+        "failed": sum(1 for result in results if result["status"] == 'failed'),
+        "job_seconds": sum(result["seconds"] for result in results),
+        "seconds": perf_counter() - start,
+        "results": results
+    }
+
+
+def format_job(result):
+    """ Returns a report line for a job """
+    line = f'|- Job {result["job"]:>3} {result["status"]:<8} {result["seconds"]:>8.2f}s {result["name"]} ({result["output_folder"]})'
+    if result["error"]:
+        line += f': {result["error"]}'
+    return line
+
+
+def format_batch_report(stats):
+    """ Returns the report lines of a batch
+    :param stats      Dictionary returned by run_batch()
+    :returns:         List of report lines
+    """
+    lines = [f'{stats["succeeded"]} of {stats["jobs"]} jobs succeeded, {stats["failed"]} failed, '
+             f'in {stats["seconds"]:.2f}s with {stats["workers"]} workers '
+             f'({stats["job_seconds"]:.2f}s of job time).']
+    lines.extend(format_job(result) for result in stats["results"])
+    return lines
+
+
+def main(**params):
+    """
+    Main module
+    :param params    Dictionary of script parameters
+    :returns:        Dictionary of batch statistics and job results
+    """
+    # Create log file
+    log, logfile = CreateLogger(logname=os.path.splitext(os.path.basename(__file__))[0])
+    log.info('============================================================')
+    log.info(f'Base Path: {__file__}')
+    log.info(' ')
+
+    # Compile the schema once, the workers load it from the compiled cache
+    LoadSchema(log=log)
+    params_list = read_manifest(params["manifest"])
+    log.info(f'Running {len(params_list)} jobs from {params["manifest"]}...')
+    stats = run_batch(params_list, workers=int(params["workers"]) if params.get("workers") else None, log=log)
+    for line in format_batch_report(stats):
+        log.info(line)
+
+    report_path = params.get("report") or f'{os.path.splitext(params["manifest"])[0]}.report.json'
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(stats, f, indent=2)
+    log.info(f'Batch report written to {report_path}')
+    return stats
+
+
+if __name__ == '__main__':
+    """  Transfers console parameters to the script.
+
+    :returns params    Dictionary of script parameters
+               manifest: Path to the CSV or JSON manifest of template parameter sets
+               workers: Number of worker processes [number of CPUs]
+               report: Path of the JSON batch report [<manifest>.report.json]
+    """
+    console_params = {
+        "manifest": os.path.join(os.path.expanduser('~'), 'ng911_manifest.csv'),
+        "workers": '',
+        "report": ''
+    }
+    try:
+        stats = main(**console_params)
+    except TemplateError:
+        exit(1)
+    if stats["failed"]:
+        exit(1)
@@ -0,0 +1,197 @@
+# create_ng911_gpkg.py
+"""
+| Name:      Create NG9-1-1 GeoPackage v3
+| Purpose:   Creates a GeoPackage GIS data model template that is conformant
+|            with the NG9-1-1 Data Model Standard (NENA-STA-006.3-2026)
+|            directly from flatfile_schema_v3.yaml, without ArcGIS Pro.
+|
+| Notes:     This code only uses the Python standard library and PyYAML and
+|            can be run on any operating system. Layers, fields, defaults and
+|            CODED/RANGE domains are written with sqlite3 in a single
+|            transaction.
+|
+| Author:    NENA Data Structures Committee, DS-GIS Template Working Group
+"""
+import os
+from pathlib import Path
+from sys import exit
+from time import perf_counter
+
+from backends import CompilePlan, FormatUpgradeReport, LoadCostModel, SaveCostModel, UpgradeGeoPackage, WriteGeoPackage
+from schema import LoadSchema, ResolveProfile
+from util import ArtifactKey, CreateLogger, FetchArtifacts, StoreArtifacts, WriteMetadata
+from util import EventBus, JsonLinesSink, LogSink, TemplateError
+
+import util.constants as CONSTANTS
+
+
+def main(**params):
+    """
+    Main module
+    :param params    Dictionary of script parameters
+    :returns:        Dictionary of build or upgrade statistics
+    :raises:         TemplateError when the GeoPackage cannot be created
+    """
+    # Create log file
+    log, logfile = CreateLogger(logname=os.path.splitext(os.path.basename(__file__))[0])
+    log.info('============================================================')
+    log.info(f'Base Path: {__file__}')
+    log.info(' ')
+    return run(params, log)
+
+
+def run(params, log, schema=None):
+    """
+    Creates a GeoPackage with an existing logger. Used by main() and by
+    create_ng911_batch.py, which reuses one logger and compiled schema per
+    worker process.
+    :param params    Dictionary of script parameters
+    :param log       Logger object
+    :param schema    Optional compiled Schema object
+    :returns:        Dictionary of build or upgrade statistics
+    :raises:         TemplateError when the GeoPackage cannot be created
+    """
+    sinks = [LogSink(log)]
+    if params.get("event_log"):
+        sinks.append(JsonLinesSink(params["event_log"]))
+    events = EventBus(sinks)
+    try:
+        return create_geopackage(params, events, log, schema=schema)
+    finally:
+        events.close()
+
+
+def create_geopackage(params, events, log, schema=None):
+    """
+    Creates or upgrades the GeoPackage, or restores it from the artifact cache
+    :param params    Dictionary of script parameters
+    :param events    EventBus object
+    :param log       Logger object
+    :param schema    Optional compiled Schema object
+    :returns:        Dictionary of build or upgrade statistics
+    """
+    # Parsed from flatfile_schema_v3.yaml only when its content hash changes
+    if schema is None:
+        schema = LoadSchema(log=log)
+    profile = ResolveProfile(schema, params["cldxf_support"], params["primary"])
+
+    db_name = Path(params["output_template_name"]).stem
+    output_gpkg_path = os.path.join(params["output_folder"], f'{db_name}.gpkg')
+
+    # Compile the ordered build operations and their calibrated cost
+    # estimates. In plan mode the plan is written as JSON and nothing is built.
+    cost_model = LoadCostModel('geopackage')
+    plan = CompilePlan(
+        profile,
+        db_name=db_name,
+        include_metadata=params["include_metadata"] == "true",
+        backend='geopackage',
+        cost_model=cost_model
+    )
+    if params.get("plan", "false") == "true":
+        plan_path = os.path.join(params["output_folder"], f'{db_name}.plan.json')
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            f.write(plan.to_json())
+        events.info(f'Build plan of {len(plan.operations)} operations written to {plan_path}, '
+                    f'estimated {plan.estimated_seconds:.3f}s ({plan.calibrated_runs} calibrated runs).')
+        return plan.as_dict()
+
+    if os.path.exists(output_gpkg_path):
+        if params.get("upgrade", "false") == "true":
+            # Apply only the missing schema elements, keeping existing rows
+            events.start_phase(f'Upgrading {output_gpkg_path}...')
+            stats = UpgradeGeoPackage(
+                output_gpkg_path,
+                schema,
+                profile,
+                srs_id=params.get("srs_id", 4326),
+                srs_definition=params.get("spatial_reference_horizontal"),
+                include_metadata=params["include_metadata"] == "true",
+                log=log
+            )
+            for line in FormatUpgradeReport(stats):
+                events.info(line)
+            return stats
+        elif params["allow_overwrite"] == "true":
+            events.warning(f'Replacing {db_name}.gpkg...')
+        else:
+            events.error(f'{db_name}.gpkg already exists. Please select a different location or enable Allow Overwrite.')
+
+    # Restore an identical GeoPackage from the artifact cache instead of
+    # rebuilding it
+    use_cache = params.get("use_cache", "false") == "true"
+    artifact_key = ArtifactKey(schema.sha256, params, builder='create_ng911_gpkg')
+    if use_cache:
+        if os.path.exists(output_gpkg_path):
+            os.remove(output_gpkg_path)
+        if FetchArtifacts(artifact_key, params["output_folder"], db_name, log=log):
+            return {"path": output_gpkg_path, "cached": True}
+
+    events.start_phase(f'Creating {output_gpkg_path}...')
+    stats = WriteGeoPackage(
+        output_gpkg_path,
+        schema,
+        profile,
+        srs_id=params.get("srs_id", 4326),
+        srs_definition=params.get("spatial_reference_horizontal"),
+        include_metadata=params["include_metadata"] == "true"
+    )
+    events.created('database', output_gpkg_path,
+                   f'{db_name}.gpkg successfully created with {stats["layers"]} layers, {stats["fields"]} fields '
+                   f'and {stats["domains"]} domains in {stats["seconds"]:.3f}s.')
+    # The GeoPackage is written in a single transaction, so the plan is
+    # calibrated with the time of the whole build
+    metadata_path = f'{db_name}.gpkg.xml'
+    cost_model.observe([operation for operation in plan.operations if operation.target != metadata_path],
+                       stats["seconds"])
+    artifacts = [output_gpkg_path]
+    if params["include_metadata"] == "true":
+        # ISO 19115-3 metadata streamed from the schema, see util.metadata
+        start = perf_counter()
+        WriteMetadata(f'{output_gpkg_path}.xml', [layer.feature_class for layer in profile.layers])
+        cost_model.observe(plan.operations_for(metadata_path), perf_counter() - start)
+        artifacts.append(f'{output_gpkg_path}.xml')
+        events.info(f'{db_name}.gpkg.xml metadata successfully created.')
+    SaveCostModel(cost_model)
+    if use_cache:
+        StoreArtifacts(artifact_key, artifacts, params=params, log=log)
+    stats["cached"] = False
+    return stats
+
+
+if __name__ == '__main__':
+    """  Transfers console parameters to the script.
+
+    :returns params    Dictionary of script parameters
+               output_folder: Path to the output folder.
+               output_template_name: Name of the output database
+               cldxf_support: CLXDF support options [Combined | CLDXF-CA | CLDXF-US]
+               srs_id: EPSG code of the spatial reference [4326]
+               spatial_reference_horizontal: WKT of the spatial reference
+               allow_overwrite: [true|false]
+               primary: [true|false]
+               include_metadata: [true|false]
+               use_cache: Restore identical templates from the artifact cache, off when omitted [true|false]
+               upgrade: Upgrade an existing GeoPackage in place instead of replacing it [true|false]
+               event_log: Optional path of a JSON lines file receiving the progress events
+               plan: Write the build plan and its cost estimates as JSON instead of building [true|false]
+    """
+    console_params = {
+        "params_type": 'CONSOLE',      # Do not change this parameter
+        "output_folder": os.path.expanduser('~'),
+        "output_template_name": 'NG911_GISDataModelTemplate_v3',
+        "cldxf_support": 'Combined',  # Combined | CLDXF-CA | CLDXF-US
+        "srs_id": 4326,
+        "spatial_reference_horizontal": CONSTANTS.SR_WGS84_HORIZONTAL,
+        "allow_overwrite": "true",
+        "primary": "false",
+        "include_metadata": "true",
+        "use_cache": "true",
+        "upgrade": "false",
+        "event_log": '',
+        "plan": "false"
+    }
+    try:
+        main(**console_params)
+    except TemplateError:
+        exit(1)
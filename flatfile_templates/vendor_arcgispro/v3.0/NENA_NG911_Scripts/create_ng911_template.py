@@ -22,14 +22,16 @@
 """
 import arcpy
 import os
-import xml.etree.ElementTree as ET
-import yaml
 from pathlib import Path
 from shutil import rmtree
-from six import iteritems
 from sys import exit
+from time import perf_counter
 
-from util import CreateLogger
+from backends import ArcpyBackend, CompilePlan, FormatUpgradeReport, LoadCostModel, SaveCostModel
+from backends import UpgradeGeoPackage, UpgradeWorkspace
+from schema import LoadSchema, ResolveProfile
+from util import ArcpyProgressSink, EventBus, JsonLinesSink, LogSink, TemplateError
+from util import ArtifactKey, CreateLogger, FetchArtifacts, StoreArtifacts, WriteMetadata
 
 # ==============================================================================
 # Import Constants
@@ -37,280 +39,185 @@ from util import CreateLogger
 
 import util.constants as CONSTANTS
 
-DOMAINS = None
-FEATURE_CLASSES = None
-FIELDS = None
-GIS_DATA_LAYERS_REGISTRY = None
+# Plan actions timed together when a feature class is created
+LAYER_ACTIONS = ('create_layer', 'add_fields', 'assign_defaults', 'enable_tracking')
 
 # ==============================================================================
 # Functions
 # ==============================================================================
 
-def messages(msgs, msg_lvl, msg_type, log, progress=True):
+def create_event_bus(params, log, max_steps=None):
     """
-    Distributes code messages to file logger and ArcPy Messages and Progressor.
+    Creates the event bus distributing code messages to the file logger, the
+    ArcPy Messages and Progressor and an optional JSON lines event log.
 
-    :param msgs:
-    :param msg_lvl:
-    :param msg_type:
+    :param params:
     :param log:
-    :param progress:
+    :param max_steps:
     :return:
     """
-    for msg in msgs:
-        if msg_lvl == 'ERROR':
-            log.error(msg)
-            if msg_type == 'TOOLBOX':
-                # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/adderror.htm
-                arcpy.AddError(msg)
-            exit()
-        elif msg_lvl == 'WARN':
-            log.warning(msg)
-            if msg_type == 'TOOLBOX':
-                # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/addwarning.htm
-                arcpy.AddWarning(msg)
-        else:
-            log.info(msg)
-            if msg_type == 'TOOLBOX':
-                # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/addmessage.htm
-                arcpy.AddMessage(msg)
-                if progress:
-                    # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/setprogressor.htm
-                    arcpy.SetProgressorLabel(msg)
-                    arcpy.SetProgressorPosition()
+    sinks = [LogSink(log)]
+    if params["params_type"] == 'TOOLBOX':
+        sinks.append(ArcpyProgressSink(arcpy, max_steps=max_steps))
+    if params.get("event_log"):
+        sinks.append(JsonLinesSink(params["event_log"]))
+    return EventBus(sinks)
 
 
-def convert_datatype(in_data_type, params, log):
+def upgrade_template(output_fgdb_path, output_gpkg_path, schema, profile, params, events, log):
     """
-    Converts Data Model Schema data types to Esri data types.
+    Upgrades existing template databases in place, applying only the missing
+    domains, coded values, fields, defaults and metadata.
 
-    :param in_data_type:
+    :param output_fgdb_path:
+    :param output_gpkg_path:
+    :param schema:
+    :param profile:
     :param params:
+    :param events:
     :param log:
-    :return:
+    :return: List of upgrade statistics
     """
-    esri_data_type = None
-    if in_data_type == "TEXT":
-        esri_data_type = "TEXT"
-    elif in_data_type == "DATETIME":
-        esri_data_type = "DATE"
-    elif in_data_type == "INTEGER":
-        esri_data_type = "LONG"
-    elif in_data_type == "REAL":
-        esri_data_type = "DOUBLE"
-    else:
-        messages(
-            msgs=[
-                f'ERROR: {in_data_type} not recognized domain data type.'
-            ],
-            msg_lvl='ERROR',
-            msg_type=params["params_type"],
+    include_metadata = params["include_metadata"] == "true"
+    upgrades = []
+    if os.path.exists(output_fgdb_path):
+        events.start_phase(f'Upgrading {output_fgdb_path}...')
+        arcpy.env.workspace = output_fgdb_path
+        backend = ArcpyBackend(
+            workspace=output_fgdb_path,
+            spatial_reference=params["spatial_reference_horizontal"],
+            arcpy_module=arcpy
+        ).open()
+        upgrades.append(UpgradeWorkspace(backend, schema, profile, include_metadata=include_metadata, log=log))
+    if os.path.exists(output_gpkg_path):
+        events.start_phase(f'Upgrading {output_gpkg_path}...')
+        upgrades.append(UpgradeGeoPackage(
+            output_gpkg_path,
+            schema,
+            profile,
+            srs_definition=params["spatial_reference_horizontal"],
+            include_metadata=include_metadata,
             log=log
-        )
-    return esri_data_type
-
+        ))
+    for stats in upgrades:
+        for line in FormatUpgradeReport(stats):
+            events.info(line)
+    return upgrades
 
-def export_parse_metadata(tmp_path, item_path, name):
-    temp_xml = os.path.join(tmp_path, f'{name}.xml')
-    tmd = arcpy.metadata.Metadata(item_path)
-    tmd.exportMetadata(temp_xml, 'ISO19115_3')
-    return ET.parse(temp_xml).getroot()
 
-
-# ==============================================================================
-# Functions
-# ==============================================================================
-def main(**params):
-    """
-    Main module
-    :param params    Dictionary of script parameters from the
+def create_template(schema, profile, params, events, log):
     """
-    # =========================================================================
-    # Module Initialization
-    # =========================================================================
-
-    # Create log file
-    log, logfile = CreateLogger(logname=os.path.splitext(os.path.basename(__file__))[0])
-    log.info('============================================================')
-    log.info(f'Base Path: {__file__}')
-    log.info(' ')
-
-    # ==========================================================================
-    # Load YAML
-    # ==========================================================================
-    relative_yaml_path = os.path.join('..', '..', '..', 'schema', 'v3.0', 'flatfile_schema_v3.yaml')
-    absolute_yaml_path = os.path.abspath(relative_yaml_path)
-    with open(absolute_yaml_path, 'r', encoding='utf-8') as f:
-        data = yaml.load(f, Loader=yaml.SafeLoader)
-        DOMAINS = data['domains']
-        FEATURE_CLASSES = data['feature_classes']
+    Creates the template databases, or restores them from the artifact cache.
 
+    :param schema:
+    :param profile:
+    :param params:
+    :param events:
+    :param log:
+    :return: Dictionary describing the created, restored, upgraded or planned template
+    """
     # Get version of ArcPy
     #   Required to several functional differences in ArcPy between ArcMap and ArcGIS Pro
     #   https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/getinstallinfo.htm
     install_info = arcpy.GetInstallInfo()
 
-    # Parse the FEATURE_CLASSES for primary vs non-primary layers
-    # This differentiates primary Service Boundaries from non-primary Service Boundaries
-    primary = True if params["primary"] == "true" else False
-    primary_layers = []
-    if primary:
-        for layer in FEATURE_CLASSES:
-            if layer["primary"] == primary:
-                primary_layers.append(layer)
-    else:
-        primary_layers = FEATURE_CLASSES
-
-    # Initialize the Progressor, if running through ArcGIS Toolbox
-    if params["params_type"] == 'TOOLBOX':
-        # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/setprogressor.htm
-        max_steps = 1 + len(DOMAINS) + len(primary_layers)
-        arcpy.SetProgressor(
-            type='step',
-            min_range=0,
-            max_range=max_steps,
-            step_value=1
-        )
-
     # Verify that the code is running in ArcGIS Pro 3.x or later
     if install_info['Version'].startswith('10.'):
-        messages(
-            msgs=[
-                'This tool requires an ArcGIS Pro 3.x or later.'
-            ],
-            msg_lvl='ERROR',
-            msg_type=params["params_type"],
-            log=log
-        )
-
-    # =========================================================================
-    # Module Primary Code
-    # =========================================================================
+        events.error('This tool requires an ArcGIS Pro 3.x or later.')
 
     # Create output file geodatabase name and path
     db_name = Path(params["output_template_name"]).stem
     output_fgdb_path = os.path.join(params["output_folder"], f'{db_name}.gdb')
     output_gpkg_path = os.path.join(params["output_folder"], f'{db_name}.gpkg')
+    create_gpkg = params["file_type"] == 'Both' or params["file_type"] == 'GeoPackage (.gpkg)'
+
+    # Compile the ordered build operations and their calibrated cost
+    # estimates. In plan mode the plan is written as JSON and nothing is built.
+    cost_model = LoadCostModel('arcpy')
+    plan = CompilePlan(
+        profile,
+        db_name=db_name,
+        file_type=params["file_type"],
+        include_metadata=params["include_metadata"] == "true",
+        cost_model=cost_model
+    )
+    if params.get("plan", "false") == "true":
+        plan_path = os.path.join(params["output_folder"], f'{db_name}.plan.json')
+        with open(plan_path, 'w', encoding='utf-8') as f:
+            f.write(plan.to_json())
+        events.info(f'Build plan of {len(plan.operations)} operations written to {plan_path}, '
+                    f'estimated {plan.estimated_seconds:.1f}s ({plan.calibrated_runs} calibrated runs).')
+        return plan.as_dict()
 
     # Check if the File Geodatabase exists. Add Error if Allow Overwrite not enabled
     # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/exists.htm
     if os.path.exists(output_fgdb_path) or os.path.exists(output_gpkg_path):
-        if params["allow_overwrite"] == "true":
-            messages(
-                msgs=[
-                    'Deleting {}...'.format(f'{db_name} database...')
-                ],
-                msg_lvl='WARN',
-                msg_type=params["params_type"],
-                log=log
-            )
+        if params.get("upgrade", "false") == "true":
+            # Apply only the missing schema elements, keeping existing rows
+            return {"upgrades": upgrade_template(output_fgdb_path, output_gpkg_path, schema, profile, params, events, log)}
+        elif params["allow_overwrite"] == "true":
+            events.warning(f'Deleting {db_name} database...')
             # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/clear-workspace-cache.htm
             arcpy.management.ClearWorkspaceCache()
             # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/delete.htm
             arcpy.management.Delete(output_fgdb_path)
             arcpy.management.Delete(output_gpkg_path)
         else:
-            messages(
-                msgs=[
-                    f'{db_name} already exists. Please select a different location or enable Allow Overwrite in the Options.'
-                ],
-                msg_lvl='ERROR',
-                msg_type=params["params_type"],
-                log=log
-            )
-
-    messages(
-        msgs=[
-            '{}'.format("#" * 80),
-            'Creating template database(s)...',
-            '{}'.format("#" * 80)
-        ],
-        msg_lvl='INFO',
-        msg_type=params["params_type"],
-        log=log,
-        progress=False
-    )
+            events.error(f'{db_name} already exists. Please select a different location or enable Allow Overwrite in the Options.')
+
+    # Restore an identical template from the artifact cache instead of
+    # rebuilding it
+    use_cache = params.get("use_cache", "false") == "true"
+    artifact_key = ArtifactKey(schema.sha256, params, builder='create_ng911_template')
+    if use_cache:
+        restored = FetchArtifacts(artifact_key, params["output_folder"], db_name, log=log)
+        if restored:
+            events.info(f'{db_name} restored from the template cache.')
+            return {"paths": restored, "cached": True}
+
+    events.start_phase('Creating template database(s)...')
 
     # Create new File Geodatabase
-    messages(
-        msgs=[
-            f'Creating {output_fgdb_path}...'
-        ],
-        msg_lvl='INFO',
-        msg_type=params["params_type"],
-        log=log
-    )
+    events.detail(f'Creating {output_fgdb_path}...')
 
     # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-file-gdb.htm
+    start = perf_counter()
     arcpy.management.CreateFileGDB(
         out_folder_path=params["output_folder"],
         out_name=params["output_template_name"],
         out_version=params["gdb_version"]
     )
+    cost_model.observe(plan.operations_for(f'{db_name}.gdb', ('create_workspace',)), perf_counter() - start)
 
     # Check if the File Geodatabase was created
     if not arcpy.Exists(output_fgdb_path):
-        messages(
-            msgs=[
-                f'ERROR: {db_name}.gdb failed to be created.'
-            ],
-            msg_lvl='ERROR',
-            msg_type=params["params_type"],
-            log=log
-        )
-    else:
-        messages(
-            msgs=[
-                f'{db_name}.gdb successfully created.'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log
-        )
+        events.error(f'ERROR: {db_name}.gdb failed to be created.')
+    events.created('database', output_fgdb_path, f'{db_name}.gdb successfully created.')
 
     arcpy.env.workspace = output_fgdb_path
 
-    if params["file_type"] == 'Both' or params["file_type"] == 'GeoPackage (.gpkg)':
+    if create_gpkg:
         # Create new Geopackage
-        messages(
-            msgs=[
-                f'Creating {output_gpkg_path}...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log
-        )
+        events.detail(f'Creating {output_gpkg_path}...')
 
         # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-sqlite-database.htm
+        start = perf_counter()
         arcpy.management.CreateSQLiteDatabase(
             out_database_name=output_gpkg_path,
             spatial_type='GEOPACKAGE'
         )
+        cost_model.observe(plan.operations_for(f'{db_name}.gpkg', ('create_workspace',)), perf_counter() - start)
 
         # Check if the GeoPackage was created
         if not arcpy.Exists(output_gpkg_path):
-            messages(
-                msgs=[
-                    f'ERROR: {db_name}.gpkg failed to be created.'
-                ],
-                msg_lvl='ERROR',
-                msg_type=params["params_type"],
-                log=log
-            )
-        else:
-            messages(
-                msgs=[
-                    f'{db_name}.gpkg successfully created.'
-                ],
-                msg_lvl='INFO',
-                msg_type=params["params_type"],
-                log=log
-            )
+            events.error(f'ERROR: {db_name}.gpkg failed to be created.')
+        events.created('database', output_gpkg_path, f'{db_name}.gpkg successfully created.')
 
     # =========================================================================
     # Create NG9-1-1 FGDB Metadata
     # https://pro.arcgis.com/en/pro-app/latest/arcpy/metadata/metadata-class.htm
     if params['include_metadata'] == 'true':
+        start = perf_counter()
         md = arcpy.metadata.Metadata(output_fgdb_path)
         md.title = CONSTANTS.MD_TITLE
         md.summary = CONSTANTS.MD_SUMMARY
@@ -318,315 +225,180 @@ def main(**params):
         md.tags = CONSTANTS.MD_KEYWORDS
         md.credits = CONSTANTS.MD_CREDIT
         md.save()
+        cost_model.observe(plan.operations_for(f'{db_name}.gdb', ('write_metadata',)), perf_counter() - start)
 
     # =========================================================================
     # Create NENA Domains and populate initial data, if defined by NENA.
-    messages(
-        msgs=[
-            '{}'.format("#" * 80),
-            'Creating Domains...',
-            '{}'.format("#" * 80)
-        ],
-        msg_lvl='INFO',
-        msg_type=params["params_type"],
-        log=log,
-        progress=False
-    )
-    for domain in DOMAINS:
-        messages(
-            msgs=[
-                f'Creating Domain: {domain["domain_name"]}...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log
-        )
-        # Convert DOMAIN data types to Esri equivalents
-        esri_data_type = convert_datatype(domain["field_type"], params, log)
-
-        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-domain.htm
-        arcpy.management.CreateDomain(
-            in_workspace=output_fgdb_path,
-            domain_name=domain["domain_name"],
-            domain_description=domain["domain_description"],
-            field_type=esri_data_type,
-            domain_type=domain["domain_type"]
-        )
-        if domain["values"] is not None:
-            if domain["domain_type"] == 'CODED':
-                # The following lines are a workaround for Issue #62 where
-                # Python prior to v3.6 where dictionaries are not sorted.
-                values = []
-                for key, value in iteritems(domain["values"]):
-                    values.append([key, value])
-                values.sort()
-                for value in values:
-                    messages(
-                        msgs=[
-                            '|---Creating {} domain value'.format(value[0])
-                        ],
-                        msg_lvl='INFO',
-                        msg_type=params["params_type"],
-                        log=log,
-                        progress=False
-                    )
-                    # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-coded-value-to-domain.htm
-                    arcpy.management.AddCodedValueToDomain(
-                        in_workspace=output_fgdb_path,
-                        domain_name=domain["domain_name"],
-                        code=value[0],
-                        code_description=value[1]
-                    )
-                messages(
-                    msgs=[
-                        f'|-  Inserted {len(values)} coded values into {domain["domain_name"]}.'
-                    ],
-                    msg_lvl='INFO',
-                    msg_type=params["params_type"],
-                    log=log,
-                    progress = False
-                )
-            elif domain["domain_type"] == 'RANGE':
-                min_val = domain["values"]["min"]
-                max_val = domain["values"]["max"]
-                # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/set-value-for-range-domain.htm
-                arcpy.management.SetValueForRangeDomain(
-                    in_workspace=output_fgdb_path,
-                    domain_name=domain["domain_name"],
-                    min_value=min_val,
-                    max_value=max_val
-                )
-                messages(
-                    msgs=[
-                        f'|-  Set ranged values for {domain["domain_name"]} between {str(min_val)} and {str(max_val)}.'
-                    ],
-                    msg_lvl='INFO',
-                    msg_type=params["params_type"],
-                    log=log,
-                    progress=False
-                )
-            else:
-                messages(
-                    msgs=[
-                        'ERROR: Could not determine domain type.'
-                    ],
-                    msg_lvl='ERROR',
-                    msg_type=params["params_type"],
-                    log=log
-                )
-
-    # Create NENA Feature Classes
-    messages(
-        msgs=[
-            '{}'.format("#" * 80),
-            'Creating Feature Classes...',
-            '{}'.format("#" * 80)
-        ],
-        msg_lvl='INFO',
-        msg_type=params["params_type"],
-        log=log,
-        progress=False
-    )
+    events.start_phase('Creating Domains...')
+    backend = ArcpyBackend(
+        workspace=output_fgdb_path,
+        spatial_reference=params["spatial_reference_horizontal"],
+        arcpy_module=arcpy
+    ).open()
+    for domain in profile.domains:
+        events.detail(f'Creating Domain: {domain.name}...')
+        # Coded values are loaded with a single TableToDomain call
+        try:
+            start = perf_counter()
+            value_count = backend.create_domain(domain)
+            cost_model.observe(plan.operations_for(domain.name), perf_counter() - start)
+        except ValueError as e:
+            events.error(f'ERROR: {e}')
+        events.created('domain', domain.name, f'Created Domain: {domain.name}')
+        if domain.is_coded and value_count:
+            events.detail(f'|-  Inserted {value_count} coded values into {domain.name}.')
+        elif domain.is_range and value_count:
+            events.detail(f'|-  Set ranged values for {domain.name} between {str(domain.min_value)} and {str(domain.max_value)}.')
 
     # =========================================================================
-    # Create Feature Classes
-    for fc in primary_layers:
-        messages(
-            msgs=[
-                f'Creating Feature Class: {fc["name"]}...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log
-        )
-
-        # =====================================================================
-        # Create empty Feature Class
-        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/create-feature-class.htm
-        arcpy.management.CreateFeatureclass(
-            out_path=output_fgdb_path,
-            out_name=fc["name"],
-            geometry_type=fc["geometry_type"],
-            has_m="Yes" if fc["has_m"] else "No",
-            has_z="Yes" if fc["has_z"] else "No",
-            spatial_reference=params["spatial_reference_horizontal"],
-            out_alias=fc["alias"]
-        )
-
-        messages(
-            msgs=[
-                f'|- Creating fields for {fc["name"]}...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log,
-            progress=False
-        )
+    # Create NENA Feature Classes
+    events.start_phase('Creating Feature Classes...')
+    for layer in profile.layers:
+        fc = layer.feature_class
+        events.detail(f'Creating Feature Class: {fc.name}...')
+        events.detail(f'|- Creating fields for {fc.name}...')
+
+        # CLDXF field removals and domain exceptions are already applied by
+        # the profile.
+        defaults = dict(layer.defaults)
+        for field in layer.fields:
+            events.detail(f'|---Creating {field.name} field')
+            if field.name in defaults:
+                events.detail(f'|----Adding default value "{defaults[field.name]}" to {field.name} field...')
+
+        for field_name in layer.skipped_fields:
+            events.detail(f'|---Skipping {field_name} field, not supported in {params["cldxf_support"]}')
 
-        # Determine what CLDXF version to support
-        cldxf_field_removals = []
-        for cldxf_country in fc["country_specific_field_removals"]:
-            if params["cldxf_support"] == f'CLDXF-{cldxf_country}':
-                cldxf_field_removals = fc["country_specific_field_removals"][cldxf_country]
-
-        # Append fields to Feature Class
-        for field in fc["fields"]:
-            if field["field_name"] not in cldxf_field_removals:
-                messages(
-                    msgs=[
-                        f'|---Creating {field["field_name"]} field'
-                    ],
-                    msg_lvl='INFO',
-                    msg_type=params["params_type"],
-                    log=log,
-                    progress=False
-                )
-                # Convert FIELD data types to Esri equivalents
-                esri_data_type = convert_datatype(field["field_type"], params, log)
-
-                # Domain handling due to differences in CDLXF versions
-                domain = field["field_domain"]
-                if params["cldxf_support"] == f'CLDXF-CA' and field["field_name"] == 'Place_Type':
-                    domain = ''
-
-                # Add field to feature class
-                # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/add-field.htm
-                arcpy.management.AddField(
-                    in_table=fc["name"],
-                    field_name=field["field_name"],
-                    field_type=esri_data_type,
-                    field_precision=field["field_precision"],
-                    field_scale=field["field_scale"],
-                    field_length=field["field_length"],
-                    field_alias=field["field_alias"],
-                    field_is_nullable=field["field_is_nullable"],
-                    field_is_required=field["field_is_required"],
-                    field_domain=domain
-                )
-
-                # Populate default value to field
-                default_value = field["field_default"]
-                if len(default_value) > 0:
-                    messages(
-                        msgs=[
-                            f'|----Adding default value "{default_value}" to {field["field_name"]} field...'
-                        ],
-                        msg_lvl='INFO',
-                        msg_type=params["params_type"],
-                        log=log,
-                        progress=False
-                    )
-                    # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/assign-default-to-field.htm
-                    arcpy.management.AssignDefaultToField(
-                        in_table=fc["name"],
-                        field_name=field["field_name"],
-                        default_value=default_value
-                    )
-            else:
-                messages(
-                    msgs=[
-                        f'|---Skipping {field["field_name"]} field, not supported in {params["cldxf_support"]}'
-                    ],
-                    msg_lvl='INFO',
-                    msg_type=params["params_type"],
-                    log=log,
-                    progress=False
-                )
+        # Convert DateUpdate field to UTC time tracked field.
+        events.detail('|- Enabling UTC date tracking on DateUpdate field...')
 
         # =====================================================================
-        # Convert DateUpdate field to UTC time tracked field.
-        messages(
-            msgs=[
-                '|- Enabling UTC date tracking on DateUpdate field...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log,
-            progress=False
-        )
-        # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/enable-editor-tracking.htm
-        arcpy.management.EnableEditorTracking(
-            in_dataset=fc["name"],
-            last_edit_date_field="DateUpdate",
-            record_dates_in='UTC'
-        )
+        # Create the Feature Class, its fields, default values and editor
+        # tracking. Fields are added in AddFields batches by the backend.
+        try:
+            start = perf_counter()
+            backend.create_feature_class(layer)
+            cost_model.observe(plan.operations_for(fc.name, LAYER_ACTIONS), perf_counter() - start)
+        except ValueError as e:
+            events.error(f'ERROR: {e}')
 
         # =====================================================================
         # Create NG9-1-1 Feature Class Metadata
         # https://pro.arcgis.com/en/pro-app/latest/arcpy/metadata/metadata-class.htm
         if params['include_metadata'] == 'true':
-            messages(
-                msgs=[
-                    '|- Creating Feature Class Metadata...'
-                ],
-                msg_lvl='INFO',
-                msg_type=params["params_type"],
-                log=log,
-                progress=False
-            )
-            fc_md = arcpy.metadata.Metadata(fc["name"])
-            fc_md.title = fc['alias']
-            fc_md.summary = fc["metadata"]["description"]
-            fc_md.description = fc["metadata"]["description"]
-            fc_md.tags = ", ".join(fc["metadata"]["keywords"])
-            fc_md.save()
+            events.detail('|- Creating Feature Class Metadata...')
+            start = perf_counter()
+            backend.set_metadata(layer)
+            cost_model.observe(plan.operations_for(fc.name, ('write_metadata',)), perf_counter() - start)
+        events.created('feature class', fc.name, f'Created Feature Class: {fc.name}')
 
     # =========================================================================
     # Module Cleanup
     # =========================================================================
 
     # GeoPackage Support
-    if params["file_type"] == 'Both' or params["file_type"] == 'GeoPackage (.gpkg)':
+    if create_gpkg:
         # Copy feature classes from FGDB to GPKG
-        messages(
-            msgs=[
-                '|- Copying FGDB feature classes to GeoPackage...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log,
-            progress=False
-        )
+        events.start_phase('Copying FGDB feature classes to GeoPackage...')
         # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/listfeatureclasses.htm
         featureclasses = arcpy.ListFeatureClasses()
         for feat in featureclasses:
             # https://pro.arcgis.com/en/pro-app/latest/tool-reference/data-management/copy-features.htm
             out_fc = os.path.join(output_gpkg_path, feat)
+            start = perf_counter()
             arcpy.management.CopyFeatures(feat, out_fc)
+            cost_model.observe(plan.operations_for(feat, ('copy_features',)), perf_counter() - start)
+            events.detail(f'|- Copied {feat} to {db_name}.gpkg')
 
-        # Create GeoPackage Metadata
-        messages(
-            msgs=[
-                '|- Writing GeoPackage metadata...'
-            ],
-            msg_lvl='INFO',
-            msg_type=params["params_type"],
-            log=log,
-            progress=False
-        )
-        output_xml = f'{output_gpkg_path}.xml'
-        tmp_path = os.path.join(os.path.dirname(__file__), 'tmp')
-        if not os.path.exists(tmp_path):
-            os.makedirs(tmp_path)
-        xml_root = ET.Element('NENAStandardforNG9-1-1GISDataModel')
-        db_root = export_parse_metadata(tmp_path, output_fgdb_path, name="database")
-        db_element = ET.SubElement(xml_root, 'GISDataModel')
-        db_element.append(db_root)
-
-        layers = arcpy.ListFeatureClasses()
-        for layer in layers:
-            item_path = os.path.join(output_fgdb_path, layer)
-            item_root = export_parse_metadata(tmp_path, item_path, name=layer)
-            item_element = ET.SubElement(xml_root, 'LayerMetadata', name=layer)
-            item_element.append(item_root)
-
-        tree = ET.ElementTree(xml_root)
-        tree.write(output_xml, encoding="utf-8", xml_declaration=True)
+        # Create GeoPackage Metadata. The ISO 19115-3 documents are built from
+        # the schema metadata and streamed to the .gpkg.xml file.
+        if params['include_metadata'] == 'true':
+            events.detail('|- Writing GeoPackage metadata...')
+            start = perf_counter()
+            WriteMetadata(f'{output_gpkg_path}.xml', [layer.feature_class for layer in profile.layers])
+            cost_model.observe(plan.operations_for(f'{db_name}.gpkg.xml'), perf_counter() - start)
+
+    # Calibrate the plan cost estimates of future runs with this build
+    SaveCostModel(cost_model)
 
     if params["file_type"] == 'GeoPackage (.gpkg)':
         arcpy.management.ClearWorkspaceCache()
         rmtree(output_fgdb_path)
 
+    if use_cache:
+        arcpy.management.ClearWorkspaceCache()
+        artifacts = [output_fgdb_path]
+        if create_gpkg:
+            artifacts.append(output_gpkg_path)
+            if params['include_metadata'] == 'true':
+                artifacts.append(f'{output_gpkg_path}.xml')
+        StoreArtifacts(artifact_key, artifacts, params=params, log=log)
+
+    paths = [output_gpkg_path] if create_gpkg else []
+    if params["file_type"] != 'GeoPackage (.gpkg)':
+        paths.insert(0, output_fgdb_path)
+    return {"paths": paths, "cached": False}
+
+
+# ==============================================================================
+# Functions
+# ==============================================================================
+def run(params, log, schema=None):
+    """
+    Creates a template with an existing logger. Used by main() and by
+    create_ng911_batch.py, which reuses one logger and compiled schema per
+    worker process.
+    :param params    Dictionary of script parameters
+    :param log       Logger object
+    :param schema    Optional compiled Schema object
+    :returns:        Dictionary describing the created, restored, upgraded or planned template
+    :raises:         TemplateError when the template cannot be created
+    """
+    # ==========================================================================
+    # Load YAML
+    # ==========================================================================
+    # Parsed from flatfile_schema_v3.yaml only when its content hash changes
+    if schema is None:
+        schema = LoadSchema(log=log)
+
+    # Resolve the layers, fields and defaults for the CLDXF option and
+    # primary vs non-primary Service Boundaries. Profiles are precomputed
+    # and cached with the compiled schema.
+    profile = ResolveProfile(schema, params["cldxf_support"], params["primary"])
+
+    # Messages are batched by the event bus; the Progressor, if running
+    # through ArcGIS Toolbox, advances once per database, domain and feature
+    # class.
+    databases = 2 if params["file_type"] == 'Both' or params["file_type"] == 'GeoPackage (.gpkg)' else 1
+    events = create_event_bus(params, log, max_steps=databases + len(profile.domains) + len(profile.layers))
+
+    # =========================================================================
+    # Module Primary Code
+    # =========================================================================
+    try:
+        return create_template(schema, profile, params, events, log)
+    finally:
+        events.close()
+
+
+def main(**params):
+    """
+    Main module
+    :param params    Dictionary of script parameters from the
+    :returns:        Dictionary describing the created, restored, upgraded or planned template
+    :raises:         TemplateError when the template cannot be created
+    """
+    # =========================================================================
+    # Module Initialization
+    # =========================================================================
+
+    # Create log file
+    log, logfile = CreateLogger(logname=os.path.splitext(os.path.basename(__file__))[0])
+    log.info('============================================================')
+    log.info(f'Base Path: {__file__}')
+    log.info(' ')
+
+    return run(params, log)
 
 if __name__ == '__main__':
     """  Transfers Toolbox Parameters to the script.
@@ -642,6 +414,10 @@ if __name__ == '__main__':
                allow_overwrite: [true|false]
                primary: [true|false]
                include_metadata: [true|false]
+               use_cache: Restore identical templates from the artifact cache, off when omitted [true|false]
+               upgrade: Upgrade existing databases in place instead of replacing them [true|false]
+               event_log: Optional path of a JSON lines file receiving the progress events
+               plan: Write the build plan and its cost estimates as JSON instead of building [true|false]
     """
 
     # The console_params are provided if you wish to run this Python script from
@@ -661,7 +437,11 @@ if __name__ == '__main__':
         "spatial_reference_horizontal": CONSTANTS.SR_WGS84_HORIZONTAL,
         "allow_overwrite": "true",
         "primary": "false",
-        "include_metadata": "true"
+        "include_metadata": "true",
+        "use_cache": "true",
+        "upgrade": "false",
+        "event_log": '',
+        "plan": "false"
     }
 
     # The toolbox_params are used if running this code from an ArcGIS Toolbox
@@ -678,4 +458,9 @@ if __name__ == '__main__':
         "primary": arcpy.GetParameterAsText(7),
         "include_metadata": arcpy.GetParameterAsText(8)
     }
-    main(**toolbox_params)
+
+    # Errors have already been reported to the log and the ArcPy Messages
+    try:
+        main(**toolbox_params)
+    except TemplateError:
+        exit(1)
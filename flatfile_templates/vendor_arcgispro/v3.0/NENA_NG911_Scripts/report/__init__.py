@@ -0,0 +1,62 @@
+import importlib
+
+from . import conformance
+from . import geometry
+from . import profiling
+from . import render
+from . import rules
+from .rules import Finding
+
+# report.xlsx requires openpyxl and is imported by run_schema_report.py
+# report.nesting and report.topology require shapely and are run as `python -m report.<module>`
+
+# conformance modules
+CheckGeoPackage = conformance.check_geopackage
+CheckGeoPackages = conformance.check_geopackages
+FindGeoPackages = conformance.find_geopackages
+
+# geometry modules
+ReadGeometry = geometry.read_geometry
+ReadPoint = geometry.read_point
+
+# profiling modules
+ProfileGeoPackage = profiling.profile_geopackage
+ProfileFindings = profiling.profile_findings
+
+# render modules
+RenderJson = render.render_json
+RenderCsv = render.render_csv
+RenderMarkdown = render.render_markdown
+WriteFindings = render.write_findings
+
+# rules modules
+EvaluateRules = rules.evaluate_rules
+CountFindings = rules.count_findings
+
+# Aliases of the modules run as `python -m report.<module>`, imported on first
+# use: importing them with the package would load them twice when they are run
+LAZY_ALIASES = {
+    # addresses modules
+    'CheckAddresses': ('addresses', 'check_addresses'),
+    # incremental modules
+    'UpdateReport': ('incremental', 'update_report'),
+    # nguid modules
+    'NguidIndex': ('nguid', 'NguidIndex'),
+    'CheckNguid': ('nguid', 'check_nguid'),
+    # ranges modules
+    'CheckRanges': ('ranges', 'check_ranges'),
+    'FindOverlaps': ('ranges', 'find_overlaps'),
+    # validation modules
+    'ValidateGeoPackage': ('validation', 'validate_geopackage'),
+    # watermark modules
+    'UpdateFindings': ('watermark', 'update_findings')
+}
+
+
+def __getattr__(name):
+    if name not in LAZY_ALIASES:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module_name, attribute = LAZY_ALIASES[name]
+    value = getattr(importlib.import_module(f'.{module_name}', __name__), attribute)
+    globals()[name] = value
+    return value
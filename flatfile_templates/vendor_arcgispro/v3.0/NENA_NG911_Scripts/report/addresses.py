@@ -0,0 +1,346 @@
+"""
+| Name:      addresses.py
+| Purpose:   Address consistency check of SiteStructureAddressPoint against
+|            RoadCenterLine. Each address point is matched to the nearest
+|            road segments of its complete street name within a search
+|            radius, and its Add_Number is checked against the parity-aware
+|            address range of the side of the segment it lies on. Points
+|            without a segment of their street nearby, or outside of its
+|            range, are reported.
+|
+| Notes:     The extent of the address points is split into tiles of about
+|            ADDRESS_TILE_POINTS points, read through the GeoPackage R-tree
+|            spatial indexes, and each tile is checked in a worker process
+|            with grid indexes of the road segments around it, one per street
+|            name so that a point only measures the segments of its street,
+|            and memory is bounded by the tile size. Without spatial indexes the layers
+|            are checked as a single tile. Geometries are read by
+|            report.geometry, distances are planar in the units of the
+|            spatial reference. Run `python -m report.addresses <gpkg>` from
+|            the NENA_NG911_Scripts folder to write the findings as CSV.
+"""
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, inf, sqrt
+from time import perf_counter
+
+from schema import LoadSchema
+
+from .conformance import has_table
+from .geometry import GridIndex, line_strings, read_geometry, read_point, segment_distance
+from .profiling import connect, feature_tables
+from .ranges import RANGE_LAYER, RANGE_SIDES, STREET_NAME_FIELDS, AddressRange, normalize_name
+
+# ==============================================================================
+# ADDRESSES Constants
+# ==============================================================================
+ADDRESS_LAYER = 'SiteStructureAddressPoint'
+ADDRESS_NUMBER_FIELD = 'Add_Number'
+ADDRESS_CANDIDATES = 5                 # Nearest road segments considered per point
+ADDRESS_TILE_POINTS = 50000            # Address points checked per tile
+ADDRESS_WORKERS = os.cpu_count() or 1  # Tiles checked in parallel processes
+
+# Search radius in the units of geographic (degrees, about 250 m) and projected spatial references
+ADDRESS_SEARCH_RADIUS = {True: 0.0025, False: 250.0}
+
+# Address rules: description
+ADDRESS_RULES = {
+    'address_unmatched': 'No road segment of the street within the search radius',
+    'address_range': 'Address number is outside of the address range of its side of the nearest road segments'
+}
+
+ADDRESS_COLUMNS = ('rowid', 'nguid', 'number', 'street', 'rule', 'road_rowid')
+
+
+class AddressFinding(object):
+    """ An address point that failed an address rule
+    :param rowid      Row id of the address point
+    :param nguid      NGUID of the address point
+    :param number     Add_Number of the address point
+    :param street     Normalized complete street name of the address point
+    :param rule       Name of the failed ADDRESS_RULES rule
+    :param road       Row id of the nearest road segment of the street, or
+                      None
+    """
+    __slots__ = ('rowid', 'nguid', 'number', 'street', 'rule', 'road')
+
+    def __init__(self, rowid, nguid, number, street, rule, road=None):
+        self.rowid = rowid
+        self.nguid = nguid
+        self.number = number
+        self.street = street
+        self.rule = rule
+        self.road = road
+
+    def as_tuple(self):
+        return self.rowid, self.nguid, self.number, self.street, self.rule, self.road
+
+    def __repr__(self):
+        return f'AddressFinding({self.rowid}, {self.number} {self.street!r}, {self.rule!r})'
+
+
+class Road(object):
+    """ A road segment of a tile """
+    __slots__ = ('rowid', 'street', 'ranges')
+
+    def __init__(self, rowid, street, ranges):
+        self.rowid = rowid
+        self.street = street
+        self.ranges = ranges
+
+    def __repr__(self):
+        return f'Road({self.rowid}, {self.street!r})'
+
+
+class SpatialTable(object):
+    """ A feature table read by the address check
+    :param table      Table name
+    :param geometry   Geometry column name
+    :param rtree      Name of the R-tree spatial index table, or None
+    :param columns    Lowercase column names of the table
+    """
+    __slots__ = ('table', 'geometry', 'rtree', 'columns')
+
+    def __init__(self, table, geometry, rtree, columns):
+        self.table = table
+        self.geometry = geometry
+        self.rtree = rtree
+        self.columns = columns
+
+    def column(self, name):
+        return f'[{name}]' if name.lower() in self.columns else 'NULL'
+
+    def select(self, fields, bbox=None, contains=False):
+        """ Returns the query of the rowid, geometry and fields of the features
+            within a bounding box
+        :param fields     Field names, NULL when missing from the table
+        :param bbox       Tuple of (min x, min y, max x, max y), or None for
+                          every feature
+        :param contains   Select the features whose minimum x and y are in
+                          the half-open bounding box, each point then belongs
+                          to a single tile, instead of the features
+                          intersecting it
+        :returns:         Tuple of the SQL query and its parameters
+        """
+        columns = ', '.join(self.column(field) for field in fields)
+        sql = f'SELECT f.rowid, f.[{self.geometry}], {columns} FROM [{self.table}] f'
+        if bbox is None or self.rtree is None:
+            return sql, ()
+        sql += f' JOIN [{self.rtree}] r ON r.id = f.rowid WHERE '
+        parameters = bbox[0], bbox[2], bbox[1], bbox[3]
+        if contains:
+            return sql + 'r.minx >= ? AND r.minx < ? AND r.miny >= ? AND r.miny < ?', parameters
+        return sql + 'r.maxx >= ? AND r.minx <= ? AND r.maxy >= ? AND r.miny <= ?', parameters
+
+
+def spatial_table(connection, table):
+    """ Reads the geometry column and spatial index of a feature table
+    :returns:         SpatialTable object
+    """
+    column = connection.execute('SELECT column_name FROM gpkg_geometry_columns WHERE lower(table_name) = lower(?)',
+                                (table,)).fetchone()
+    if column is None:
+        raise ValueError(f'{table} is not a feature table')
+    rtree = f'rtree_{table}_{column[0]}'
+    columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{table}])')}
+    return SpatialTable(table, column[0], rtree if has_table(connection, rtree) else None, columns)
+
+
+def is_geographic(connection, table):
+    """ Returns whether the spatial reference of a feature table is geographic """
+    row = connection.execute(
+        'SELECT s.organization_coordsys_id, s.definition FROM gpkg_geometry_columns g '
+        'JOIN gpkg_spatial_ref_sys s ON s.srs_id = g.srs_id WHERE lower(g.table_name) = lower(?)', (table,)).fetchone()
+    return row is not None and (row[0] == 4326 or str(row[1]).lstrip().upper().startswith(('GEOGCS', 'GEOGCRS')))
+
+
+def plan_tiles(connection, points, tile_points=ADDRESS_TILE_POINTS):
+    """ Splits the extent of the address points into tiles
+    :param connection     sqlite3 connection
+    :param points         SpatialTable object of the address points
+    :param tile_points    Address points per tile, on average
+    :returns:             List of (min x, min y, max x, max y) tiles, the
+                          outer tiles are unbounded, or [None] for a single
+                          tile without spatial index
+    """
+    if points.rtree is None:
+        return [None]
+    count, min_x, min_y, max_x, max_y = connection.execute(
+        f'SELECT count(*), min(minx), min(miny), max(maxx), max(maxy) FROM [{points.rtree}]').fetchone()
+    if not count:
+        return []
+    splits = max(1, ceil(sqrt(count / tile_points)))
+    xs = [-inf] + [min_x + (max_x - min_x) * i / splits for i in range(1, splits)] + [inf]
+    ys = [-inf] + [min_y + (max_y - min_y) * i / splits for i in range(1, splits)] + [inf]
+    return [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for i in range(splits) for j in range(splits)]
+
+
+def address_range(from_addr, to_addr, parity):
+    """ Returns the AddressRange of a side of a road segment, or None """
+    numeric = (int, float)
+    if not isinstance(from_addr, numeric) or not isinstance(to_addr, numeric):
+        return None
+    return AddressRange(None, None, from_addr, to_addr, parity)
+
+
+class AddressTask(object):
+    """ Checks the address points of a tile, in a worker process
+    :param gpkg_path  Path of the GeoPackage
+    :param points     SpatialTable object of the address points
+    :param roads      SpatialTable object of the road segments
+    :param radius     Search radius, in the units of the spatial reference
+    :param candidates Nearest road segments considered per point
+    """
+    __slots__ = ('gpkg_path', 'points', 'roads', 'radius', 'candidates')
+
+    def __init__(self, gpkg_path, points, roads, radius, candidates=ADDRESS_CANDIDATES):
+        self.gpkg_path = gpkg_path
+        self.points = points
+        self.roads = roads
+        self.radius = radius
+        self.candidates = candidates
+
+    def road_index(self, connection, tile):
+        """ Indexes the segments of the roads within the search radius of a tile
+        :returns:         Dictionary of {street: GridIndex object of
+                          (x1, y1, x2, y2, Road) segments}
+        """
+        radius = self.radius
+        bbox = None if tile is None else (tile[0] - radius, tile[1] - radius, tile[2] + radius, tile[3] + radius)
+        range_fields = [field for fields in RANGE_SIDES.values() for field in fields]
+        sql, parameters = self.roads.select(STREET_NAME_FIELDS + tuple(range_fields), bbox)
+        indexes = {}
+        name_count = len(STREET_NAME_FIELDS)
+        for rowid, blob, *values in connection.execute(sql, parameters):
+            street = normalize_name(*values[:name_count])
+            if not street:
+                continue
+            ranges = values[name_count:]
+            road = Road(rowid, street, {side: address_range(*ranges[position * 3:position * 3 + 3])
+                                        for position, side in enumerate(RANGE_SIDES)})
+            index = indexes.get(street)
+            if index is None:
+                index = indexes[street] = GridIndex(radius)
+            for line in line_strings(read_geometry(blob)):
+                for (x1, y1), (x2, y2) in zip(line, line[1:]):
+                    index.insert(min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2), (x1, y1, x2, y2, road))
+        return indexes
+
+    def nearest_roads(self, index, x, y):
+        """ Returns the nearest roads of a point within the search radius
+        :param index      GridIndex object of the segments of a street
+        :returns:         List of (squared distance, cross product, Road)
+                          tuples, nearest first
+        """
+        radius = self.radius
+        limit = radius * radius
+        nearest = {}
+        for x1, y1, x2, y2, road in index.query(x - radius, y - radius, x + radius, y + radius):
+            distance, cross = segment_distance(x, y, x1, y1, x2, y2)
+            if distance <= limit and (road.rowid not in nearest or distance < nearest[road.rowid][0]):
+                nearest[road.rowid] = (distance, cross, road)
+        return sorted(nearest.values(), key=lambda candidate: candidate[0])[:self.candidates]
+
+    def __call__(self, tile):
+        """ Checks the address points of a tile
+        :param tile       Tuple of (min x, min y, max x, max y), or None for
+                          every point
+        :returns:         List of AddressFinding objects
+        """
+        findings = []
+        connection = connect(self.gpkg_path)
+        try:
+            indexes = self.road_index(connection, tile)
+            sql, parameters = self.points.select(('NGUID', ADDRESS_NUMBER_FIELD) + STREET_NAME_FIELDS, tile, True)
+            for rowid, blob, nguid, number, *parts in connection.execute(sql, parameters):
+                point = read_point(blob)
+                street = normalize_name(*parts)
+                if point is None or not isinstance(number, int) or not street:
+                    continue
+                index = indexes.get(street)
+                roads = [(cross, road) for _, cross, road in self.nearest_roads(index, *point)] if index else []
+                if not roads:
+                    findings.append(AddressFinding(rowid, nguid, number, street, 'address_unmatched'))
+                    continue
+                for cross, road in roads:
+                    # The point is left of the digitized direction for a positive cross product
+                    sides = ('L',) if cross > 0 else ('R',) if cross < 0 else ('L', 'R')
+                    if any(road.ranges[side] is not None and number in road.ranges[side] for side in sides):
+                        break
+                else:
+                    findings.append(AddressFinding(rowid, nguid, number, street, 'address_range', roads[0][1].rowid))
+        finally:
+            connection.close()
+        return findings
+
+
+def check_addresses(gpkg_path, schema, radius=None, workers=ADDRESS_WORKERS, tile_points=ADDRESS_TILE_POINTS):
+    """ Streams the address findings of the SiteStructureAddressPoint layer
+        of a GeoPackage, a tile at a time
+    :param gpkg_path      Path of the GeoPackage
+    :param schema         Schema object
+    :param radius         Search radius, by default ADDRESS_SEARCH_RADIUS of
+                          the spatial reference of the address points
+    :param workers        Tiles checked in parallel processes
+    :param tile_points    Address points per tile, on average
+    :returns:             Generator of AddressFinding objects
+    """
+    tables = {feature_class.name: table for table, feature_class in feature_tables(gpkg_path, schema)}
+    if ADDRESS_LAYER not in tables or RANGE_LAYER not in tables:
+        return
+    connection = connect(gpkg_path)
+    try:
+        points = spatial_table(connection, tables[ADDRESS_LAYER])
+        roads = spatial_table(connection, tables[RANGE_LAYER])
+        if radius is None:
+            radius = ADDRESS_SEARCH_RADIUS[is_geographic(connection, points.table)]
+        tiles = plan_tiles(connection, points, tile_points)
+    finally:
+        connection.close()
+    task = AddressTask(gpkg_path, points, roads, radius)
+    workers = max(1, min(workers, len(tiles)))
+    if workers == 1:
+        for tile in tiles:
+            yield from task(tile)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for findings in executor.map(task, tiles):
+            yield from findings
+
+
+def main(argv=None):
+    """ Checks the address points of a GeoPackage and writes the findings as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when an address point failed a rule
+    """
+    parser = argparse.ArgumentParser(description='Checks the address points against the road centerline ranges.')
+    parser.add_argument('gpkg', help='GeoPackage to check')
+    parser.add_argument('--radius', type=float, help='search radius in the units of the spatial reference')
+    parser.add_argument('--workers', type=int, default=ADDRESS_WORKERS, help='tiles checked in parallel')
+    parser.add_argument('--output', help='CSV file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    f = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    counts = dict.fromkeys(ADDRESS_RULES, 0)
+    try:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(ADDRESS_COLUMNS)
+        for finding in check_addresses(args.gpkg, LoadSchema(), args.radius, args.workers):
+            writer.writerow(finding.as_tuple())
+            counts[finding.rule] += 1
+    finally:
+        if args.output:
+            f.close()
+    for rule, count in counts.items():
+        print(f'{count:>10} {rule}', file=sys.stderr)
+    print(f'{sum(counts.values())} findings in {perf_counter() - start:.2f}s.', file=sys.stderr)
+    return 1 if any(counts.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+| Name:      conformance.py
+| Purpose:   Checks whether existing GeoPackages conform to the compiled
+|            schema: missing and extra layers and fields, field types and
+|            lengths, geometry types and Z flags, and missing or different
+|            domain constraints. Each finding is a report.rules Finding.
+|
+| Notes:     Only the GeoPackage metadata tables (gpkg_contents,
+|            gpkg_geometry_columns, gpkg_data_columns and
+|            gpkg_data_column_constraints) and PRAGMA table_info are read,
+|            never the rows, so a GeoPackage is checked in milliseconds
+|            whatever its size. Many GeoPackages are checked in a thread pool
+|            with one read-only connection per file. This module only uses
+|            the Python standard library and does not require ArcGIS Pro.
+|            GeoPackages written by ArcGIS (for example the prebuilt template
+|            or CopyFeatures output) keep no gpkg_data_column_constraints
+|            rows, as ArcGIS stores domains in the geodatabase only. Their
+|            domain constraints are not checked field by field; a single
+|            gpkg_domains_not_stored warning is reported instead.
+"""
+
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+from backends.base import match_field
+from backends.geopackage import GEOMETRY_TYPES
+
+from .profiling import connect
+from .rules import SEVERITY_FAIL, SEVERITY_WARN, Finding, count_findings
+
+# ==============================================================================
+# CONFORMANCE Constants
+# ==============================================================================
+CONFORMANCE_WORKERS = 8                # GeoPackages checked in parallel
+
+# Conformance rules by name: severity
+CONFORMANCE_RULES = {
+    'gpkg_layer_missing': SEVERITY_FAIL,
+    'gpkg_layer_extra': SEVERITY_WARN,
+    'gpkg_geometry_type': SEVERITY_FAIL,
+    'gpkg_geometry_z': SEVERITY_FAIL,
+    'gpkg_field_missing': SEVERITY_FAIL,
+    'gpkg_field_extra': SEVERITY_WARN,
+    'gpkg_field_type': SEVERITY_FAIL,
+    'gpkg_field_length': SEVERITY_FAIL,
+    'gpkg_domain_missing': SEVERITY_FAIL,
+    'gpkg_domain_mismatch': SEVERITY_FAIL,
+    'gpkg_domains_not_stored': SEVERITY_WARN
+}
+
+# Declared SQLite column types to schema field types
+COLUMN_TYPES = {
+    'TEXT': 'TEXT',
+    'VARCHAR': 'TEXT',
+    'CHAR': 'TEXT',
+    'MEDIUMINT': 'INTEGER',
+    'INTEGER': 'INTEGER',
+    'INT': 'INTEGER',
+    'SMALLINT': 'INTEGER',
+    'BIGINT': 'INTEGER',
+    'TINYINT': 'INTEGER',
+    'DOUBLE': 'REAL',
+    'REAL': 'REAL',
+    'FLOAT': 'REAL',
+    'NUMERIC': 'REAL',
+    'DATETIME': 'DATETIME',
+    'DATE': 'DATETIME'
+}
+
+COLUMN_TYPE_PATTERN = re.compile(r'\s*(\w+)\s*(?:\(\s*(\d+)\s*\))?')
+
+
+class GeoPackageState(object):
+    """ The metadata of a GeoPackage read by the conformance checker
+    :param tables       Dictionary of {lowercase table name: table name}
+    :param geometry     Dictionary of {table: (column, geometry type, z)}
+    :param columns      Dictionary of {table: {lowercase column name:
+                        (column name, declared type)}}, without the
+                        primary key and geometry columns
+    :param constraints  Dictionary of {(table, lowercase column):
+                        constraint name}
+    :param domains      Names of the constraints with values
+    """
+    __slots__ = ('tables', 'geometry', 'columns', 'constraints', 'domains')
+
+    def __init__(self, tables, geometry, columns, constraints, domains):
+        self.tables = tables
+        self.geometry = geometry
+        self.columns = columns
+        self.constraints = constraints
+        self.domains = domains
+
+    def __repr__(self):
+        return f'GeoPackageState({len(self.tables)} feature tables)'
+
+
+def read_state(gpkg_path):
+    """ Reads the feature tables, columns and constraints of a GeoPackage
+    :param gpkg_path  Path of the GeoPackage
+    :returns:         GeoPackageState object
+    """
+    connection = connect(gpkg_path)
+    try:
+        cursor = connection.cursor()
+        tables = [row[0] for row in cursor.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'features'")]
+        geometry = {
+            table.lower(): (column, geometry_type.upper(), z)
+            for table, column, geometry_type, z in cursor.execute(
+                'SELECT table_name, column_name, geometry_type_name, z FROM gpkg_geometry_columns')
+        }
+        constraints = {
+            (table.lower(), column.lower()): constraint_name
+            for table, column, constraint_name in cursor.execute(
+                'SELECT table_name, column_name, constraint_name FROM gpkg_data_columns WHERE constraint_name IS NOT NULL')
+        } if has_table(cursor, 'gpkg_data_columns') else {}
+        domains = frozenset(
+            row[0] for row in cursor.execute('SELECT DISTINCT constraint_name FROM gpkg_data_column_constraints')
+        ) if has_table(cursor, 'gpkg_data_column_constraints') else frozenset()
+        columns = {}
+        for table in tables:
+            geometry_column = geometry.get(table.lower(), ('',))[0].lower()
+            columns[table] = {
+                name.lower(): (name, declared_type)
+                for _, name, declared_type, _, _, pk in cursor.execute(f'PRAGMA table_info([{table}])')
+                if not pk and name.lower() != geometry_column
+            }
+    finally:
+        connection.close()
+    return GeoPackageState({table.lower(): table for table in tables}, geometry, columns, constraints, domains)
+
+
+def has_table(cursor, table):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
+
+
+def column_type(declared_type):
+    """ Returns the schema field type and length of a declared column type
+    :param declared_type  Declared type of PRAGMA table_info, e.g. TEXT(25)
+    :returns:             Tuple of field type (None if not recognized) and
+                          length (None if unbounded)
+    """
+    match = COLUMN_TYPE_PATTERN.match(declared_type or '')
+    if not match:
+        return None, None
+    return COLUMN_TYPES.get(match.group(1).upper()), int(match.group(2)) if match.group(2) else None
+
+
+def finding(rule, layer, field, message):
+    return Finding(rule, CONFORMANCE_RULES[rule], layer, field, message)
+
+
+def check_layer(state, table, layer, schema, check_domains=True):
+    """ Checks the geometry, fields and domain constraints of a feature table
+    :param state          GeoPackageState object
+    :param table          Table name
+    :param layer          LayerPlan object of the table
+    :param schema         Schema object
+    :param check_domains  Check the domain constraints of the fields
+    :returns:             List of Finding objects
+    """
+    fc = layer.feature_class
+    findings = []
+    column, geometry_type, z = state.geometry.get(table.lower(), (None, None, None))
+    expected_type = GEOMETRY_TYPES[fc.geometry_type]
+    if geometry_type != expected_type:
+        findings.append(finding('gpkg_geometry_type', fc.name, '', f'Geometry type is {geometry_type}, expected {expected_type}'))
+    if z is not None and (z == 0 if fc.has_z else z == 1):
+        findings.append(finding('gpkg_geometry_z', fc.name, '', f'Z flag is {z}, expected {"1" if fc.has_z else "0"}'))
+
+    columns = state.columns[table]
+    expected = set()
+    for field in layer.fields:
+        # ArcGIS writes reserved words with a trailing underscore, e.g. Row_
+        key = match_field(field.name, columns)
+        if key is None:
+            findings.append(finding('gpkg_field_missing', fc.name, field.name, 'Field is missing'))
+            continue
+        expected.add(key)
+        name, declared_type = columns[key]
+        field_type, length = column_type(declared_type)
+        if field_type != field.field_type:
+            findings.append(finding('gpkg_field_type', fc.name, field.name,
+                                    f'Type is {declared_type or "undeclared"}, expected {field.field_type}'))
+        elif field_type == 'TEXT' and length != field.length:
+            findings.append(finding('gpkg_field_length', fc.name, field.name,
+                                    f'Length is {length or "unbounded"}, expected {field.length}'))
+
+        domain = schema.domains_by_name.get(field.domain) if field.domain else None
+        if check_domains and domain is not None and domain.values:
+            constraint_name = state.constraints.get((table.lower(), key))
+            if constraint_name is None or constraint_name not in state.domains:
+                findings.append(finding('gpkg_domain_missing', fc.name, field.name, f'{field.domain} domain constraint is missing'))
+            elif constraint_name != field.domain:
+                findings.append(finding('gpkg_domain_mismatch', fc.name, field.name,
+                                        f'Domain constraint is {constraint_name}, expected {field.domain}'))
+
+    for key, (name, declared_type) in columns.items():
+        if key not in expected:
+            findings.append(finding('gpkg_field_extra', fc.name, name, 'Field is not in the schema'))
+    return findings
+
+
+def check_geopackage(gpkg_path, schema, profile, layers=None):
+    """ Checks a GeoPackage against a profile
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param profile    Profile object of the required layers
+    :param layers     Dictionary of {name: LayerPlan} of the layers allowed in
+                      the GeoPackage, defaults to the layers of the profile
+    :returns:         List of Finding objects
+    """
+    state = read_state(gpkg_path)
+    layers_by_name = {name.lower(): layer for name, layer in (layers or profile.layers_by_name).items()}
+    findings = []
+    # ArcGIS writes no constraint values, a missing constraint per field
+    # would fail every GeoPackage it created
+    check_domains = bool(state.domains)
+    if not check_domains:
+        findings.append(finding('gpkg_domains_not_stored', '', '',
+                                'No domain constraints are stored, as in GeoPackages written by ArcGIS; '
+                                'domain constraints were not checked'))
+    for layer in profile.layers:
+        if layer.name.lower() not in state.tables:
+            findings.append(finding('gpkg_layer_missing', layer.name, '', 'Layer is missing'))
+    for key, table in state.tables.items():
+        layer = layers_by_name.get(key)
+        if layer is None:
+            findings.append(finding('gpkg_layer_extra', table, '', 'Layer is not in the schema'))
+        else:
+            findings.extend(check_layer(state, table, layer, schema, check_domains=check_domains))
+    return findings
+
+
+def check_result(gpkg_path, schema, profile, layers):
+    """ Checks a GeoPackage and returns its result dictionary """
+    start = perf_counter()
+    result = {"path": gpkg_path, "status": 'passed', "findings": [], "error": None}
+    try:
+        result["findings"] = check_geopackage(gpkg_path, schema, profile, layers)
+    except Exception as e:
+        result["status"] = 'error'
+        result["error"] = f'{type(e).__name__}: {e}'
+    else:
+        counts = count_findings(result["findings"])
+        if counts[SEVERITY_FAIL]:
+            result["status"] = 'failed'
+        elif counts[SEVERITY_WARN]:
+            result["status"] = 'warned'
+    result["seconds"] = perf_counter() - start
+    return result
+
+
+def find_geopackages(path):
+    """ Returns the GeoPackage files of a folder and its subfolders, or the
+        path itself if it is a file
+    """
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(folder, name)
+        for folder, _, names in os.walk(path)
+        for name in names if name.lower().endswith('.gpkg')
+    )
+
+
+def check_geopackages(paths, schema, profile, layers=None, workers=CONFORMANCE_WORKERS):
+    """ Checks many GeoPackages in a thread pool
+    :param paths      Paths of the GeoPackages
+    :param schema     Schema object
+    :param profile    Profile object of the required layers
+    :param layers     Dictionary of {name: LayerPlan} of the allowed layers
+    :param workers    GeoPackages checked in parallel
+    :returns:         List of result dictionaries (path, status, findings,
+                      error, seconds), in the order of the paths
+    """
+    if not paths:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(paths)))) as executor:
+        return list(executor.map(lambda path: check_result(path, schema, profile, layers), paths))
@@ -0,0 +1,64 @@
+"""
+| Name:      gate.py
+| Purpose:   Command line gate of the schema report rules for CI. The rules
+|            are evaluated over the compiled schema, the findings are printed
+|            as text, JSON, CSV or Markdown, and the exit code is 1 when a
+|            finding is at or above the --fail-on severity.
+|
+| Notes:     Run `python -m report.gate` from the NENA_NG911_Scripts folder.
+|            The gate does not import openpyxl.
+"""
+
+import argparse
+import sys
+
+from schema import LoadSchema
+
+from .render import RENDERERS
+from .rules import RULES, SEVERITIES, SEVERITY_FAIL, count_findings, evaluate_rules
+
+
+def format_text(findings):
+    """ Returns the findings as one line each, followed by the counts """
+    lines = [f'{finding.severity} {finding.rule}: {"/".join(filter(None, (finding.layer, finding.field)))}: '
+             f'{finding.message}' for finding in findings]
+    counts = count_findings(findings)
+    lines.append(f'{counts["FAIL"]} failed and {counts["WARN"]} warned checks.')
+    return '\n'.join(lines) + '\n'
+
+
+def gate_exit_code(findings, fail_on=SEVERITY_FAIL):
+    """ Returns the exit code of the gate
+    :param findings   List of Finding objects
+    :param fail_on    Lowest failing severity [FAIL | WARN]
+    :returns:         1 if a finding is at or above fail_on, otherwise 0
+    """
+    failing = SEVERITIES[:SEVERITIES.index(fail_on) + 1]
+    return 1 if any(finding.severity in failing for finding in findings) else 0
+
+
+def main(argv=None):
+    """ Evaluates the rules and prints the findings
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code
+    """
+    parser = argparse.ArgumentParser(description='Checks flatfile_schema_v3.yaml with the schema report rules.')
+    parser.add_argument('--format', choices=('text',) + tuple(RENDERERS), default='text', help='output format')
+    parser.add_argument('--fail-on', choices=SEVERITIES, default=SEVERITY_FAIL,
+                        help='lowest severity that fails the gate')
+    parser.add_argument('--rule', action='append', choices=tuple(RULES), help='rule to evaluate, all by default')
+    parser.add_argument('--output', help='file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    findings = evaluate_rules(LoadSchema(), args.rule)
+    text = format_text(findings) if args.format == 'text' else RENDERERS[args.format](findings)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return gate_exit_code(findings, args.fail_on)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""
+| Name:      geometry.py
+| Purpose:   Reads the geometries of GeoPackage feature tables without a
+|            spatial library: the GeoPackage binary header and the
+|            (ISO or extended) WKB of points, line strings, polygons and their
+|            multi-part and collection types, with or without Z and M. Also
+|            holds a uniform grid index of bounding boxes and the planar
+|            point-to-segment measures of the spatial checks.
+|
+| Notes:     Coordinates are returned as (x, y) tuples, Z and M values are
+|            dropped. Points have a fast path, read_point(), as they are read
+|            by the million.
+"""
+
+import struct
+from math import floor
+
+# ==============================================================================
+# GEOMETRY Constants
+# ==============================================================================
+GPKG_MAGIC = b'GP'
+
+# Envelope indicator of the GeoPackage binary flags: envelope size in bytes
+ENVELOPE_SIZES = {0: 0, 1: 32, 2: 48, 3: 48, 4: 64}
+
+# WKB geometry type codes, without dimensions
+WKB_POINT = 1
+WKB_LINESTRING = 2
+WKB_POLYGON = 3
+WKB_MULTIPOINT = 4
+WKB_MULTILINESTRING = 5
+WKB_MULTIPOLYGON = 6
+WKB_GEOMETRYCOLLECTION = 7
+
+# Extended WKB dimension flags
+EWKB_Z = 0x80000000
+EWKB_M = 0x40000000
+EWKB_SRID = 0x20000000
+
+
+def gpkg_header(blob):
+    """ Reads the header of a GeoPackage binary geometry
+    :param blob       GeoPackage binary geometry
+    :returns:         Tuple of (offset of the WKB, is_empty)
+    :raises:          ValueError when the blob is not a GeoPackage geometry
+    """
+    if blob[:2] != GPKG_MAGIC:
+        raise ValueError('Not a GeoPackage binary geometry')
+    flags = blob[3]
+    envelope = (flags >> 1) & 0x07
+    if envelope not in ENVELOPE_SIZES:
+        raise ValueError(f'Invalid GeoPackage envelope indicator {envelope}')
+    return 8 + ENVELOPE_SIZES[envelope], bool(flags & 0x10)
+
+
+def wkb_type(data, offset):
+    """ Reads the byte order and type code of a WKB geometry
+    :returns:         Tuple of (struct byte order, base type code, number of
+                      coordinates per vertex, offset after the type code)
+    """
+    order = '<' if data[offset] == 1 else '>'
+    code, = struct.unpack_from(f'{order}I', data, offset + 1)
+    offset += 5
+    dimensions = 2 + bool(code & EWKB_Z) + bool(code & EWKB_M)
+    if code & EWKB_SRID:
+        offset += 4
+    code &= 0x0FFFFFFF
+    if code >= 1000:
+        dimensions = (2, 3, 3, 4)[code // 1000]
+        code %= 1000
+    return order, code, dimensions, offset
+
+
+def read_coordinates(data, offset, order, dimensions):
+    """ Reads a WKB point sequence
+    :returns:         Tuple of (list of (x, y) tuples, offset after the points)
+    """
+    count, = struct.unpack_from(f'{order}I', data, offset)
+    offset += 4
+    values = struct.unpack_from(f'{order}{count * dimensions}d', data, offset)
+    offset += 8 * count * dimensions
+    if dimensions == 2:
+        return list(zip(values[0::2], values[1::2])), offset
+    return list(zip(values[0::dimensions], values[1::dimensions])), offset
+
+
+def read_wkb(data, offset=0):
+    """ Reads a WKB geometry
+    :param data       Bytes of the WKB
+    :param offset     Offset of the WKB in data
+    :returns:         Tuple of (base type code, coordinates, offset after the
+                      geometry). The coordinates are a (x, y) tuple for a
+                      point, a list of tuples for a line string, a list of
+                      rings for a polygon and a list of parts for the other
+                      types
+    :raises:          ValueError for an unsupported geometry type
+    """
+    order, code, dimensions, offset = wkb_type(data, offset)
+    if code == WKB_POINT:
+        values = struct.unpack_from(f'{order}{dimensions}d', data, offset)
+        return code, (values[0], values[1]), offset + 8 * dimensions
+    if code == WKB_LINESTRING:
+        coordinates, offset = read_coordinates(data, offset, order, dimensions)
+        return code, coordinates, offset
+    if code == WKB_POLYGON:
+        count, = struct.unpack_from(f'{order}I', data, offset)
+        offset += 4
+        rings = []
+        for _ in range(count):
+            ring, offset = read_coordinates(data, offset, order, dimensions)
+            rings.append(ring)
+        return code, rings, offset
+    if WKB_MULTIPOINT <= code <= WKB_GEOMETRYCOLLECTION:
+        count, = struct.unpack_from(f'{order}I', data, offset)
+        offset += 4
+        parts = []
+        for _ in range(count):
+            part_code, part, offset = read_wkb(data, offset)
+            parts.append((part_code, part) if code == WKB_GEOMETRYCOLLECTION else part)
+        return code, parts, offset
+    raise ValueError(f'Unsupported WKB geometry type {code}')
+
+
+def read_geometry(blob):
+    """ Reads a GeoPackage binary geometry
+    :param blob       GeoPackage binary geometry, or None
+    :returns:         Tuple of (base type code, coordinates) as read_wkb(), or
+                      None for a null or empty geometry
+    """
+    if blob is None:
+        return None
+    offset, is_empty = gpkg_header(blob)
+    if is_empty:
+        return None
+    code, coordinates, _ = read_wkb(blob, offset)
+    return code, coordinates
+
+
+def read_point(blob):
+    """ Reads a GeoPackage binary point, or the first point of a multipoint
+    :param blob       GeoPackage binary geometry, or None
+    :returns:         (x, y) tuple, or None for a null or empty geometry
+    """
+    if blob is None:
+        return None
+    offset, is_empty = gpkg_header(blob)
+    if is_empty:
+        return None
+    order, code, dimensions, offset = wkb_type(blob, offset)
+    if code == WKB_MULTIPOINT:
+        if not struct.unpack_from(f'{order}I', blob, offset)[0]:
+            return None
+        order, code, dimensions, offset = wkb_type(blob, offset + 4)
+    if code != WKB_POINT:
+        raise ValueError(f'WKB geometry type {code} is not a point')
+    x, y = struct.unpack_from(f'{order}2d', blob, offset)
+    if x != x or y != y:
+        # Empty WKB points are NaN coordinates
+        return None
+    return x, y
+
+
+def line_strings(geometry):
+    """ Returns the line strings of a read line geometry
+    :param geometry   Tuple of (base type code, coordinates) of read_geometry()
+    :returns:         List of lists of (x, y) tuples
+    """
+    if geometry is None:
+        return []
+    code, coordinates = geometry
+    if code == WKB_LINESTRING:
+        return [coordinates]
+    if code == WKB_MULTILINESTRING:
+        return coordinates
+    if code == WKB_GEOMETRYCOLLECTION:
+        return [line for part in coordinates for line in line_strings(part)]
+    return []
+
+
+def segment_distance(x, y, x1, y1, x2, y2):
+    """ Measures a point against a segment
+    :returns:         Tuple of (squared distance from the point to the
+                      segment, cross product of the segment direction and the
+                      point, positive when the point is left of the segment)
+    """
+    dx, dy = x2 - x1, y2 - y1
+    length = dx * dx + dy * dy
+    t = ((x - x1) * dx + (y - y1) * dy) / length if length else 0.0
+    t = 0.0 if t < 0.0 else 1.0 if t > 1.0 else t
+    px, py = x1 + t * dx - x, y1 + t * dy - y
+    return px * px + py * py, dx * (y - y1) - dy * (x - x1)
+
+
+class GridIndex(object):
+    """ Uniform grid index of bounding boxes
+    :param cell_size  Cell width and height, in coordinate units
+    """
+    __slots__ = ('cell_size', 'cells')
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.cells = {}
+
+    def cell_range(self, min_x, min_y, max_x, max_y):
+        size = self.cell_size
+        return range(floor(min_x / size), floor(max_x / size) + 1), range(floor(min_y / size), floor(max_y / size) + 1)
+
+    def insert(self, min_x, min_y, max_x, max_y, item):
+        """ Adds an item to every cell its bounding box intersects """
+        columns, rows = self.cell_range(min_x, min_y, max_x, max_y)
+        cells = self.cells
+        for column in columns:
+            for row in rows:
+                cells.setdefault((column, row), []).append(item)
+
+    def query(self, min_x, min_y, max_x, max_y):
+        """ Returns the items of the cells a bounding box intersects, an item
+            spanning several cells may be returned more than once
+        """
+        columns, rows = self.cell_range(min_x, min_y, max_x, max_y)
+        cells = self.cells
+        items = []
+        for column in columns:
+            for row in rows:
+                cell = cells.get((column, row))
+                if cell:
+                    items.extend(cell)
+        return items
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __repr__(self):
+        return f'GridIndex({self.cell_size}, {len(self.cells)} cells)'
@@ -0,0 +1,182 @@
+"""
+| Name:      incremental.py
+| Purpose:   Incremental schema report. The findings and rendered rows of
+|            every domain, feature class, field definition and registry entry
+|            are kept in a state file, keyed by a digest of the target's
+|            section hash and of the lookups its rules and rows depend on.
+|            After the YAML is edited only the targets whose digest changed
+|            are re-evaluated and re-rendered, the rest are reused and the
+|            report is patched together from the cached rows.
+|
+| Notes:     The state is kept in cache/report_state.pickle and is discarded
+|            when REPORT_STATE_VERSION changes. Increment it when a rule or
+|            the row model of report.sheets changes. Run
+|            `python -m report.incremental` from the NENA_NG911_Scripts
+|            folder to report full vs incremental timings.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+from itertools import chain
+from time import perf_counter
+
+from schema import LoadSchema
+from schema.sections import SECTION_KINDS, changed_sections
+
+from .rules import RULES, evaluate_target, index_findings, schema_targets
+from .sheets import REPORT_SHEETS, header_row
+from .state import STATE_FOLDER, get_state_path, read_state, run_main, write_state
+
+# ==============================================================================
+# INCREMENTAL Constants
+# ==============================================================================
+REPORT_STATE_FOLDER_PATH = None        # Overrides the default state folder (NENA_NG911_Scripts/cache)
+REPORT_STATE_KEY = 'report_state'      # State file name in the state folder
+REPORT_STATE_VERSION = 1               # Increment when the rules or the report rows change
+
+
+class TargetReport(object):
+    """ The findings and rendered rows of a single report target
+    :param findings   Dictionary of {rule name: list of Finding objects}
+    :param rows       Dictionary of {worksheet title: list of rows}
+    """
+    __slots__ = ('findings', 'rows')
+
+    def __init__(self, findings, rows):
+        self.findings = findings
+        self.rows = rows
+
+    def __repr__(self):
+        return f'TargetReport({sum(len(findings) for findings in self.findings.values())} findings)'
+
+
+def get_state_folder():
+    """ Returns the state folder based on the default location or the
+        REPORT_STATE_FOLDER_PATH constant
+    """
+    return REPORT_STATE_FOLDER_PATH or STATE_FOLDER
+
+
+def target_digest(schema, kind, target):
+    """ Returns the digest of everything the rules and rows of a target
+        depend on: its own section hash, plus the definitions of a feature
+        class's fields and the name lookups between sections
+    :param schema     Schema object with section hashes
+    :param kind       Target kind [domain | feature_class | field | registry]
+    :param target     Domain, FeatureClass, FieldDefinition or RegistryEntry
+    :returns:         SHA-256 hex digest
+    """
+    name = getattr(target, SECTION_KINDS[kind][1])
+    hashes = schema.section_hashes
+    inputs = (REPORT_STATE_VERSION, kind, hashes[kind][name])
+    if kind == 'feature_class':
+        inputs += (
+            name in schema.registry_by_layer_name,
+            tuple(hashes['field'].get(field.name) for field in target.fields),
+            tuple(field.domain in schema.domains_by_name for field in target.fields if field.domain)
+        )
+    elif kind == 'field':
+        inputs += (name in schema.field_names_in_use,)
+    elif kind == 'registry':
+        inputs += (name in schema.feature_classes_by_name,)
+    return hashlib.sha256(repr(inputs).encode('utf-8')).hexdigest()
+
+
+def evaluate_report_target(schema, kind, target):
+    """ Evaluates the rules and renders the rows of a single target
+    :returns:         TargetReport object
+    """
+    findings = evaluate_target(schema, kind, target)
+    findings_by_key = index_findings(chain.from_iterable(findings.values()))
+    rows = {title: list(rows_function(schema, findings_by_key, target))
+            for title, columns, sheet_kind, rows_function in REPORT_SHEETS if sheet_kind == kind}
+    return TargetReport(findings, rows)
+
+
+def sheet_rows(reports, title):
+    """ Yields the cached rows of a worksheet from the reports of its targets """
+    for report in reports:
+        yield from report.rows[title]
+
+
+def update_report(schema):
+    """ Evaluates the report of a schema, reusing the findings and rows of
+        every target that did not change since the stored state
+    :param schema     Schema object
+    :returns:         Tuple of the list of Finding objects, the (title, column
+                      definitions, rows) worksheets of report.sheets and a
+                      dictionary of statistics
+    """
+    start = perf_counter()
+    state = read_state(get_state_folder(), REPORT_STATE_KEY, REPORT_STATE_VERSION)
+    previous = state.get("targets", {})
+    stats = {
+        "targets": 0,
+        "reused": 0,
+        "evaluated": 0,
+        "changed": changed_sections(state.get("section_hashes", {}), schema.section_hashes)
+    }
+
+    targets = {}
+    reports = {kind: [] for kind in SECTION_KINDS}
+    for kind in SECTION_KINDS:
+        for target in schema_targets(schema, kind):
+            digest = target_digest(schema, kind, target)
+            report = targets.get(digest) or previous.get(digest)
+            if report is None:
+                report = evaluate_report_target(schema, kind, target)
+                stats["evaluated"] += 1
+            else:
+                stats["reused"] += 1
+            targets[digest] = report
+            reports[kind].append(report)
+    stats["targets"] = stats["reused"] + stats["evaluated"]
+
+    # Reassemble the findings in rule order and the rows in schema order
+    findings = [finding for name, (kind, check) in RULES.items()
+                for report in reports[kind] for finding in report.findings.get(name, ())]
+    sheets = [(title, columns, chain([header_row(columns)], sheet_rows(reports[kind], title)))
+              for title, columns, kind, rows_function in REPORT_SHEETS]
+
+    if stats["evaluated"] or set(targets) != set(previous):
+        write_state(get_state_folder(), REPORT_STATE_KEY, REPORT_STATE_VERSION, {
+            "sha256": schema.sha256,
+            "section_hashes": schema.section_hashes,
+            "targets": targets
+        })
+    stats["seconds"] = perf_counter() - start
+    return findings, sheets, stats
+
+
+def format_stats(stats):
+    """ Returns a report line of the update statistics """
+    changed = '; '.join(f'{kind}: {", ".join(names)}' for kind, names in stats["changed"].items())
+    return (f'Re-evaluated {stats["evaluated"]} of {stats["targets"]} report targets in {stats["seconds"]:.4f}s'
+            + (f' (changed {changed})' if changed and len(changed) < 200 else ''))
+
+
+def main(argv=None):
+    """ Reports full vs incremental report timings for the schema
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code
+    """
+    parser = argparse.ArgumentParser(description='Reports full vs incremental schema report timings.')
+    parser.parse_args(argv)
+
+    schema = LoadSchema()
+    path = get_state_path(get_state_folder(), REPORT_STATE_KEY)
+    if os.path.exists(path):
+        os.remove(path)
+    for run in ('full', 'incremental'):
+        findings, sheets, stats = update_report(schema)
+        for title, columns, rows in sheets:
+            for row in rows:
+                pass
+        print(f'{run:>11}: {format_stats(stats)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(run_main('report.incremental'))
@@ -0,0 +1,356 @@
+"""
+| Name:      nesting.py
+| Purpose:   Nesting check of the A1Polygon to A5Polygon layers, the state,
+|            county, municipality, unincorporated community and
+|            neighborhood levels of the administrative hierarchy. Each
+|            polygon must lie within exactly one polygon of the level above
+|            it, its parent, and its Country, A1, A2, AddCode, A3 and A4
+|            attributes must agree with those of the parent.
+|
+| Notes:     This module requires shapely 2, the other report modules do
+|            not. The parent of a polygon is the parent level polygon with
+|            the largest share of its area, found with an STRtree of the
+|            parent bounding boxes and prepared parent geometries. The parent
+|            map is cached in cache/nesting/, keyed by a digest of each
+|            polygon geometry and of each layer: when neither layer of a
+|            level changed the map is reused as is, otherwise only the new
+|            polygons and the polygons near an added or removed parent are
+|            recomputed. Every geometry blob of each level is still read and
+|            hashed with BLAKE2b to find the changes, but only the changed
+|            geometries are parsed and intersected, which is where the time
+|            of a check goes. The attributes are compared on every run. Run
+|            `python -m report.nesting <gpkg>` from the NENA_NG911_Scripts
+|            folder to write the findings as CSV.
+"""
+
+import argparse
+import csv
+import hashlib
+import os
+import sys
+from time import perf_counter
+
+import shapely
+
+from schema import LoadSchema
+
+from .addresses import spatial_table
+from .geometry import gpkg_header
+from .profiling import connect, feature_tables
+from .state import STATE_FOLDER, gpkg_key, read_state, run_main, write_state
+
+# ==============================================================================
+# NESTING Constants
+# ==============================================================================
+NESTING_LEVELS = ('A1Polygon', 'A2Polygon', 'A3Polygon', 'A4Polygon', 'A5Polygon')
+NESTING_FIELDS = ('Country', 'A1', 'A2', 'AddCode', 'A3', 'A4')
+NESTING_MIN_SHARE = 0.99               # Share of the area of a polygon within its parent
+NESTING_FETCH_SIZE = 500               # Geometries read per query
+NESTING_STATE_FOLDER_PATH = None       # Overrides the default state folder (NENA_NG911_Scripts/cache/nesting)
+NESTING_STATE_VERSION = 1              # Increment when the parent map changes
+
+# Nesting rules: description
+NESTING_RULES = {
+    'nesting_orphan': 'Polygon is not within a polygon of the parent level',
+    'nesting_split': 'Polygon is not within a single polygon of the parent level',
+    'nesting_attribute': 'Attribute differs from the parent polygon'
+}
+
+NESTING_COLUMNS = ('layer', 'rowid', 'nguid', 'rule', 'share', 'field', 'value', 'parent_layer', 'parent_rowid',
+                   'parent_nguid', 'parent_value')
+
+
+class NestingFinding(object):
+    """ A polygon that failed a nesting rule
+    :param layer      Layer name
+    :param rowid      Row id of the polygon
+    :param nguid      NGUID of the polygon
+    :param rule       Name of the failed NESTING_RULES rule
+    :param share      Share of the polygon area within its parent
+    :param parent     Tuple of (parent layer, rowid, NGUID), or None
+    :param field      Field that differs from the parent, or None
+    :param values     Tuple of the values of the field and of the parent's
+    """
+    __slots__ = ('layer', 'rowid', 'nguid', 'rule', 'share', 'parent', 'field', 'values')
+
+    def __init__(self, layer, rowid, nguid, rule, share, parent=None, field=None, values=(None, None)):
+        self.layer = layer
+        self.rowid = rowid
+        self.nguid = nguid
+        self.rule = rule
+        self.share = share
+        self.parent = parent
+        self.field = field
+        self.values = values
+
+    def as_tuple(self):
+        parent_layer, parent_rowid, parent_nguid = self.parent or (None, None, None)
+        return (self.layer, self.rowid, self.nguid, self.rule, round(self.share, 6), self.field, self.values[0],
+                parent_layer, parent_rowid, parent_nguid, self.values[1])
+
+    def __repr__(self):
+        return f'NestingFinding({self.layer!r}, {self.rowid}, {self.rule!r}, {self.share:.3f})'
+
+
+class LevelRows(object):
+    """ The rows of a hierarchy layer, without their geometries
+    :param table      SpatialTable object
+    :param rows       Dictionary of {rowid: (geometry key, NGUID,
+                      {field: value})}
+    :param digest     Digest of the geometry keys of the layer
+    """
+    __slots__ = ('table', 'rows', 'digest', 'rowids_by_key')
+
+    def __init__(self, table, rows, digest):
+        self.table = table
+        self.rows = rows
+        self.digest = digest
+        self.rowids_by_key = {}
+        for rowid, (key, _, _) in rows.items():
+            self.rowids_by_key.setdefault(key, rowid)
+
+    def __repr__(self):
+        return f'LevelRows({self.table.table!r}, {len(self.rows)} rows)'
+
+
+class ChildEntry(object):
+    """ The cached parent overlaps of a polygon geometry
+    :param bbox       Tuple of (min x, min y, max x, max y)
+    :param area       Area of the geometry
+    :param overlaps   Dictionary of {parent geometry key: overlap area}
+    """
+    __slots__ = ('bbox', 'area', 'overlaps')
+
+    def __init__(self, bbox, area, overlaps):
+        self.bbox = bbox
+        self.area = area
+        self.overlaps = overlaps
+
+    @property
+    def parent(self):
+        """ Tuple of (parent geometry key, share of the area), or (None, 0) """
+        if not self.overlaps or not self.area:
+            return None, 0.0
+        key = max(self.overlaps, key=self.overlaps.get)
+        return key, self.overlaps[key] / self.area
+
+    def __repr__(self):
+        return f'ChildEntry({len(self.overlaps)} parents)'
+
+
+def normalize_value(value):
+    return '' if value is None else str(value).strip().casefold()
+
+
+def read_level(connection, table_name, fields):
+    """ Reads the rows of a hierarchy layer and digests their geometries
+    :param connection     sqlite3 connection
+    :param table_name     Table name
+    :param fields         Names of the attributes to read
+    :returns:             LevelRows object
+    """
+    table = spatial_table(connection, table_name)
+    fields = [field for field in fields if field.lower() in table.columns]
+    sql, parameters = table.select(['NGUID'] + fields)
+    rows = {}
+    layer_digest = hashlib.blake2b(digest_size=16)
+    for rowid, blob, nguid, *values in connection.execute(sql, parameters):
+        if blob is None or gpkg_header(blob)[1]:
+            continue
+        key = hashlib.blake2b(blob, digest_size=16).digest()
+        layer_digest.update(key)
+        rows[rowid] = (key, nguid, dict(zip(fields, values)))
+    return LevelRows(table, rows, layer_digest.digest())
+
+
+def fetch_geometries(connection, level, keys):
+    """ Reads the geometries of geometry keys of a layer
+    :returns:         Dictionary of {geometry key: shapely geometry}, invalid
+                      geometries are made valid
+    """
+    rowids = [level.rowids_by_key[key] for key in keys]
+    geometries = {}
+    for start in range(0, len(rowids), NESTING_FETCH_SIZE):
+        chunk = rowids[start:start + NESTING_FETCH_SIZE]
+        for rowid, blob in connection.execute(
+                f'SELECT rowid, [{level.table.geometry}] FROM [{level.table.table}] '
+                f'WHERE rowid IN ({", ".join("?" * len(chunk))})', chunk):
+            geometry = shapely.from_wkb(bytes(blob[gpkg_header(blob)[0]:]))
+            if not geometry.is_valid:
+                geometry = shapely.make_valid(geometry)
+            geometries[level.rows[rowid][0]] = geometry
+    return geometries
+
+
+def compute_entries(connection, children, parents, child_keys, parent_boxes):
+    """ Computes the parent overlaps of child geometries
+    :param connection     sqlite3 connection
+    :param children       LevelRows object of the child layer
+    :param parents        LevelRows object of the parent layer
+    :param child_keys     Geometry keys of the children to compute
+    :param parent_boxes   Dictionary of {parent geometry key: bbox}
+    :returns:             Dictionary of {child geometry key: ChildEntry}
+    """
+    if not child_keys:
+        return {}
+    child_keys = list(child_keys)
+    child_geometries = fetch_geometries(connection, children, child_keys)
+    parent_keys = list(parent_boxes)
+    tree = shapely.STRtree(shapely.box(*zip(*parent_boxes.values()))) if parent_keys else None
+    geometries = [child_geometries[key] for key in child_keys]
+    if tree is not None:
+        child_index, parent_index = tree.query(geometries)
+    else:
+        child_index = parent_index = ()
+    candidates = {}
+    for child, parent in zip(child_index, parent_index):
+        candidates.setdefault(child_keys[child], []).append(parent_keys[parent])
+    parent_geometries = fetch_geometries(connection, parents, {key for keys in candidates.values() for key in keys})
+    shapely.prepare(list(parent_geometries.values()))
+    entries = {}
+    for key, geometry in zip(child_keys, geometries):
+        area = geometry.area
+        overlaps = {}
+        for parent_key in candidates.get(key, ()):
+            parent = parent_geometries[parent_key]
+            if shapely.contains_properly(parent, geometry):
+                overlaps[parent_key] = area
+            elif shapely.intersects(parent, geometry):
+                overlap = shapely.area(shapely.intersection(parent, geometry))
+                if overlap > 0:
+                    overlaps[parent_key] = overlap
+        entries[key] = ChildEntry(tuple(shapely.bounds(geometry)), area, overlaps)
+    return entries
+
+
+def update_parent_map(connection, children, parents, state):
+    """ Updates the cached parent overlaps of a child layer
+    :param connection     sqlite3 connection
+    :param children       LevelRows object of the child layer
+    :param parents        LevelRows object of the parent layer
+    :param state          Cached state of the level, or an empty dictionary
+    :returns:             Tuple of (new state of the level, number of
+                          recomputed geometries)
+    """
+    if state.get("digests") == (children.digest, parents.digest):
+        return state, 0
+    cached_boxes = state.get("parent_boxes", {})
+    parent_boxes = {key: cached_boxes[key] for key in parents.rowids_by_key if key in cached_boxes}
+    added = [key for key in parents.rowids_by_key if key not in cached_boxes]
+    for key, geometry in fetch_geometries(connection, parents, added).items():
+        parent_boxes[key] = tuple(shapely.bounds(geometry))
+    removed = set(cached_boxes) - set(parent_boxes)
+
+    # A cached entry is stale when one of its parents was removed or an added parent may overlap it
+    entries = {key: entry for key, entry in state.get("entries", {}).items()
+               if key in children.rowids_by_key and removed.isdisjoint(entry.overlaps)}
+    if added and entries:
+        keys = list(entries)
+        tree = shapely.STRtree(shapely.box(*zip(*(entries[key].bbox for key in keys))))
+        stale = set(tree.query(shapely.box(*zip(*(parent_boxes[key] for key in added))))[1])
+        for index in stale:
+            del entries[keys[index]]
+    missing = [key for key in children.rowids_by_key if key not in entries]
+    entries.update(compute_entries(connection, children, parents, missing, parent_boxes))
+    return {"digests": (children.digest, parents.digest), "parent_boxes": parent_boxes, "entries": entries}, \
+        len(missing)
+
+
+def level_findings(children, parents, entries, min_share=NESTING_MIN_SHARE):
+    """ Finds the misnested polygons and attribute mismatches of a level
+    :param children       LevelRows object of the child layer
+    :param parents        LevelRows object of the parent layer
+    :param entries        Dictionary of {child geometry key: ChildEntry}
+    :param min_share      Share of the area of a polygon within its parent
+    :returns:             Generator of NestingFinding objects
+    """
+    child_layer, parent_layer = children.table.table, parents.table.table
+    for rowid, (key, nguid, values) in children.rows.items():
+        parent_key, share = entries[key].parent
+        if parent_key is None:
+            yield NestingFinding(child_layer, rowid, nguid, 'nesting_orphan', share)
+            continue
+        parent_rowid = parents.rowids_by_key[parent_key]
+        _, parent_nguid, parent_values = parents.rows[parent_rowid]
+        parent = (parent_layer, parent_rowid, parent_nguid)
+        if share < min_share:
+            yield NestingFinding(child_layer, rowid, nguid, 'nesting_split', share, parent)
+            continue
+        for field, value in values.items():
+            if field in parent_values and normalize_value(value) != normalize_value(parent_values[field]):
+                yield NestingFinding(child_layer, rowid, nguid, 'nesting_attribute', share, parent, field,
+                                     (value, parent_values[field]))
+
+
+def get_state_folder():
+    """ Returns the state folder based on the default location or the
+        NESTING_STATE_FOLDER_PATH constant
+    """
+    return NESTING_STATE_FOLDER_PATH or os.path.join(STATE_FOLDER, 'nesting')
+
+
+def check_nesting(gpkg_path, schema, use_cache=True, min_share=NESTING_MIN_SHARE):
+    """ Checks the nesting of the hierarchy layers of a GeoPackage
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param use_cache  Reuse and update the cached parent map
+    :param min_share  Share of the area of a polygon within its parent
+    :returns:         Tuple of (list of NestingFinding objects, dictionary of
+                      statistics)
+    """
+    start = perf_counter()
+    tables = {feature_class.name: table for table, feature_class in feature_tables(gpkg_path, schema)}
+    levels = [layer for layer in NESTING_LEVELS if layer in tables]
+    state = read_state(get_state_folder(), gpkg_key(gpkg_path), NESTING_STATE_VERSION) if use_cache else {}
+    new_state = {}
+    stats = {"levels": [], "computed": 0, "polygons": 0}
+    findings = []
+    connection = connect(gpkg_path)
+    try:
+        rows = {layer: read_level(connection, tables[layer], NESTING_FIELDS) for layer in levels}
+        # The parent of a level is the level above it in the GeoPackage
+        for parent_layer, child_layer in zip(levels, levels[1:]):
+            children, parents = rows[child_layer], rows[parent_layer]
+            level_state, computed = update_parent_map(connection, children, parents, state.get(child_layer, {}))
+            new_state[child_layer] = level_state
+            findings.extend(level_findings(children, parents, level_state["entries"], min_share))
+            stats["levels"].append((child_layer, parent_layer, len(children.rows), computed))
+            stats["computed"] += computed
+            stats["polygons"] += len(children.rows)
+    finally:
+        connection.close()
+    if use_cache:
+        write_state(get_state_folder(), gpkg_key(gpkg_path), NESTING_STATE_VERSION, new_state)
+    stats["seconds"] = perf_counter() - start
+    return findings, stats
+
+
+def main(argv=None):
+    """ Checks the hierarchy layers of a GeoPackage and writes the findings as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when a polygon failed a rule
+    """
+    parser = argparse.ArgumentParser(description='Checks the nesting of the A1Polygon to A5Polygon layers.')
+    parser.add_argument('gpkg', help='GeoPackage to check')
+    parser.add_argument('--full', action='store_true', help='recompute the parent map instead of the cached one')
+    parser.add_argument('--output', help='CSV file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    findings, stats = check_nesting(args.gpkg, LoadSchema(), use_cache=not args.full)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(NESTING_COLUMNS)
+            writer.writerows(finding.as_tuple() for finding in findings)
+    else:
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        writer.writerow(NESTING_COLUMNS)
+        writer.writerows(finding.as_tuple() for finding in findings)
+    for child_layer, parent_layer, polygons, computed in stats["levels"]:
+        print(f'{child_layer} in {parent_layer}: {polygons} polygons, {computed} parents computed', file=sys.stderr)
+    print(f'{len(findings)} findings in {stats["seconds"]:.2f}s.', file=sys.stderr)
+    return 1 if findings else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run_main('report.nesting'))
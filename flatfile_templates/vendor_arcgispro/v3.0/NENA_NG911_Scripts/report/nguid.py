@@ -0,0 +1,360 @@
+"""
+| Name:      nguid.py
+| Purpose:   Disk-backed NGUID uniqueness index. Every NGUID of a submission
+|            is parsed and validated against the GIS Layer Registry
+|            (urn:emergency:uid:gis:<layer indicator>:<unique id>:<agency>),
+|            and checked for duplicates across all layers and every
+|            submission already in the index. Membership queries look up a
+|            single key.
+|
+| Notes:     The index is an SQLite database with a WITHOUT ROWID table keyed
+|            by the 16-byte BLAKE2b digest of the normalized NGUID, a sorted
+|            B-tree on disk, so RAM is bounded by NGUID_CACHE_KIB and
+|            NGUID_BATCH_SIZE whatever the number of identifiers. Submissions
+|            are added in sorted batches: duplicates within a batch are found
+|            by sorting, duplicates of indexed NGUIDs by a single join per
+|            batch. Findings are stored in the index. Run
+|            `python -m report.nguid` from the NENA_NG911_Scripts folder.
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+from datetime import datetime, timezone
+from itertools import islice
+from operator import itemgetter
+from time import perf_counter
+
+from schema import LoadSchema
+
+from .profiling import connect, feature_tables
+
+# ==============================================================================
+# NGUID Constants
+# ==============================================================================
+NGUID_PREFIX = 'urn:emergency:uid:gis'
+NGUID_FIELD = 'NGUID'
+NGUID_BATCH_SIZE = 200000              # NGUIDs staged and checked at a time
+NGUID_CACHE_KIB = 65536                # SQLite page cache of the index
+NGUID_KEY_BYTES = 16                   # BLAKE2b digest size of the index keys
+NGUID_AGENCY_CACHE = 10000             # Validated agency domains memoized per submission
+
+# NGUID rules: description
+NGUID_RULES = {
+    'nguid_missing': 'NGUID is null or blank',
+    'nguid_format': 'NGUID is not urn:emergency:uid:gis:<layer indicator>:<unique id>:<agency>',
+    'nguid_indicator': 'Layer indicator is not in the GIS Layer Registry',
+    'nguid_layer': 'Layer indicator is not the indicator of the layer',
+    'nguid_agency': 'Agency is not a fully qualified domain name',
+    'nguid_duplicate': 'NGUID is not unique'
+}
+
+NGUID_PATTERN = re.compile(r'\s*urn:emergency:uid:gis:([^:]+):(.+):([^:]+?)\s*$', re.I)
+AGENCY_PATTERN = re.compile(r'(?=.{1,253}$)([a-z0-9]([a-z0-9-]{0,61}[a-z0-9])?\.)+[a-z][a-z0-9-]{0,61}[a-z0-9]$', re.I)
+
+INDEX_DDL = (
+    """CREATE TABLE IF NOT EXISTS submissions (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE, added TEXT NOT NULL, nguids INTEGER NOT NULL DEFAULT 0, findings INTEGER NOT NULL DEFAULT 0)""",
+    """CREATE TABLE IF NOT EXISTS layers (id INTEGER PRIMARY KEY, name TEXT NOT NULL UNIQUE)""",
+    """CREATE TABLE IF NOT EXISTS nguids (key BLOB PRIMARY KEY, submission INTEGER NOT NULL, layer INTEGER NOT NULL, row INTEGER) WITHOUT ROWID""",
+    """CREATE TABLE IF NOT EXISTS findings (submission INTEGER NOT NULL, rule TEXT NOT NULL, layer TEXT NOT NULL, row INTEGER, nguid TEXT, other_submission INTEGER, other_layer TEXT, other_row INTEGER)"""
+)
+
+
+class ParsedNguid(object):
+    """ The parts of an NGUID """
+    __slots__ = ('indicator', 'unique_id', 'agency')
+
+    def __init__(self, indicator, unique_id, agency):
+        self.indicator = indicator
+        self.unique_id = unique_id
+        self.agency = agency
+
+    @property
+    def normalized(self):
+        """ The NGUID with the lowercase URN prefix and agency domain, which
+            are case-insensitive
+        """
+        return f'{NGUID_PREFIX}:{self.indicator}:{self.unique_id}:{self.agency.lower()}'
+
+    def __repr__(self):
+        return f'ParsedNguid({self.indicator!r}, {self.unique_id!r}, {self.agency!r})'
+
+
+def parse_nguid(value):
+    """ Parses an NGUID
+    :param value      NGUID string
+    :returns:         ParsedNguid object, or None if it is not an
+                      urn:emergency:uid:gis URN with three parts
+    """
+    match = NGUID_PATTERN.match(value)
+    return None if match is None else ParsedNguid(*match.groups())
+
+
+def digest(normalized):
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=NGUID_KEY_BYTES).digest()
+
+
+def nguid_key(value):
+    """ Returns the index key of an NGUID, the digest of its normalized form """
+    parsed = parse_nguid(value)
+    return digest(parsed.normalized if parsed is not None else value.strip())
+
+
+def check_nguid(value, indicators, layer_indicator=None, agencies=None):
+    """ Validates the structure of an NGUID and returns its index key, the
+        NGUID is parsed once for both
+    :param value            NGUID string, or None
+    :param indicators       Layer indicators of the GIS Layer Registry
+    :param layer_indicator  Layer indicator of the NGUID's layer, or None
+    :param agencies         Optional dictionary memoizing {agency: valid}
+    :returns:               Tuple of the name of the failed NGUID_RULES rule
+                            (None if valid) and the index key (None if
+                            missing)
+    """
+    if value is None or not str(value).strip():
+        return 'nguid_missing', None
+    value = str(value)
+    match = NGUID_PATTERN.match(value)
+    if match is None:
+        return 'nguid_format', digest(value.strip())
+    indicator, unique_id, agency = match.groups()
+    key = digest(f'{NGUID_PREFIX}:{indicator}:{unique_id}:{agency.lower()}')
+    if indicator not in indicators:
+        return 'nguid_indicator', key
+    if layer_indicator is not None and indicator != layer_indicator:
+        return 'nguid_layer', key
+    valid = agencies.get(agency) if agencies is not None else None
+    if valid is None:
+        valid = AGENCY_PATTERN.match(agency) is not None
+        if agencies is not None and len(agencies) < NGUID_AGENCY_CACHE:
+            agencies[agency] = valid
+    return (None if valid else 'nguid_agency'), key
+
+
+def nguid_rule(value, indicators, layer_indicator=None):
+    """ Validates the structure of an NGUID
+    :param value            NGUID string, or None
+    :param indicators       Layer indicators of the GIS Layer Registry
+    :param layer_indicator  Layer indicator of the NGUID's layer, or None
+    :returns:               Name of the failed NGUID_RULES rule, or None
+    """
+    return check_nguid(value, indicators, layer_indicator)[0]
+
+
+class NguidIndex(object):
+    """ Disk-backed index of the NGUIDs of every submission
+    :param path       Path of the index database, created if missing
+    :param schema     Schema object of the GIS Layer Registry
+    """
+
+    def __init__(self, path, schema):
+        self.path = path
+        self.indicators = frozenset(schema.layer_indicator_by_layer.values())
+        self.layer_indicators = schema.layer_indicator_by_layer
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.connection.execute(f'PRAGMA cache_size = -{NGUID_CACHE_KIB}')
+        for ddl in INDEX_DDL:
+            self.connection.execute(ddl)
+        self.connection.execute('CREATE TEMP TABLE IF NOT EXISTS batch (key BLOB PRIMARY KEY, layer INTEGER NOT NULL, row INTEGER, nguid TEXT) WITHOUT ROWID')
+        self.connection.commit()
+        self.layer_ids = dict(self.connection.execute('SELECT name, id FROM layers'))
+        self.layer_names = {layer_id: name for name, layer_id in self.layer_ids.items()}
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.connection.execute('SELECT count(*) FROM nguids').fetchone()[0]
+
+    def __contains__(self, nguid):
+        return self.connection.execute('SELECT 1 FROM nguids WHERE key = ?', (nguid_key(nguid),)).fetchone() is not None
+
+    def lookup(self, nguid):
+        """ Returns where an NGUID was indexed
+        :param nguid      NGUID string
+        :returns:         Tuple of (submission name, layer, row), or None
+        """
+        row = self.connection.execute(
+            'SELECT s.name, n.layer, n.row FROM nguids n JOIN submissions s ON s.id = n.submission WHERE n.key = ?',
+            (nguid_key(nguid),)).fetchone()
+        return None if row is None else (row[0], self.layer_names[row[1]], row[2])
+
+    def submissions(self):
+        """ Returns the (name, added, nguids, findings) of every submission """
+        return self.connection.execute('SELECT name, added, nguids, findings FROM submissions ORDER BY id').fetchall()
+
+    def layer_id(self, layer):
+        layer_id = self.layer_ids.get(layer)
+        if layer_id is None:
+            layer_id = self.connection.execute('INSERT INTO layers (name) VALUES (?)', (layer,)).lastrowid
+            self.layer_ids[layer] = layer_id
+            self.layer_names[layer_id] = layer
+        return layer_id
+
+    def add_submission(self, name, records, replace=False):
+        """ Validates and indexes the NGUIDs of a submission
+        :param name       Submission name, e.g. the agency and cycle
+        :param records    Iterable of (layer, row, NGUID) tuples
+        :param replace    Replace a submission of the same name. Its NGUIDs
+                          are removed with a scan of the index.
+        :returns:         Dictionary of submission statistics
+        """
+        start = perf_counter()
+        cursor = self.connection.cursor()
+        existing = cursor.execute('SELECT id FROM submissions WHERE name = ?', (name,)).fetchone()
+        if existing is not None:
+            if not replace:
+                raise ValueError(f'Submission {name} is already indexed.')
+            cursor.execute('DELETE FROM nguids WHERE submission = ?', existing)
+            cursor.execute('DELETE FROM findings WHERE submission = ?', existing)
+            cursor.execute('DELETE FROM submissions WHERE id = ?', existing)
+        submission = cursor.execute('INSERT INTO submissions (name, added) VALUES (?, ?)',
+                                    (name, datetime.now(timezone.utc).isoformat(timespec='seconds'))).lastrowid
+        stats = {"submission": name, "records": 0, "nguids": 0, "rules": {rule: 0 for rule in NGUID_RULES}}
+
+        batch = []
+        agencies = {}
+        for layer, row, nguid in records:
+            stats["records"] += 1
+            rule, key = check_nguid(nguid, self.indicators, self.layer_indicators.get(layer), agencies)
+            if rule is not None:
+                stats["rules"][rule] += 1
+                cursor.execute('INSERT INTO findings (submission, rule, layer, row, nguid) VALUES (?, ?, ?, ?, ?)',
+                               (submission, rule, layer, row, nguid))
+                if key is None:
+                    continue
+            batch.append((key, self.layer_id(layer), row, nguid))
+            if len(batch) >= NGUID_BATCH_SIZE:
+                self.add_batch(cursor, submission, batch, stats)
+                batch = []
+        if batch:
+            self.add_batch(cursor, submission, batch, stats)
+
+        findings = sum(stats["rules"].values())
+        cursor.execute('UPDATE submissions SET nguids = ?, findings = ? WHERE id = ?', (stats["nguids"], findings, submission))
+        self.connection.commit()
+        stats["findings"] = findings
+        stats["seconds"] = perf_counter() - start
+        return stats
+
+    def add_batch(self, cursor, submission, batch, stats):
+        """ Indexes a batch of (key, layer id, row, NGUID), sorted by key so
+            the B-tree is written in order
+        """
+        batch.sort(key=itemgetter(0))
+        duplicates = []
+        unique = [batch[0]]
+        for record in batch[1:]:
+            if record[0] == unique[-1][0]:
+                first = unique[-1]
+                duplicates.append((submission, 'nguid_duplicate', self.layer_names[record[1]], record[2], record[3],
+                                   submission, self.layer_names[first[1]], first[2]))
+            else:
+                unique.append(record)
+
+        cursor.executemany('INSERT INTO temp.batch VALUES (?, ?, ?, ?)', unique)
+        for layer, row, nguid, other_submission, other_layer, other_row in cursor.execute(
+                'SELECT b.layer, b.row, b.nguid, n.submission, n.layer, n.row FROM temp.batch b JOIN nguids n ON n.key = b.key'):
+            duplicates.append((submission, 'nguid_duplicate', self.layer_names[layer], row, nguid,
+                               other_submission, self.layer_names[other_layer], other_row))
+        inserted = cursor.execute(
+            'INSERT OR IGNORE INTO nguids SELECT key, ?, layer, row FROM temp.batch ORDER BY key', (submission,)).rowcount
+        cursor.execute('DELETE FROM temp.batch')
+        cursor.executemany('INSERT INTO findings VALUES (?, ?, ?, ?, ?, ?, ?, ?)', duplicates)
+        stats["nguids"] += inserted
+        stats["rules"]["nguid_duplicate"] += len(duplicates)
+
+    def findings(self, name):
+        """ Returns the findings of a submission
+        :param name       Submission name
+        :returns:         Generator of (rule, layer, row, NGUID, other
+                          submission, other layer, other row) tuples
+        """
+        return self.connection.execute(
+            'SELECT f.rule, f.layer, f.row, f.nguid, o.name, f.other_layer, f.other_row FROM findings f '
+            'JOIN submissions s ON s.id = f.submission LEFT JOIN submissions o ON o.id = f.other_submission '
+            'WHERE s.name = ? ORDER BY f.rowid', (name,))
+
+
+def geopackage_records(gpkg_path, schema):
+    """ Streams the (layer, row, NGUID) records of every schema layer of a
+        GeoPackage that has an NGUID column
+    """
+    connection = connect(gpkg_path)
+    try:
+        for table, feature_class in feature_tables(gpkg_path, schema):
+            if NGUID_FIELD not in feature_class.fields_by_name:
+                continue
+            columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{table}])')}
+            if NGUID_FIELD.lower() not in columns:
+                continue
+            for row, nguid in connection.execute(f'SELECT rowid, [{NGUID_FIELD}] FROM [{table}]'):
+                yield feature_class.name, row, nguid
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    """ Adds GeoPackage submissions to an NGUID index or queries it
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when an added submission has findings or a
+                      queried NGUID is not indexed, 2 when a submission is
+                      already indexed and --replace is not set
+    """
+    parser = argparse.ArgumentParser(description='Checks NGUID uniqueness across layers and submissions.')
+    parser.add_argument('index', help='NGUID index database, created if missing')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    add = subparsers.add_parser('add', help='validate and index the NGUIDs of GeoPackages')
+    add.add_argument('gpkg', nargs='+', help='GeoPackage submissions')
+    add.add_argument('--replace', action='store_true', help='replace submissions of the same name')
+    add.add_argument('--findings', type=int, default=20, help='findings printed per submission')
+    query = subparsers.add_parser('query', help='look up NGUIDs')
+    query.add_argument('nguid', nargs='+')
+    args = parser.parse_args(argv)
+
+    schema = LoadSchema()
+    exit_code = 0
+    with NguidIndex(args.index, schema) as index:
+        if args.command == 'query':
+            for nguid in args.nguid:
+                location = index.lookup(nguid)
+                print(f'{nguid}: {"/".join(map(str, location)) if location else "not indexed"}')
+                exit_code = exit_code or (location is None)
+            return int(exit_code)
+
+        indexed = {submission[0] for submission in index.submissions()}
+        for gpkg_path in args.gpkg:
+            name = os.path.splitext(os.path.basename(gpkg_path))[0]
+            if name in indexed and not args.replace:
+                print(f'Submission {name} is already indexed, use --replace', file=sys.stderr)
+                exit_code = 2
+                continue
+            indexed.add(name)
+            stats = index.add_submission(name, geopackage_records(gpkg_path, schema), replace=args.replace)
+            print(f'{name}: {stats["nguids"]} of {stats["records"]} NGUIDs indexed, {stats["findings"]} findings '
+                  f'in {stats["seconds"]:.2f}s')
+            for rule, count in stats["rules"].items():
+                if count:
+                    print(f'{count:>10} {rule}')
+            for finding in islice(index.findings(name), args.findings):
+                print('  ' + ' | '.join('' if value is None else str(value) for value in finding))
+            exit_code = exit_code or (stats["findings"] > 0)
+        print(f'{len(index)} NGUIDs in {args.index}')
+    return int(exit_code)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,299 @@
+"""
+| Name:      profiling.py
+| Purpose:   Data profile of a populated NG9-1-1 GeoPackage for the schema
+|            report: the row count of every layer and, for every schema
+|            field of the layer, its null and fill rates, domain violations,
+|            maximum text length and minimum/maximum numeric values. The
+|            profile adds findings and a Data Profile worksheet to the report.
+|
+| Notes:     Each table is profiled by a single SELECT of aggregates, so the
+|            rows are scanned once by SQLite and never loaded into Python.
+|            Tables are profiled in parallel, each worker thread with its own
+|            read-only connection; sqlite3 releases the GIL while a query
+|            runs. This module only uses the Python standard library.
+"""
+
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
+from pathlib import Path
+
+from backends.geopackage import sql_literal
+from schema.domains import is_case_sensitive
+
+from .rules import SEVERITY_FAIL, SEVERITY_WARN, Finding, index_findings
+from .sheets import ReportCell, flagged, header_row
+
+# ==============================================================================
+# PROFILING Constants
+# ==============================================================================
+PROFILE_WORKERS = 4                    # Tables profiled in parallel, at most one per CPU
+PROFILE_SHEET_TITLE = 'Data Profile'
+
+# Data profile rules by name: severity
+PROFILE_RULES = {
+    'data_required_null': SEVERITY_FAIL,
+    'data_length': SEVERITY_FAIL,
+    'data_domain': SEVERITY_WARN
+}
+
+# Data Profile worksheet: [(column, width, header, style, comment)]
+PROFILE_COLUMNS = [
+    ('A', 28, 'Layer', 'Report Bold', None),
+    ('B', 14, 'Field Name', 'Report Bold', None),
+    ('C', 10, 'Type', 'Report Bold Center', None),
+    ('D', 10, 'Rows', 'Report Bold Center', None),
+    ('E', 10, 'Nulls', 'Report Bold Center', None),
+    ('F', 8, 'Null %', 'Report Bold Center', 'Percent of rows without a value'),
+    ('G', 8, 'Fill %', 'Report Bold Center', 'Percent of rows with a non-blank value'),
+    ('H', 10, 'Domain', 'Report Bold Center', 'Values outside of the field domain'),
+    ('I', 8, 'Max L', 'Report Bold Center', 'Longest text value'),
+    ('J', 6, 'L', 'Report Bold Center', 'Field length'),
+    ('K', 16, 'Min', 'Report Bold Center', None),
+    ('L', 16, 'Max', 'Report Bold Center', None)
+]
+
+
+class FieldProfile(object):
+    """ Data statistics of a field of a populated layer """
+    __slots__ = ('field', 'rows', 'nulls', 'filled', 'violations', 'max_length', 'min_value', 'max_value')
+
+    def __init__(self, field, rows, nulls, filled, violations=None, max_length=None, min_value=None, max_value=None):
+        self.field = field
+        self.rows = rows
+        self.nulls = nulls
+        self.filled = filled
+        self.violations = violations
+        self.max_length = max_length
+        self.min_value = min_value
+        self.max_value = max_value
+
+    @property
+    def null_rate(self):
+        return self.nulls / self.rows if self.rows else 0.0
+
+    @property
+    def fill_rate(self):
+        return self.filled / self.rows if self.rows else 0.0
+
+    def as_dict(self):
+        return {
+            "field": self.field.name,
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "null_rate": self.null_rate,
+            "fill_rate": self.fill_rate,
+            "violations": self.violations,
+            "max_length": self.max_length,
+            "min_value": self.min_value,
+            "max_value": self.max_value
+        }
+
+    def __repr__(self):
+        return f'FieldProfile({self.field.name!r}, {self.rows} rows, {self.nulls} nulls)'
+
+
+class LayerProfile(object):
+    """ Data statistics of a populated layer
+    :param feature_class  FeatureClass object of the table
+    :param table          Table name in the GeoPackage
+    :param rows           Row count
+    :param fields         List of FieldProfile objects, in schema order
+    :param absent         Names of schema fields that are not table columns
+    """
+    __slots__ = ('feature_class', 'table', 'rows', 'fields', 'absent')
+
+    def __init__(self, feature_class, table, rows, fields, absent):
+        self.feature_class = feature_class
+        self.table = table
+        self.rows = rows
+        self.fields = fields
+        self.absent = absent
+
+    def as_dict(self):
+        return {
+            "layer": self.feature_class.name,
+            "rows": self.rows,
+            "fields": [field.as_dict() for field in self.fields],
+            "absent": list(self.absent)
+        }
+
+    def __repr__(self):
+        return f'LayerProfile({self.feature_class.name!r}, {self.rows} rows)'
+
+
+def domain_violation_sql(column, domain):
+    """ Returns the SQL condition of a non-null value outside of a domain
+    :param column     Quoted column name
+    :param domain     Domain object
+    :returns:         SQL condition, or None if the domain has no values
+    """
+    if domain.is_coded and domain.values:
+        # Case-insensitive domains, see schema.domains
+        collate = '' if is_case_sensitive(domain) else ' COLLATE NOCASE'
+        return f'{column}{collate} NOT IN ({", ".join(sql_literal(code) for code in domain.values)})'
+    if domain.is_range and domain.values:
+        return f'({column} < {sql_literal(domain.min_value)} OR {column} > {sql_literal(domain.max_value)})'
+    return None
+
+
+def field_aggregates(field, domain):
+    """ Returns the aggregates of a field
+    :param field      FieldSpec object
+    :param domain     Domain object of the field, or None
+    :returns:         List of (statistic, SQL aggregate) tuples
+    """
+    column = f'[{field.name}]'
+    aggregates = [('values', f'count({column})')]
+    if field.field_type == 'TEXT':
+        aggregates.append(('filled', f"count(CASE WHEN trim({column}) <> '' THEN 1 END)"))
+        aggregates.append(('max_length', f'max(length({column}))'))
+    if field.field_type in ('INTEGER', 'REAL'):
+        aggregates.append(('min_value', f'min({column})'))
+        aggregates.append(('max_value', f'max({column})'))
+    violation = domain_violation_sql(column, domain) if domain is not None else None
+    if violation is not None:
+        aggregates.append(('violations', f'count(CASE WHEN {violation} THEN 1 END)'))
+    return aggregates
+
+
+def profile_query(table, fields, schema):
+    """ Returns the single-pass profile query of a table
+    :param table      Table name
+    :param fields     FieldSpec objects of the table's columns
+    :param schema     Schema object
+    :returns:         Tuple of the SQL query and its [(field, statistic)]
+                      column layout, after the leading row count
+    """
+    layout = []
+    columns = ['count(*)']
+    for field in fields:
+        for statistic, aggregate in field_aggregates(field, schema.domains_by_name.get(field.domain)):
+            layout.append((field, statistic))
+            columns.append(aggregate)
+    return f'SELECT {", ".join(columns)} FROM [{table}]', layout
+
+
+def connect(gpkg_path):
+    """ Opens a read-only connection to a GeoPackage """
+    return sqlite3.connect(f'{Path(os.path.abspath(gpkg_path)).as_uri()}?mode=ro', uri=True, check_same_thread=False)
+
+
+def profile_table(gpkg_path, table, feature_class, schema):
+    """ Profiles the schema fields of a table
+    :param gpkg_path      Path of the GeoPackage
+    :param table          Table name
+    :param feature_class  FeatureClass object of the table
+    :param schema         Schema object
+    :returns:             LayerProfile object
+    """
+    connection = connect(gpkg_path)
+    try:
+        columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{table}])')}
+        fields = [field for field in feature_class.fields if field.name.lower() in columns]
+        absent = tuple(field.name for field in feature_class.fields if field.name.lower() not in columns)
+        sql, layout = profile_query(table, fields, schema)
+        result = connection.execute(sql).fetchone()
+    finally:
+        connection.close()
+
+    rows = result[0]
+    statistics = {}
+    for (field, statistic), value in zip(layout, result[1:]):
+        statistics.setdefault(field.name, {})[statistic] = value
+    field_profiles = []
+    for field in fields:
+        values = statistics[field.name].pop('values')
+        filled = statistics[field.name].pop('filled', values)
+        field_profiles.append(FieldProfile(field, rows, rows - values, filled, **statistics[field.name]))
+    return LayerProfile(feature_class, table, rows, field_profiles, absent)
+
+
+def feature_tables(gpkg_path, schema):
+    """ Returns the feature tables of a GeoPackage that are schema layers
+    :returns:         List of (table name, FeatureClass object) in schema order
+    """
+    connection = connect(gpkg_path)
+    try:
+        tables = [row[0] for row in connection.execute("SELECT table_name FROM gpkg_contents WHERE data_type = 'features'")]
+    finally:
+        connection.close()
+    tables_by_name = {table.lower(): table for table in tables}
+    return [(tables_by_name[fc.name.lower()], fc) for fc in schema.feature_classes if fc.name.lower() in tables_by_name]
+
+
+def profile_geopackage(schema, gpkg_path, workers=PROFILE_WORKERS):
+    """ Profiles every schema layer of a populated GeoPackage
+    :param schema     Schema object
+    :param gpkg_path  Path of the GeoPackage
+    :param workers    Tables profiled in parallel
+    :returns:         List of LayerProfile objects, in schema order
+    """
+    tables = feature_tables(gpkg_path, schema)
+    if not tables:
+        return []
+    workers = max(1, min(workers, len(tables), os.cpu_count() or 1))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(lambda table: profile_table(gpkg_path, table[0], table[1], schema), tables))
+
+
+def profile_findings(profiles):
+    """ Checks the data of the profiled layers
+    :param profiles   List of LayerProfile objects
+    :returns:         List of Finding objects, in PROFILE_RULES order
+    """
+    findings = {rule: [] for rule in PROFILE_RULES}
+    for lyr in profiles:
+        layer = lyr.feature_class.name
+        for profile in lyr.fields:
+            field = profile.field
+            if profile.nulls and (field.is_required or not field.is_nullable):
+                findings['data_required_null'].append(Finding(
+                    'data_required_null', PROFILE_RULES['data_required_null'], layer, field.name,
+                    f'{profile.nulls} of {profile.rows} rows are null in a required field'))
+            if profile.max_length is not None and field.length and profile.max_length > field.length:
+                findings['data_length'].append(Finding(
+                    'data_length', PROFILE_RULES['data_length'], layer, field.name,
+                    f'Longest value has {profile.max_length} characters, the field length is {field.length}'))
+            if profile.violations:
+                findings['data_domain'].append(Finding(
+                    'data_domain', PROFILE_RULES['data_domain'], layer, field.name,
+                    f'{profile.violations} of {profile.rows} rows are outside of the {field.domain} domain'))
+    return list(chain.from_iterable(findings.values()))
+
+
+def percent(rate):
+    return round(100 * rate, 1)
+
+
+def profile_rows(profiles, findings):
+    """ Yields the rows of the Data Profile worksheet, one per profiled field """
+    findings_by_key = index_findings(findings)
+    for lyr in profiles:
+        for profile in lyr.fields:
+            field = profile.field
+            key = lyr.feature_class.name, field.name
+            yield [
+                lyr.feature_class.name,
+                field.name,
+                ReportCell(field.field_type, 'Report Center'),
+                ReportCell(profile.rows, 'Report Center'),
+                flagged(profile.nulls, 'Report Center', findings_by_key.get(('data_required_null',) + key)),
+                ReportCell(percent(profile.null_rate), 'Report Center'),
+                ReportCell(percent(profile.fill_rate), 'Report Center'),
+                flagged(profile.violations, 'Report Center', findings_by_key.get(('data_domain',) + key)),
+                flagged(profile.max_length, 'Report Center', findings_by_key.get(('data_length',) + key)),
+                ReportCell(field.length if field.field_type == 'TEXT' else None, 'Report Center'),
+                ReportCell(profile.min_value, 'Report Center'),
+                ReportCell(profile.max_value, 'Report Center')
+            ]
+
+
+def profile_sheet(profiles, findings):
+    """ Returns the Data Profile worksheet for report.xlsx
+    :param profiles   List of LayerProfile objects
+    :param findings   List of Finding objects of profile_findings()
+    :returns:         Tuple of (title, column definitions, rows)
+    """
+    return PROFILE_SHEET_TITLE, PROFILE_COLUMNS, chain([header_row(PROFILE_COLUMNS)], profile_rows(profiles, findings))
@@ -0,0 +1,258 @@
+"""
+| Name:      ranges.py
+| Purpose:   Address range overlap detection of the RoadCenterLine layer.
+|            Segments are grouped by the normalized complete street name,
+|            community, side (left or right) and address number prefix
+|            (AdNumPre_L/AdNumPre_R), and every pair of segments
+|            of a group whose address ranges share an address number of their
+|            parity (Parity_L/Parity_R) is reported, the most frequent
+|            MSAG-style defect of road centerlines.
+|
+| Notes:     The groups are streamed from the GeoPackage: SQLite sorts the
+|            left and right ranges of the layer by group on disk, and only one
+|            group is held in memory at a time. The ranges of a group are
+|            sorted by their low address number, so the ranges intersecting a
+|            range are the contiguous run of later ranges starting at or below
+|            its high address number, found by bisection. Every range of the
+|            run is compared, including those whose parity shares no number
+|            with it (odd and even ranges of the same block), so a group takes
+|            O(n log n + m) for n ranges and m intersecting pairs, of which
+|            only the pairs of a shared parity are reported. Run
+|            `python -m report.ranges <gpkg>` from the NENA_NG911_Scripts
+|            folder to write the overlaps as CSV.
+"""
+
+import argparse
+import csv
+import sys
+from bisect import bisect_right
+from itertools import groupby
+from operator import itemgetter
+from time import perf_counter
+
+from schema import LoadSchema
+
+from .profiling import connect, feature_tables
+
+# ==============================================================================
+# RANGES Constants
+# ==============================================================================
+RANGE_LAYER = 'RoadCenterLine'
+
+# Parts of the complete street name, in order
+STREET_NAME_FIELDS = ('St_PreMod', 'St_PreDir', 'St_PreTyp', 'St_PreSep', 'St_Name', 'St_PosTyp', 'St_PosDir',
+                      'St_PosMod')
+
+# Community fields of a side, the first one that is not blank is used
+COMMUNITY_FIELDS = ('MSAGComm', 'A3')
+
+# Address number prefix field of a side, e.g. the N of N123 Main St
+PREFIX_FIELD = 'AdNumPre'
+
+# Side suffix: (FromAddr, ToAddr, Parity) fields
+RANGE_SIDES = {
+    'L': ('FromAddr_L', 'ToAddr_L', 'Parity_L'),
+    'R': ('FromAddr_R', 'ToAddr_R', 'Parity_R')
+}
+
+# Parity codes: address numbers of the range, as (odd, even); Z is the range 0-0
+PARITY_NUMBERS = {
+    'O': (True, False),
+    'E': (False, True),
+    'B': (True, True),
+    'Z': (False, False)
+}
+
+OVERLAP_COLUMNS = ('street', 'community', 'side', 'prefix', 'rowid', 'nguid', 'from_addr', 'to_addr', 'parity',
+                   'other_rowid', 'other_nguid', 'other_from_addr', 'other_to_addr', 'other_parity')
+
+
+def normalize_name(*parts):
+    """ Returns the uppercase name of its non-blank parts, with single spaces """
+    return ' '.join(' '.join(map(str, filter(None, parts))).split()).upper()
+
+
+def community_name(*names):
+    """ Returns the first non-blank community name, normalized """
+    for name in names:
+        if name and not str(name).isspace():
+            return normalize_name(name)
+    return ''
+
+
+class AddressRange(object):
+    """ The address range of a side of a road segment
+    :param rowid      Row id of the segment
+    :param nguid      NGUID of the segment
+    :param from_addr  FromAddr value
+    :param to_addr    ToAddr value
+    :param parity     Parity value, a range without parity has both
+    """
+    __slots__ = ('rowid', 'nguid', 'from_addr', 'to_addr', 'parity', 'low', 'high', 'odd', 'even')
+
+    def __init__(self, rowid, nguid, from_addr, to_addr, parity):
+        self.rowid = rowid
+        self.nguid = nguid
+        self.from_addr = from_addr
+        self.to_addr = to_addr
+        self.parity = parity
+        # Ranges may run against the digitized direction
+        self.low, self.high = min(from_addr, to_addr), max(from_addr, to_addr)
+        self.odd, self.even = PARITY_NUMBERS.get(str(parity or 'B').upper(), (True, True))
+
+    @property
+    def is_empty(self):
+        """ A range without address numbers, e.g. parity Z or 0-0 """
+        return not (self.odd or self.even) or self.high <= 0
+
+    def __contains__(self, number):
+        """ Returns whether an address number is in the range and of its parity """
+        if not self.low <= number <= self.high:
+            return False
+        return self.odd if number % 2 else self.even
+
+    def overlaps(self, other):
+        """ Returns whether both ranges share an address number of their parity """
+        low, high = max(self.low, other.low), min(self.high, other.high)
+        if low > high:
+            return False
+        odd, even = self.odd and other.odd, self.even and other.even
+        if odd and even:
+            return True
+        if odd:
+            return low % 2 == 1 or low < high
+        if even:
+            return low % 2 == 0 or low < high
+        return False
+
+    def __repr__(self):
+        return f'AddressRange({self.rowid}, {self.from_addr}-{self.to_addr} {self.parity})'
+
+
+class RangeOverlap(object):
+    """ Two segments of a street, community, side and address number prefix
+        with overlapping ranges
+    """
+    __slots__ = ('street', 'community', 'side', 'prefix', 'range', 'other')
+
+    def __init__(self, street, community, side, prefix, range_, other):
+        self.street = street
+        self.community = community
+        self.side = side
+        self.prefix = prefix
+        self.range = range_
+        self.other = other
+
+    def as_tuple(self):
+        return (self.street, self.community, self.side, self.prefix,
+                self.range.rowid, self.range.nguid, self.range.from_addr, self.range.to_addr, self.range.parity,
+                self.other.rowid, self.other.nguid, self.other.from_addr, self.other.to_addr, self.other.parity)
+
+    def __repr__(self):
+        return (f'RangeOverlap({self.street!r}, {self.community!r}, {self.side!r}, {self.prefix!r}, '
+                f'{self.range!r}, {self.other!r})')
+
+
+def find_overlaps(ranges):
+    """ Finds the overlapping pairs of the address ranges of a group
+    :param ranges     List of AddressRange objects
+    :returns:         Generator of (AddressRange, AddressRange) tuples, the
+                      first of a pair has the lower low address number
+    """
+    ranges = sorted((range_ for range_ in ranges if not range_.is_empty), key=lambda range_: range_.low)
+    lows = [range_.low for range_ in ranges]
+    for index, range_ in enumerate(ranges):
+        # Later ranges start at or after range_.low, they intersect it if they start at or before range_.high
+        for other in ranges[index + 1:bisect_right(lows, range_.high, index + 1)]:
+            if range_.overlaps(other):
+                yield range_, other
+
+
+def range_query(table, columns, selected=False):
+    """ Returns the query of the left and right ranges of a RoadCenterLine
+        table, sorted by street, community, side and address number prefix
+    :param table      Table name
+    :param columns    Lowercase column names of the table
+    :param selected   Keep only the streets accepted by the street_selected
+                      function
+    """
+    def column(name):
+        return f'[{name}]' if name.lower() in columns else 'NULL'
+
+    # SQLite 3.35+ materializes a CTE used twice, the street name is then normalized once per segment
+    fields = ['NGUID'] + [f'{name}_{side}' for side in RANGE_SIDES for name in COMMUNITY_FIELDS + (PREFIX_FIELD,)]
+    fields += [field for side_fields in RANGE_SIDES.values() for field in side_fields]
+    segments = (f'SELECT street_name({", ".join(column(name) for name in STREET_NAME_FIELDS)}) AS street, '
+                f'rowid AS segment, {", ".join(f"{column(field)} AS [{field}]" for field in fields)} FROM [{table}]')
+    selects = []
+    for side, (from_field, to_field, parity_field) in RANGE_SIDES.items():
+        community = f'community_name({", ".join(f"[{name}_{side}]" for name in COMMUNITY_FIELDS)})'
+        selects.append(
+            f"SELECT street, {community} AS community, '{side}' AS side, "
+            f"address_prefix([{PREFIX_FIELD}_{side}]) AS prefix, segment, [NGUID], "
+            f"[{from_field}], [{to_field}], [{parity_field}] FROM segments WHERE street != '' "
+            f"{'AND street_selected(street) ' if selected else ''}"
+            f"AND typeof([{from_field}]) IN ('integer', 'real') AND typeof([{to_field}]) IN ('integer', 'real')")
+    return f'WITH segments AS ({segments}) ' + ' UNION ALL '.join(selects) + \
+        ' ORDER BY street, community, side, prefix'
+
+
+def check_ranges(gpkg_path, schema, streets=None):
+    """ Streams the address range overlaps of the RoadCenterLine layer of a
+        GeoPackage, a street, community, side and prefix at a time
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param streets    Optional set of the normalized street names to check
+    :returns:         Generator of RangeOverlap objects, sorted by street,
+                      community, side and prefix
+    """
+    tables = [table for table, feature_class in feature_tables(gpkg_path, schema) if feature_class.name == RANGE_LAYER]
+    if not tables:
+        return
+    connection = connect(gpkg_path)
+    try:
+        columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{tables[0]}])')}
+        if not all(field.lower() in columns for fields in RANGE_SIDES.values() for field in fields[:2]):
+            return
+        connection.create_function('street_name', len(STREET_NAME_FIELDS), normalize_name, deterministic=True)
+        connection.create_function('community_name', len(COMMUNITY_FIELDS), community_name, deterministic=True)
+        connection.create_function('address_prefix', 1, normalize_name, deterministic=True)
+        if streets is not None:
+            connection.create_function('street_selected', 1, lambda street: street in streets)
+        cursor = connection.execute(range_query(tables[0], columns, streets is not None))
+        for (street, community, side, prefix), rows in groupby(cursor, key=itemgetter(0, 1, 2, 3)):
+            ranges = [AddressRange(*row[4:]) for row in rows]
+            for range_, other in find_overlaps(ranges):
+                yield RangeOverlap(street, community, side, prefix, range_, other)
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    """ Checks the address ranges of a GeoPackage and writes the overlaps as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when ranges overlap
+    """
+    parser = argparse.ArgumentParser(description='Finds overlapping address ranges of the RoadCenterLine layer.')
+    parser.add_argument('gpkg', help='GeoPackage to check')
+    parser.add_argument('--output', help='CSV file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    f = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    count = 0
+    try:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(OVERLAP_COLUMNS)
+        for overlap in check_ranges(args.gpkg, LoadSchema()):
+            writer.writerow(overlap.as_tuple())
+            count += 1
+    finally:
+        if args.output:
+            f.close()
+    print(f'{count} overlapping address ranges in {perf_counter() - start:.2f}s.', file=sys.stderr)
+    return 1 if count else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
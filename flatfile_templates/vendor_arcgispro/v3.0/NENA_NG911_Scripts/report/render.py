@@ -0,0 +1,92 @@
+"""
+| Name:      render.py
+| Purpose:   Renders the findings of the schema report rules as JSON, CSV or
+|            Markdown. The Microsoft Excel report, which also lists the
+|            schema, is rendered by report.xlsx.
+|
+| Notes:     This module only uses the Python standard library.
+"""
+
+import csv
+import io
+import json
+
+from .rules import RULES, count_findings
+
+# ==============================================================================
+# RENDER Constants
+# ==============================================================================
+FINDING_COLUMNS = ('rule', 'severity', 'layer', 'field', 'message')
+
+# File extension of each report format
+REPORT_FORMATS = {
+    'xlsx': 'xlsx',
+    'json': 'json',
+    'csv': 'csv',
+    'markdown': 'md'
+}
+
+
+def render_json(findings, indent=2):
+    """ Returns the findings and their counts by severity as JSON """
+    return json.dumps({
+        "counts": count_findings(findings),
+        "findings": [finding.as_dict() for finding in findings]
+    }, indent=indent)
+
+
+def render_csv(findings):
+    """ Returns the findings as CSV, one finding per row """
+    f = io.StringIO()
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(FINDING_COLUMNS)
+    for finding in findings:
+        writer.writerow([finding.rule, finding.severity, finding.layer, finding.field, finding.message])
+    return f.getvalue()
+
+
+def render_markdown(findings):
+    """ Returns a Markdown summary of the findings by rule, followed by a
+        table of the findings
+    """
+    counts = count_findings(findings)
+    lines = [
+        '# Schema Report Findings',
+        '',
+        f'{counts["FAIL"]} failed and {counts["WARN"]} warned checks.',
+        '',
+        '| Rule | FAIL | WARN |',
+        '| --- | ---: | ---: |'
+    ]
+    # Schema rules, then the rules of other findings such as the data profile
+    rules = list(RULES) + [rule for rule in dict.fromkeys(finding.rule for finding in findings) if rule not in RULES]
+    for rule in rules:
+        rule_counts = count_findings([finding for finding in findings if finding.rule == rule])
+        lines.append(f'| {rule} | {rule_counts["FAIL"]} | {rule_counts["WARN"]} |')
+    if findings:
+        lines.extend(['', '| Severity | Rule | Layer | Field | Message |', '| --- | --- | --- | --- | --- |'])
+        for finding in findings:
+            message = finding.message.replace('|', '\\|')
+            lines.append(f'| {finding.severity} | {finding.rule} | {finding.layer} | {finding.field} | {message} |')
+    return '\n'.join(lines) + '\n'
+
+
+# Text renderers by report format
+RENDERERS = {
+    'json': render_json,
+    'csv': render_csv,
+    'markdown': render_markdown
+}
+
+
+def write_findings(findings, path, report_format):
+    """ Writes the findings to a JSON, CSV or Markdown file
+    :param findings       List of Finding objects from report.rules
+    :param path           Output file path
+    :param report_format  json | csv | markdown
+    :returns:             n/a
+    """
+    if report_format not in RENDERERS:
+        raise ValueError(f'{report_format} not recognized findings format. Options are {", ".join(RENDERERS)}.')
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write(RENDERERS[report_format](findings))
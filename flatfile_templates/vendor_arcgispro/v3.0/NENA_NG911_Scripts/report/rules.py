@@ -0,0 +1,268 @@
+"""
+| Name:      rules.py
+| Purpose:   Validation rules of the schema report. Each rule checks the
+|            indexed Schema object once and returns a Finding for every
+|            feature class, field, definition or registry entry that fails or
+|            needs review. The findings are rendered to XLSX, JSON, CSV or
+|            Markdown by report.render and report.xlsx, or checked by the
+|            report.gate command line gate.
+|
+| Notes:     The rules do not depend on openpyxl, so the checks can run in
+|            CI without it. Every rule checks one target (feature class, field
+|            definition or registry entry) at a time, so report.incremental
+|            can re-evaluate only the targets whose sections changed.
+"""
+
+from schema.sections import SECTION_KINDS
+
+# ==============================================================================
+# RULES Constants
+# ==============================================================================
+SEVERITY_FAIL = 'FAIL'
+SEVERITY_WARN = 'WARN'
+SEVERITIES = (SEVERITY_FAIL, SEVERITY_WARN)
+
+FIELD_TYPES = frozenset(['DATETIME', 'REAL', 'INTEGER', 'TEXT'])
+MIN_DESCRIPTION_LENGTH = 51            # Shorter layer and field descriptions are reported as missing
+
+# Optional ServiceBoundaryPolygon layers of the GIS Layer Registry
+OPTIONAL_SERVICE_BOUNDARY_LAYERS = frozenset(['CoastGuardPolygon', 'MountainRescuePolygon', 'PoisonControlPolygon'])
+
+
+class Finding(object):
+    """ A failed or warned check of a rule
+    :param rule       Name of the rule
+    :param severity   FAIL | WARN
+    :param layer      Feature class or registry layer name, '' for field
+                      definitions
+    :param field      Field name, '' for layer checks
+    :param message    Description of the finding
+    """
+    __slots__ = ('rule', 'severity', 'layer', 'field', 'message')
+
+    def __init__(self, rule, severity, layer, field, message):
+        self.rule = rule
+        self.severity = severity
+        self.layer = layer
+        self.field = field
+        self.message = message
+
+    @property
+    def key(self):
+        return self.rule, self.layer, self.field
+
+    def as_dict(self):
+        return {
+            "rule": self.rule,
+            "severity": self.severity,
+            "layer": self.layer,
+            "field": self.field,
+            "message": self.message
+        }
+
+    def __repr__(self):
+        return f'Finding({self.rule!r}, {self.severity!r}, {self.layer!r}, {self.field!r})'
+
+
+def is_optional_service_boundary(lyr_name):
+    """ Returns True if a GIS Layer Registry layer is an optional
+        ServiceBoundaryPolygon layer, created from the ServiceBoundaryPolygon
+        template
+    """
+    return ((lyr_name in OPTIONAL_SERVICE_BOUNDARY_LAYERS) or
+            (lyr_name.startswith('Police') and lyr_name != 'PolicePolygon') or
+            (lyr_name.startswith('Fire') and lyr_name != 'FirePolygon') or
+            (lyr_name.startswith('Ems') and lyr_name != 'EmsPolygon'))
+
+
+# Feature class rules
+def check_layer_registered(schema, feature_class):
+    if feature_class.name in schema.registry_by_layer_name:
+        return
+    if feature_class.name == "ServiceBoundaryPolygon":
+        yield Finding('layer_registered', SEVERITY_WARN, feature_class.name, '',
+                      'Template for optional ServiceBoundaryPolygon layers defined in GIS Layer Registry')
+    else:
+        yield Finding('layer_registered', SEVERITY_FAIL, feature_class.name, '',
+                      'Layer not found in GIS Layer Registry')
+
+
+def check_layer_description(schema, feature_class):
+    if len(feature_class.description) < MIN_DESCRIPTION_LENGTH:
+        yield Finding('layer_description', SEVERITY_FAIL, feature_class.name, '',
+                      'Layer description is missing')
+
+
+# Feature class field rules
+def check_field_defined(schema, feature_class):
+    for field in feature_class.fields:
+        if field.name not in schema.fields_by_name:
+            yield Finding('field_defined', SEVERITY_FAIL, feature_class.name, field.name,
+                          'Field name not found in flatfile_schema_v3.yaml FIELDS definitions.')
+
+
+def check_field_alias(schema, feature_class):
+    for field in feature_class.fields:
+        field_definition = schema.fields_by_name.get(field.name)
+        if field_definition is not None and field.alias != field_definition.title:
+            yield Finding('field_alias', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'{field.alias} != {field_definition.title}')
+
+
+def check_field_type(schema, feature_class):
+    for field in feature_class.fields:
+        field_definition = schema.fields_by_name.get(field.name)
+        if field_definition is None:
+            continue
+        if field.field_type not in FIELD_TYPES:
+            yield Finding('field_type', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'Field Type: "{field.field_type}" not recognized')
+        elif field.field_type != field_definition.field_type:
+            yield Finding('field_type', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'{field.field_type} != {field_definition.field_type}')
+
+
+def check_field_length(schema, feature_class):
+    for field in feature_class.fields:
+        field_definition = schema.fields_by_name.get(field.name)
+        if (field_definition is not None and field.field_type == 'TEXT' and
+                str(field.length) != str(field_definition.width)):
+            yield Finding('field_length', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'{field.length} != {field_definition.width}')
+
+
+def check_field_nullable(schema, feature_class):
+    for field in feature_class.fields:
+        field_definition = schema.fields_by_name.get(field.name)
+        # A required field must not be nullable and an optional field must be
+        if field_definition is None or str(field.is_nullable).lower() != str(field_definition.required).lower():
+            continue
+        # A field named after the layer prefix and St_Name of RoadCenterLine
+        # are reviewed exceptions
+        if field.name == feature_class.name[:2]:
+            yield Finding('field_nullable', SEVERITY_WARN, feature_class.name, field.name, "Special exception")
+        elif field.name == 'St_Name' and feature_class.name == 'RoadCenterLine':
+            yield Finding('field_nullable', SEVERITY_WARN, feature_class.name, field.name,
+                          "Not Null in RoadCenterLine")
+        else:
+            yield Finding('field_nullable', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'{field.is_nullable} == {field_definition.required}')
+
+
+def check_field_required(schema, feature_class):
+    for field in feature_class.fields:
+        field_definition = schema.fields_by_name.get(field.name)
+        if field_definition is None or str(field.is_required).lower() == str(field_definition.required).lower():
+            continue
+        if field.name == feature_class.name[:2]:
+            yield Finding('field_required', SEVERITY_WARN, feature_class.name, field.name, "Special exception")
+        elif field.name == 'St_Name' and feature_class.name == 'RoadCenterLine':
+            yield Finding('field_required', SEVERITY_WARN, feature_class.name, field.name,
+                          "Required in RoadCenterLine")
+        else:
+            yield Finding('field_required', SEVERITY_FAIL, feature_class.name, field.name,
+                          f'{field.is_required} != {field_definition.required}')
+
+
+def check_field_domain(schema, feature_class):
+    for field in feature_class.fields:
+        if len(field.domain) > 0 and field.domain not in schema.domains_by_name:
+            yield Finding('field_domain', SEVERITY_FAIL, feature_class.name, field.name,
+                          'Domain not found in flatfile_schema_v3.yaml')
+
+
+# Field definition rules
+def check_definition_in_use(schema, field):
+    if field.name not in schema.field_names_in_use:
+        yield Finding('definition_in_use', SEVERITY_FAIL, '', field.name,
+                      'Field is not being used in flatfile_schema_v3.yaml')
+
+
+def check_definition_description(schema, field):
+    if len(field.description) < MIN_DESCRIPTION_LENGTH:
+        yield Finding('definition_description', SEVERITY_FAIL, '', field.name, 'Field description is missing')
+
+
+def check_definition_type(schema, field):
+    if field.field_type not in FIELD_TYPES:
+        yield Finding('definition_type', SEVERITY_FAIL, '', field.name,
+                      f'Field Type: "{field.field_type}" not recognized')
+
+
+# GIS Layer Registry rules
+def check_registry_defined(schema, reg):
+    lyr_name = reg.layer_name
+    if lyr_name in schema.feature_classes_by_name:
+        return
+    if is_optional_service_boundary(lyr_name):
+        yield Finding('registry_defined', SEVERITY_WARN, lyr_name, '',
+                      f'{lyr_name} optional ServiceBoundaryPolygon layer')
+    else:
+        yield Finding('registry_defined', SEVERITY_FAIL, lyr_name, '',
+                      f'{lyr_name} not defined in flatfile_schema_v3.yaml')
+
+
+# Rules by name, in evaluation and report order: (target kind, function).
+# A rule function checks a single target of its kind and yields findings.
+RULES = {
+    'layer_registered': ('feature_class', check_layer_registered),
+    'layer_description': ('feature_class', check_layer_description),
+    'field_defined': ('feature_class', check_field_defined),
+    'field_alias': ('feature_class', check_field_alias),
+    'field_type': ('feature_class', check_field_type),
+    'field_length': ('feature_class', check_field_length),
+    'field_nullable': ('feature_class', check_field_nullable),
+    'field_required': ('feature_class', check_field_required),
+    'field_domain': ('feature_class', check_field_domain),
+    'definition_in_use': ('field', check_definition_in_use),
+    'definition_description': ('field', check_definition_description),
+    'definition_type': ('field', check_definition_type),
+    'registry_defined': ('registry', check_registry_defined)
+}
+
+
+def schema_targets(schema, kind):
+    """ Returns the targets of a kind, as in schema.sections.SECTION_KINDS """
+    return getattr(schema, SECTION_KINDS[kind][0])
+
+
+def evaluate_target(schema, kind, target, rules=None):
+    """ Evaluates the rules of a target kind over a single target
+    :param schema     Schema object
+    :param kind       Target kind [domain | feature_class | field | registry]
+    :param target     Domain, FeatureClass, FieldDefinition or RegistryEntry
+    :param rules      Optional names of the rules to evaluate, all RULES by
+                      default
+    :returns:         Dictionary of {rule name: list of Finding objects}
+    """
+    return {name: list(RULES[name][1](schema, target)) for name in (rules or RULES) if RULES[name][0] == kind}
+
+
+def evaluate_rules(schema, rules=None):
+    """ Evaluates the report rules over a schema
+    :param schema     Schema object
+    :param rules      Optional names of the rules to evaluate, all RULES by
+                      default
+    :returns:         List of Finding objects, in rule order
+    """
+    findings = []
+    for name in (rules or RULES):
+        if name not in RULES:
+            raise ValueError(f'{name} not recognized report rule. Options are {", ".join(RULES)}.')
+        kind, check = RULES[name]
+        for target in schema_targets(schema, kind):
+            findings.extend(check(schema, target))
+    return findings
+
+
+def index_findings(findings):
+    """ Returns the findings by (rule, layer, field) """
+    return {finding.key: finding for finding in findings}
+
+
+def count_findings(findings):
+    """ Returns the number of findings of each severity """
+    counts = dict.fromkeys(SEVERITIES, 0)
+    for finding in findings:
+        counts[finding.severity] += 1
+    return counts
@@ -0,0 +1,224 @@
+"""
+| Name:      sheets.py
+| Purpose:   Row model of the Microsoft Excel schema report: the column
+|            definitions of the Feature Class Report, Domains, Section 4
+|            Layer Overview, Section 5 Fields Overview and GIS Layer Registry
+|            worksheets, and the rows of each domain, feature class, field
+|            definition and registry entry with the cell styles and comments
+|            of its findings.
+|
+| Notes:     The rows are written by report.xlsx. This module does not
+|            depend on openpyxl, so report.incremental can cache the rows of
+|            each target.
+"""
+
+from itertools import chain
+from textwrap import dedent
+
+from .rules import index_findings, schema_targets
+
+
+class ReportCell(object):
+    """ A styled or commented cell of a report row """
+    __slots__ = ('value', 'style', 'comment')
+
+    def __init__(self, value, style=None, comment=None):
+        self.value = value
+        self.style = style
+        self.comment = comment
+
+    def __repr__(self):
+        return f'ReportCell({self.value!r}, {self.style!r})'
+
+
+def flagged(value, style, finding):
+    """ Returns the cell of a value checked by a rule
+    :param value      Cell value
+    :param style      REPORT_STYLES name of the cell, None for unstyled
+    :param finding    Finding object of the cell, or None if it passed
+    :returns:         ReportCell object, or the value of an unstyled cell
+    """
+    if finding is not None:
+        return ReportCell(value, f'{style or "Report"} {finding.severity.title()}', finding.message)
+    if style is None:
+        return value
+    return ReportCell(value, style)
+
+
+def header_row(columns):
+    """ Returns the header row of a worksheet from its column definitions """
+    return [ReportCell(header, style, comment) for column, width, header, style, comment in columns]
+
+
+def description_cell(desc, finding):
+    """ Returns the cell of a layer or field description """
+    if finding is not None:
+        return ReportCell('MISSING', 'Report Bold Top Wrap Fail')
+    return ReportCell(dedent(desc).lstrip('\n'), 'Report Top Wrap')
+
+
+def feature_class_rows(schema, findings, feature_class):
+    # The feature class name is written on the row of its first field
+    name_cell = flagged(feature_class.name, None, findings.get(('layer_registered', feature_class.name, '')))
+    if not feature_class.fields:
+        yield [name_cell]
+
+    for field in feature_class.fields:
+        key = feature_class.name, field.name
+        undefined = findings.get(('field_defined',) + key)
+        if undefined is not None:
+            alias_cell = ReportCell(field.alias, 'Report Fail', 'Field not found in FIELDS parameters.')
+            type_cell = ReportCell(field.field_type, 'Report Center Fail', 'Field not found in FIELDS parameters.')
+            section_cell = ReportCell('MISSING', 'Report Bold Center Fail')
+        else:
+            alias_cell = flagged(field.alias, None, findings.get(('field_alias',) + key))
+            type_cell = flagged(field.field_type, 'Report Center', findings.get(('field_type',) + key))
+            section_cell = ReportCell(float(schema.fields_by_name[field.name].section), 'Report Center')
+
+        yield [
+            name_cell,
+            alias_cell,
+            flagged(field.name, None, undefined),
+            type_cell,
+            flagged(field.length, 'Report Center', findings.get(('field_length',) + key)),
+            ReportCell(field.precision, 'Report Center'),
+            ReportCell(field.scale, 'Report Center'),
+            flagged(field.is_nullable, 'Report Center', findings.get(('field_nullable',) + key)),
+            flagged(field.is_required, 'Report Center', findings.get(('field_required',) + key)),
+            flagged(field.domain, None, findings.get(('field_domain',) + key)),
+            field.default,
+            section_cell
+        ]
+        name_cell = None
+    yield []
+
+
+def domain_rows(schema, findings, domain):
+    yield [
+        ReportCell(domain.name, 'Report Top'),
+        ReportCell(domain.domain_type, 'Report Top'),
+        ReportCell(domain.field_type, 'Report Top'),
+        ReportCell(domain.description, 'Report Top Wrap')
+    ]
+    if domain.is_coded:
+        yield [None, ReportCell('Code', 'Report Bold'), ReportCell('Value', 'Report Bold')]
+        if domain.values != None:
+            for k, v in domain.values.items():
+                yield [None, k, v]
+        else:
+            yield [None, "User Defined", "User Defined"]
+    elif domain.is_range:
+        yield [None, ReportCell('Min', 'Report Bold'), ReportCell('Max', 'Report Bold')]
+        yield [None, str(domain.min_value), str(domain.max_value)]
+    yield []
+
+
+def layer_rows(schema, findings, lyr):
+    yield [
+        ReportCell(lyr.alias, 'Report Top'),
+        ReportCell(lyr.name, 'Report Top'),
+        ReportCell(lyr.section, 'Report Top Center'),
+        ReportCell(lyr.geometry_type, 'Report Top Center'),
+        ReportCell('No' if lyr.has_z == False else 'Yes', 'Report Top Center'),
+        ReportCell(len(lyr.fields), 'Report Top Center'),
+        description_cell(lyr.description, findings.get(('layer_description', lyr.name, ''))),
+        ReportCell(", ".join(lyr.keywords), 'Report Top')
+    ]
+
+
+def field_rows(schema, findings, field):
+    field_type = field.field_type
+    if findings.get(('definition_type', '', field.name)) is not None:
+        type_cells = [ReportCell("ERROR", 'Report Bold Top Center Fail'), None, None, None]
+    else:
+        if field_type == "TEXT":
+            type_values = [field_type, field.width, '--', '--']
+        elif field_type == "REAL":
+            type_values = [field_type, '--', field.precision, field.scale]
+        else:
+            type_values = [field_type, '--', '--', '--']
+        type_cells = [ReportCell(value, 'Report Top Center') for value in type_values]
+
+    yield [
+        ReportCell(field.title, 'Report Top'),
+        flagged(field.name, 'Report Top', findings.get(('definition_in_use', '', field.name))),
+        ReportCell(str(field.section), 'Report Top'),
+        description_cell(field.description, findings.get(('definition_description', '', field.name))),
+        *type_cells,
+        ReportCell(field.required, 'Report Top Center'),
+        ReportCell(field.has_domain, 'Report Top Center')
+    ]
+
+
+def registry_rows(schema, findings, reg):
+    yield [
+        flagged(reg.layer_name, 'Report Top', findings.get(('registry_defined', reg.layer_name, ''))),
+        ReportCell(reg.layer_indicator, 'Report Top')
+    ]
+
+
+# Worksheets of the report: (title, [(column, width, header, style, comment)],
+# target kind, rows function). The rows function returns the rows of a single
+# target of the kind.
+REPORT_SHEETS = (
+    ("Feature Class Report", [
+        ('A', 24, 'Feature Class', 'Report Bold', None),
+        ('B', 32, 'Field Alias', 'Report Bold', None),
+        ('C', 14, 'Field Name', 'Report Bold', None),
+        ('D', 10, 'Type', 'Report Bold Center', None),
+        ('E', 4, 'L', 'Report Bold Center', 'Length'),
+        ('F', 4, 'P', 'Report Bold Center', 'Precision'),
+        ('G', 4, 'S', 'Report Bold Center', 'Scale'),
+        ('H', 6, 'Null', 'Report Bold Center', 'Is Nullable?'),
+        ('I', 6, 'Reqd', 'Report Bold Center', 'Is Required?'),
+        ('J', 30, 'Domain', 'Report Bold', None),
+        ('K', 30, 'Default Value', 'Report Bold', None),
+        ('L', 12, 'Section #', 'Report Bold Center', 'What is the Section Number of the field?')
+    ], 'feature_class', feature_class_rows),
+    ("Domains", [
+        ('A', 30, 'Domain Name', 'Report Bold', None),
+        ('B', 50, 'Domain Type', 'Report Bold', None),
+        ('C', 40, 'Field Type', 'Report Bold', None),
+        ('D', 50, 'Description', 'Report Bold', None)
+    ], 'domain', domain_rows),
+    ("Section 4 Layer Overview", [
+        ('A', 30, 'Layer Alias', 'Report Bold', None),
+        ('B', 30, 'Layer Name', 'Report Bold', None),
+        ('C', 10, 'Section #', 'Report Bold Center', None),
+        ('D', 10, 'Geometry', 'Report Bold Center', None),
+        ('E', 10, 'Has Z?', 'Report Bold Center', None),
+        ('F', 10, 'Fields', 'Report Bold Center', None),
+        ('G', 80, 'Description', 'Report Bold', None),
+        ('H', 30, 'Keywords', 'Report Bold', None)
+    ], 'feature_class', layer_rows),
+    ("Section 5 Fields Overview", [
+        ('A', 32, 'Attribute Title', 'Report Bold', None),
+        ('B', 14, 'Field Name', 'Report Bold', None),
+        ('C', 10, 'Section #', 'Report Bold', None),
+        ('D', 80, 'Description', 'Report Bold', None),
+        ('E', 10, 'Data Type', 'Report Bold Center', None),
+        ('F', 10, 'Length', 'Report Bold Center', None),
+        ('G', 10, 'Precision', 'Report Bold Center', None),
+        ('H', 10, 'Scale', 'Report Bold Center', None),
+        ('I', 10, 'Required?', 'Report Bold Center', None),
+        ('J', 10, 'Domain?', 'Report Bold Center', None)
+    ], 'field', field_rows),
+    ("GIS Layer Registry", [
+        ('A', 40, 'Layer Name', 'Report Bold', None),
+        ('B', 20, 'Layer Indicator', 'Report Bold', None)
+    ], 'registry', registry_rows)
+)
+
+
+def report_sheets(schema, findings):
+    """ Returns the worksheets of the report
+    :param schema     Schema object
+    :param findings   List of Finding objects from report.rules
+    :returns:         Generator of (title, column definitions, rows) tuples,
+                      the rows, header first, are lists of values and
+                      ReportCell objects
+    """
+    findings_by_key = index_findings(findings)
+    for title, columns, kind, rows in REPORT_SHEETS:
+        yield title, columns, chain([header_row(columns)], chain.from_iterable(
+            rows(schema, findings_by_key, target) for target in schema_targets(schema, kind)))
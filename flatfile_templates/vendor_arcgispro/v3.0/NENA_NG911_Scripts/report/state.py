@@ -0,0 +1,83 @@
+"""
+| Name:      state.py
+| Purpose:   State files of the incremental report modules (report.incremental,
+|            report.nesting and report.watermark), which keep the results of
+|            a run to reuse them on the next one.
+|
+| Notes:     A state is a dictionary pickled to <folder>/<key>.pickle with its
+|            version. A state that is missing, unreadable or of another
+|            version reads as empty, so that the next run starts over. A
+|            state is written to a temporary file of its folder that then
+|            replaces the state file, a reader never sees a partial state.
+|            The pickled classes are stored by the name of their module, a
+|            module run with `python -m` is run through run_main so that its
+|            state is not bound to __main__.
+"""
+
+import hashlib
+import importlib
+import os
+import pickle
+import tempfile
+
+# ==============================================================================
+# STATE Constants
+# ==============================================================================
+STATE_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache'))
+
+
+def get_state_path(folder, key):
+    """ Returns the path of a state file
+    :param folder     Folder of the state files
+    :param key        Name of the state file, without its extension
+    """
+    return os.path.join(folder, f'{key}.pickle')
+
+
+def gpkg_key(gpkg_path):
+    """ Returns the state key of a GeoPackage, a digest of its absolute path """
+    return hashlib.sha256(os.path.abspath(gpkg_path).encode('utf-8')).hexdigest()[:16]
+
+
+def read_state(folder, key, version):
+    """ Returns a stored state, or an empty state if it is missing, unreadable
+        or of another version
+    :param folder     Folder of the state files
+    :param key        Name of the state file
+    :param version    Version of the state
+    :returns:         Dictionary of the state
+    """
+    try:
+        with open(get_state_path(folder, key), 'rb') as f:
+            state = pickle.load(f)
+    except Exception:
+        return {}
+    return state if isinstance(state, dict) and state.get("version") == version else {}
+
+
+def write_state(folder, key, version, state):
+    """ Atomically writes a state
+    :param folder     Folder of the state files, created if needed
+    :param key        Name of the state file
+    :param version    Version of the state, stored with it
+    :param state      Dictionary of the state
+    """
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(dict(state, version=version), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, get_state_path(folder, key))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def run_main(module_name):
+    """ Runs the main function of a module imported by its package name, so
+        that the classes of its pickled state are not bound to __main__
+    :param module_name  Module name, e.g. report.nesting
+    :returns:           Exit code of the main function
+    """
+    return importlib.import_module(module_name).main()
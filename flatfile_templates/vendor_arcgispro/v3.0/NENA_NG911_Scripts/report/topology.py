@@ -0,0 +1,433 @@
+"""
+| Name:      topology.py
+| Purpose:   Gap and overlap topology check of the boundary polygon layers,
+|            which must tile their coverage area: PsapPolygon, PolicePolygon,
+|            FirePolygon, EmsPolygon, ProvisioningPolygon and A1Polygon to
+|            A5Polygon. Every area covered by two polygons of a layer, and
+|            every area enclosed by a layer but covered by none of its
+|            polygons, is reported with its area, a location within it and
+|            the NGUIDs of the participating polygons.
+|
+| Notes:     This module requires shapely 2, the other report modules do
+|            not. The extent of each layer is split into tiles of about
+|            TOPOLOGY_TILE_FEATURES polygons, read through the GeoPackage
+|            R-tree spatial index, and each tile is checked in a worker
+|            process: its polygons are clipped to the tile and prepared,
+|            overlapping pairs are found with an STRtree, and the gaps are
+|            the parts of the tile they do not cover. Gap and overlap pieces
+|            that touch a tile seam are merged across the tiles, and a merged
+|            gap reaching the outer edge of the extent is outside of the
+|            coverage area. Areas are planar in the units of the spatial
+|            reference, the overlays are computed on a grid of
+|            TOPOLOGY_GRID_PRECISION of the largest coordinate of a layer. The
+|            findings do not depend on the tile layout, add --verify-tiles
+|            <polygons per tile> to check a layer again with other tiles and
+|            fail when the findings differ. Run
+|            `python -m report.topology <gpkg>` from the NENA_NG911_Scripts
+|            folder to write the findings as CSV.
+"""
+
+import argparse
+import csv
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from math import ceil, isclose, sqrt
+from time import perf_counter
+
+import shapely
+from shapely import box
+
+from schema import LoadSchema
+
+from .addresses import is_geographic, spatial_table
+from .geometry import gpkg_header
+from .profiling import connect, feature_tables
+
+# ==============================================================================
+# TOPOLOGY Constants
+# ==============================================================================
+TOPOLOGY_LAYERS = ('PsapPolygon', 'PolicePolygon', 'FirePolygon', 'EmsPolygon', 'ProvisioningPolygon',
+                   'A1Polygon', 'A2Polygon', 'A3Polygon', 'A4Polygon', 'A5Polygon')
+TOPOLOGY_TILE_FEATURES = 2000          # Polygons checked per tile
+TOPOLOGY_WORKERS = os.cpu_count() or 1  # Tiles checked in parallel processes
+TOPOLOGY_EXTENT_MARGIN = 0.01          # Margin around a layer extent, as a fraction of its size
+TOPOLOGY_BORDER_TOLERANCE = 1e-9       # Distance of a polygon bordering a gap, as a fraction of the tile size
+TOPOLOGY_GRID_PRECISION = 1e-12        # Grid of the gaps and overlaps, as a fraction of the largest coordinate
+TOPOLOGY_AREA_TOLERANCE = 1e-6         # Relative difference of the area of a finding checked with other tiles
+
+# Smallest reported area in the units of geographic (square degrees, about 1 m2) and projected spatial references
+TOPOLOGY_MIN_AREA = {True: 1e-10, False: 1.0}
+
+# Topology rules: description
+TOPOLOGY_RULES = {
+    'topology_gap': 'Area enclosed by the layer is not covered by any of its polygons',
+    'topology_overlap': 'Area is covered by two polygons of the layer'
+}
+
+TOPOLOGY_COLUMNS = ('layer', 'rule', 'area', 'x', 'y', 'nguids')
+
+
+class TopologyFinding(object):
+    """ A gap or overlap of a boundary layer
+    :param layer      Layer name
+    :param rule       Name of the failed TOPOLOGY_RULES rule
+    :param geometry   Shapely polygon of the gap or overlap
+    :param nguids     NGUIDs of the overlapping polygons, or of the polygons
+                      bordering the gap
+    """
+    __slots__ = ('layer', 'rule', 'geometry', 'nguids')
+
+    def __init__(self, layer, rule, geometry, nguids):
+        self.layer = layer
+        self.rule = rule
+        self.geometry = geometry
+        self.nguids = tuple(sorted(str(nguid) for nguid in nguids))
+
+    @property
+    def area(self):
+        return self.geometry.area
+
+    @property
+    def location(self):
+        """ A point within the gap or overlap, as a (x, y) tuple """
+        point = shapely.point_on_surface(self.geometry)
+        return point.x, point.y
+
+    def as_tuple(self):
+        x, y = self.location
+        return self.layer, self.rule, self.area, x, y, ';'.join(self.nguids)
+
+    def key(self):
+        """ Identifies the finding whatever the tile layout, its area aside """
+        return self.layer, self.rule, self.nguids
+
+    def __repr__(self):
+        return f'TopologyFinding({self.layer!r}, {self.rule!r}, {self.area:.6g}, {self.nguids!r})'
+
+
+def polygon_parts(geometries):
+    """ Returns the polygons of geometries, dropping points and lines
+    :param geometries Shapely geometry or array of geometries
+    :returns:         Array of shapely polygons with an area
+    """
+    parts = shapely.get_parts(geometries)
+    return parts[(shapely.get_type_id(parts) == 3) & (shapely.area(parts) > 0)]
+
+
+def read_polygons(rows):
+    """ Reads the polygons of a feature table
+    :param rows       Iterable of (rowid, GeoPackage geometry, NGUID) rows
+    :returns:         Tuple of (list of NGUIDs, array of shapely geometries),
+                      invalid geometries are made valid
+    """
+    nguids, wkbs = [], []
+    for rowid, blob, nguid in rows:
+        if blob is None:
+            continue
+        offset, is_empty = gpkg_header(blob)
+        if not is_empty:
+            nguids.append(nguid if nguid is not None else f'rowid {rowid}')
+            wkbs.append(bytes(blob[offset:]))
+    geometries = shapely.from_wkb(wkbs)
+    invalid = ~shapely.is_valid(geometries)
+    if invalid.any():
+        geometries[invalid] = shapely.make_valid(geometries[invalid])
+    return nguids, geometries
+
+
+def layer_extent(connection, table):
+    """ Returns the extent of a feature table and its number of features
+    :returns:         Tuple of ((min x, min y, max x, max y), count), the
+                      extent is None for an empty table
+    """
+    if table.rtree is not None:
+        count, *extent = connection.execute(
+            f'SELECT count(*), min(minx), min(miny), max(maxx), max(maxy) FROM [{table.rtree}]').fetchone()
+        return (tuple(extent) if count else None), count
+    _, geometries = read_polygons(connection.execute(*table.select(('NGUID',))))
+    if not len(geometries):
+        return None, 0
+    return tuple(shapely.total_bounds(geometries)), len(geometries)
+
+
+def plan_tiles(extent, count, tile_features=TOPOLOGY_TILE_FEATURES):
+    """ Splits the extent of a layer, with a margin, into tiles
+    :param extent         Tuple of (min x, min y, max x, max y)
+    :param count          Number of features of the layer
+    :param tile_features  Features per tile, on average
+    :returns:             Tuple of (expanded extent, list of tiles)
+    """
+    min_x, min_y, max_x, max_y = extent
+    margin = max(max_x - min_x, max_y - min_y) * TOPOLOGY_EXTENT_MARGIN or 1.0
+    min_x, min_y, max_x, max_y = min_x - margin, min_y - margin, max_x + margin, max_y + margin
+    splits = max(1, ceil(sqrt(count / tile_features)))
+    xs = [min_x + (max_x - min_x) * i / splits for i in range(splits)] + [max_x]
+    ys = [min_y + (max_y - min_y) * i / splits for i in range(splits)] + [max_y]
+    tiles = [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for i in range(splits) for j in range(splits)]
+    return (min_x, min_y, max_x, max_y), tiles
+
+
+def check_tile(gpkg_path, table, tile, grid_size=None):
+    """ Finds the gap and overlap pieces of the polygons of a tile
+    :param gpkg_path  Path of the GeoPackage
+    :param table      SpatialTable object of the layer
+    :param tile       Tuple of (min x, min y, max x, max y)
+    :param grid_size  Precision grid of the gap and overlap pieces, None for
+                      the full floating point precision
+    :returns:         Tuple of overlap pieces, as (WKB, (NGUID, NGUID))
+                      tuples, and gap pieces, as (WKB, touches a seam,
+                      NGUIDs of the bordering polygons) tuples
+    """
+    # A seam may fall a rounding error away from the edge of a polygon bordering a gap, the
+    # polygons are read and matched to the gaps within a tolerance
+    min_x, min_y, max_x, max_y = tile
+    tolerance = max(max_x - min_x, max_y - min_y) * TOPOLOGY_BORDER_TOLERANCE
+    connection = connect(gpkg_path)
+    try:
+        nguids, geometries = read_polygons(connection.execute(*table.select(
+            ('NGUID',), (min_x - tolerance, min_y - tolerance, max_x + tolerance, max_y + tolerance))))
+    finally:
+        connection.close()
+    # Neighbours clipped at a seam may end a rounding error apart, the overlays of such edges are
+    # computed on a grid, the same for all the tiles so that the pieces still meet at the seams
+    tile_box = shapely.set_precision(box(*tile), grid_size) if grid_size else box(*tile)
+    clipped = shapely.clip_by_rect(geometries, *tile)
+    keep = shapely.area(clipped) > 0
+    clipped_nguids = [nguid for nguid, kept in zip(nguids, keep) if kept]
+    clipped = clipped[keep]
+    shapely.prepare(clipped)
+    tree = shapely.STRtree(clipped)
+
+    overlaps = []
+    left, right = tree.query(clipped, predicate='intersects')
+    pairs = left < right
+    left, right = left[pairs], right[pairs]
+    # Neighbours sharing a boundary touch, only the other pairs overlap
+    pairs = ~shapely.touches(clipped[left], clipped[right])
+    left, right = left[pairs], right[pairs]
+    pieces = shapely.intersection(clipped[left], clipped[right], grid_size=grid_size)
+    pairs = shapely.area(pieces) > 0
+    for i, j, piece in zip(left[pairs], right[pairs], pieces[pairs]):
+        overlaps.append((shapely.to_wkb(shapely.multipolygons(polygon_parts(piece))),
+                         (clipped_nguids[i], clipped_nguids[j])))
+
+    gaps = []
+    if len(clipped):
+        uncovered = shapely.difference(tile_box, shapely.union_all(clipped, grid_size=grid_size),
+                                       grid_size=grid_size)
+    else:
+        uncovered = tile_box
+    parts = polygon_parts(uncovered)
+    seams = shapely.intersects(parts, tile_box.exterior)
+    # The bordering polygons are found among the whole polygons, a neighbour whose edge lies on
+    # a seam has no area in the tile, so the NGUIDs of a gap do not depend on the tile layout
+    polygons = shapely.STRtree(geometries)
+    for part, seam in zip(parts, seams):
+        bordering = polygons.query(part, predicate='dwithin', distance=tolerance)
+        gaps.append((shapely.to_wkb(part), bool(seam), tuple(nguids[index] for index in bordering)))
+    return overlaps, gaps
+
+
+class TopologyTask(object):
+    """ Checks a tile of a layer, in a worker process
+    :param gpkg_path  Path of the GeoPackage
+    """
+    __slots__ = ('gpkg_path',)
+
+    def __init__(self, gpkg_path):
+        self.gpkg_path = gpkg_path
+
+    def __call__(self, job):
+        layer, table, tile, grid_size = job
+        return check_tile(self.gpkg_path, table, tile, grid_size)
+
+
+def merge_overlaps(layer, pieces, min_area, grid_size=None):
+    """ Merges the overlap pieces of the tiles of a layer by polygon pair
+    :param layer      Layer name
+    :param pieces     List of (WKB, (NGUID, NGUID)) overlap pieces
+    :param min_area   Smallest reported area
+    :param grid_size  Precision grid of the overlap pieces
+    :returns:         Generator of TopologyFinding objects
+    """
+    by_pair = {}
+    for wkb, pair in pieces:
+        by_pair.setdefault(pair, []).append(wkb)
+    for pair, wkbs in by_pair.items():
+        merged = shapely.union_all(shapely.from_wkb(wkbs), grid_size=grid_size)
+        for part in polygon_parts(merged):
+            if part.area >= min_area:
+                yield TopologyFinding(layer, 'topology_overlap', part, pair)
+
+
+def merge_gaps(layer, pieces, extent, min_area, grid_size=None):
+    """ Merges the gap pieces of the tiles of a layer across the tile seams
+    :param layer      Layer name
+    :param pieces     List of (WKB, touches a seam, NGUIDs) gap pieces
+    :param extent     Tuple of the expanded extent of the tiles
+    :param min_area   Smallest reported area
+    :param grid_size  Precision grid of the gap pieces
+    :returns:         Generator of TopologyFinding objects
+    """
+    seam_pieces, seam_nguids = [], []
+    for wkb, seam, nguids in pieces:
+        if seam:
+            seam_pieces.append(wkb)
+            seam_nguids.append(nguids)
+            continue
+        gap = shapely.from_wkb(wkb)
+        if gap.area >= min_area:
+            yield TopologyFinding(layer, 'topology_gap', gap, nguids)
+    if not seam_pieces:
+        return
+    seam_pieces = shapely.from_wkb(seam_pieces)
+    gaps = polygon_parts(shapely.union_all(seam_pieces, grid_size=grid_size))
+    # A piece belongs to the merged gap holding a point of its interior, not to a gap it only
+    # touches at a corner
+    nguids = [set() for _ in gaps]
+    pieces, merged = shapely.STRtree(gaps).query(shapely.point_on_surface(seam_pieces), predicate='intersects')
+    for piece, gap in zip(pieces, merged):
+        nguids[gap].update(seam_nguids[piece])
+    edge = box(*extent).exterior
+    for gap, gap_nguids in zip(gaps, nguids):
+        # The merged pieces reaching the edge of the extent are outside of the coverage area
+        if gap.area < min_area or gap.intersects(edge):
+            continue
+        yield TopologyFinding(layer, 'topology_gap', gap, gap_nguids)
+
+
+def check_topology(gpkg_path, schema, layers=None, workers=TOPOLOGY_WORKERS, min_area=None,
+                   tile_features=TOPOLOGY_TILE_FEATURES):
+    """ Streams the gaps and overlaps of the boundary layers of a GeoPackage,
+        a layer at a time
+    :param gpkg_path      Path of the GeoPackage
+    :param schema         Schema object
+    :param layers         Optional names of the layers to check, by default
+                          the TOPOLOGY_LAYERS of the GeoPackage
+    :param workers        Tiles checked in parallel processes
+    :param min_area       Smallest reported area, by default TOPOLOGY_MIN_AREA
+                          of the spatial reference of each layer
+    :param tile_features  Polygons per tile, on average
+    :returns:             Generator of TopologyFinding objects
+    """
+    tables = {feature_class.name: table for table, feature_class in feature_tables(gpkg_path, schema)
+              if feature_class.name in (layers or TOPOLOGY_LAYERS)}
+    plans, jobs = {}, []
+    connection = connect(gpkg_path)
+    try:
+        for layer, table in tables.items():
+            table = spatial_table(connection, table)
+            extent, count = layer_extent(connection, table)
+            if extent is None:
+                continue
+            extent, tiles = plan_tiles(extent, count, tile_features)
+            area = min_area if min_area is not None else TOPOLOGY_MIN_AREA[is_geographic(connection, table.table)]
+            grid_size = max(map(abs, extent)) * TOPOLOGY_GRID_PRECISION
+            plans[layer] = (extent, len(tiles), area, grid_size)
+            jobs.extend((layer, table, tile, grid_size) for tile in tiles)
+    finally:
+        connection.close()
+    if not jobs:
+        return
+    task = TopologyTask(gpkg_path)
+    workers = max(1, min(workers, len(jobs)))
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    try:
+        results = executor.map(task, jobs) if executor else map(task, jobs)
+        overlaps, gaps, done = [], [], 0
+        # The jobs are ordered by layer, a layer is merged once its last tile is checked
+        for (layer, _, _, _), (tile_overlaps, tile_gaps) in zip(jobs, results):
+            overlaps.extend(tile_overlaps)
+            gaps.extend(tile_gaps)
+            done += 1
+            extent, tile_count, area, grid_size = plans[layer]
+            if done == tile_count:
+                yield from merge_overlaps(layer, overlaps, area, grid_size)
+                yield from merge_gaps(layer, gaps, extent, area, grid_size)
+                overlaps, gaps, done = [], [], 0
+    finally:
+        if executor:
+            executor.shutdown()
+
+
+def compare_findings(areas, other_areas):
+    """ Compares the findings of two tile layouts, the areas of a finding are
+        the same within TOPOLOGY_AREA_TOLERANCE
+    :param areas        Dictionary of finding key: list of areas
+    :param other_areas  Dictionary of finding key: list of areas, of the other
+                        tile layout
+    :returns:           Tuple of the lists of (key, area) tuples found only in
+                        areas and only in other_areas
+    """
+    only, other_only = [], []
+    for key in sorted(areas.keys() | other_areas.keys()):
+        first, second = sorted(areas.get(key, ())), sorted(other_areas.get(key, ()))
+        i = j = 0
+        while i < len(first) and j < len(second):
+            if isclose(first[i], second[j], rel_tol=TOPOLOGY_AREA_TOLERANCE):
+                i, j = i + 1, j + 1
+            elif first[i] < second[j]:
+                only.append((key, first[i]))
+                i += 1
+            else:
+                other_only.append((key, second[j]))
+                j += 1
+        only.extend((key, area) for area in first[i:])
+        other_only.extend((key, area) for area in second[j:])
+    return only, other_only
+
+
+def main(argv=None):
+    """ Checks the boundary layers of a GeoPackage and writes the findings as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when a layer has gaps or overlaps, 2 when
+                      --verify-tiles finds other findings
+    """
+    parser = argparse.ArgumentParser(description='Finds the gaps and overlaps of the boundary polygon layers.')
+    parser.add_argument('gpkg', help='GeoPackage to check')
+    parser.add_argument('--layer', action='append', help='layer to check, all boundary layers by default')
+    parser.add_argument('--workers', type=int, default=TOPOLOGY_WORKERS, help='tiles checked in parallel')
+    parser.add_argument('--min-area', type=float, help='smallest reported area in the units of the spatial reference')
+    parser.add_argument('--tile-features', type=int, default=TOPOLOGY_TILE_FEATURES, help='polygons per tile')
+    parser.add_argument('--verify-tiles', type=int, metavar='TILE_FEATURES',
+                        help='check again with this many polygons per tile, fail when the findings differ')
+    parser.add_argument('--output', help='CSV file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    schema = LoadSchema()
+    f = open(args.output, 'w', encoding='utf-8', newline='') if args.output else sys.stdout
+    counts = {}
+    areas = {}
+    try:
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(TOPOLOGY_COLUMNS)
+        for finding in check_topology(args.gpkg, schema, args.layer, args.workers, args.min_area, args.tile_features):
+            writer.writerow(finding.as_tuple())
+            counts[finding.layer, finding.rule] = counts.get((finding.layer, finding.rule), 0) + 1
+            areas.setdefault(finding.key(), []).append(finding.area)
+    finally:
+        if args.output:
+            f.close()
+    for (layer, rule), count in counts.items():
+        print(f'{count:>10} {rule} {layer}', file=sys.stderr)
+    print(f'{sum(counts.values())} findings in {perf_counter() - start:.2f}s.', file=sys.stderr)
+
+    if args.verify_tiles:
+        other_areas = {}
+        for finding in check_topology(args.gpkg, schema, args.layer, args.workers, args.min_area, args.verify_tiles):
+            other_areas.setdefault(finding.key(), []).append(finding.area)
+        only, other_only = compare_findings(areas, other_areas)
+        for tile_features, differences in ((args.tile_features, only), (args.verify_tiles, other_only)):
+            for (layer, rule, nguids), area in differences:
+                print(f'Only with {tile_features} polygons per tile: {layer} {rule} {area:.6g} {";".join(nguids)}',
+                      file=sys.stderr)
+        if only or other_only:
+            return 2
+        print(f'Same findings with {args.verify_tiles} polygons per tile.', file=sys.stderr)
+    return 1 if counts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
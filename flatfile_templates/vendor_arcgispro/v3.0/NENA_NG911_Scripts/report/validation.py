@@ -0,0 +1,232 @@
+"""
+| Name:      validation.py
+| Purpose:   Streaming attribute validator of populated GeoPackages. Every
+|            value of every schema field is checked against its definition
+|            in flatfile_schema_v3.yaml: field type, field_length,
+|            field_is_nullable/field_is_required, RANGE bounds and CODED
+|            values. The findings are streamed as compact (layer, rowid,
+|            field, rule) records.
+|
+| Notes:     Each layer is read through a sqlite3 cursor in chunks of
+|            VALIDATION_CHUNK_SIZE rows, so memory stays flat whatever the
+|            layer size. A chunk is transposed to columns and each column is
+|            checked as a batch: the types are collected with a single map(),
+|            the other checks run once per distinct value, the domains use the
+|            compiled checks of schema.domains, and only failing values are
+|            located back to their rowids. Run
+|            `python -m report.validation <gpkg>` from the NENA_NG911_Scripts
+|            folder to write the findings as CSV.
+"""
+
+import argparse
+import csv
+import re
+import sys
+from time import perf_counter
+
+from schema import LoadSchema
+from schema.domains import RangeDomainCheck
+
+from .profiling import connect, feature_tables
+
+# ==============================================================================
+# VALIDATION Constants
+# ==============================================================================
+VALIDATION_CHUNK_SIZE = 10000          # Rows read from the cursor at a time
+VALIDATION_ROWID_BATCH = 500           # Row ids per query when validating selected rows
+
+# Validation rules: description
+VALIDATION_RULES = {
+    'value_type': 'Value is not of the field type',
+    'value_length': 'Text is longer than field_length',
+    'value_null': 'Value is null in a required or non-nullable field',
+    'value_range': 'Value is outside of the RANGE domain',
+    'value_coded': 'Value is not a code of the CODED domain'
+}
+
+# Python value types accepted for each field type
+VALUE_TYPES = {
+    'TEXT': frozenset([str]),
+    'INTEGER': frozenset([int]),
+    'REAL': frozenset([float, int]),
+    'DATETIME': frozenset([str])
+}
+
+DATETIME_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?Z?)?$')
+FINDING_COLUMNS = ('layer', 'rowid', 'field', 'rule')
+
+
+class RowFinding(object):
+    """ A value of a row that failed a validation rule """
+    __slots__ = ('layer', 'rowid', 'field', 'rule')
+
+    def __init__(self, layer, rowid, field, rule):
+        self.layer = layer
+        self.rowid = rowid
+        self.field = field
+        self.rule = rule
+
+    def as_tuple(self):
+        return self.layer, self.rowid, self.field, self.rule
+
+    def __repr__(self):
+        return f'RowFinding({self.layer!r}, {self.rowid}, {self.field!r}, {self.rule!r})'
+
+
+def value_checks(field):
+    """ Returns the checks of the non-null values of a field
+    :param field      FieldSpec object
+    :returns:         List of (rule, predicate) tuples, the predicate returns
+                      True for a failing value of the field type
+    """
+    checks = []
+    if field.field_type == 'TEXT' and field.length:
+        checks.append(('value_length', lambda value, length=field.length: len(value) > length))
+    if field.field_type == 'DATETIME':
+        checks.append(('value_type', lambda value: DATETIME_PATTERN.match(value) is None))
+    return checks
+
+
+class ColumnValidator(object):
+    """ Checks the values of a field a column of a chunk at a time
+    :param field      FieldSpec object
+    :param domain     Compiled domain check of the field from
+                      schema.domain_checks, or None
+    """
+    __slots__ = ('field', 'types', 'check_null', 'checks', 'domain', 'domain_rule')
+
+    def __init__(self, field, domain=None):
+        self.field = field
+        self.types = VALUE_TYPES.get(field.field_type, frozenset())
+        self.check_null = field.is_required or not field.is_nullable
+        self.checks = value_checks(field)
+        self.domain = domain
+        self.domain_rule = 'value_range' if isinstance(domain, RangeDomainCheck) else 'value_coded'
+
+    def validate(self, values):
+        """ Checks a column of values
+        :param values     Tuple of the column values of a chunk
+        :returns:         Generator of (index, rule) tuples of failing values
+        """
+        types = set(map(type, values))
+        types.discard(type(None))
+        if self.check_null and None in values:
+            yield from ((index, 'value_null') for index, value in enumerate(values) if value is None)
+        if not types <= self.types:
+            yield from ((index, 'value_type') for index, value in enumerate(values)
+                        if value is not None and type(value) not in self.types)
+        if self.checks:
+            # Checks run once per distinct value of the field type
+            distinct = {value for value in set(values) if type(value) in self.types}
+            for rule, check in self.checks:
+                failed = {value for value in distinct if check(value)}
+                if failed:
+                    yield from ((index, rule) for index, value in enumerate(values) if value in failed)
+        if self.domain is not None:
+            mask = self.domain.validate(values)
+            if any(mask):
+                yield from ((index, self.domain_rule) for index, (failed, value) in enumerate(zip(mask, values))
+                            if failed and type(value) in self.types)
+
+
+def validate_table(connection, table, feature_class, schema, chunk_size=VALIDATION_CHUNK_SIZE, rowids=None):
+    """ Streams the findings of a table, a chunk of rows at a time
+    :param connection     sqlite3 connection
+    :param table          Table name
+    :param feature_class  FeatureClass object of the table
+    :param schema         Schema object
+    :param chunk_size     Rows read at a time
+    :param rowids         Row ids of the rows to validate, every row by
+                          default. They are read VALIDATION_ROWID_BATCH rows
+                          at a time
+    :returns:             Generator of RowFinding objects, in rowid order per
+                          chunk and field order within a row
+    """
+    columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{table}])')}
+    fields = [field for field in feature_class.fields if field.name.lower() in columns]
+    if not fields:
+        return
+    validators = [ColumnValidator(field, schema.domain_checks.get(field.domain)) for field in fields]
+    sql = f'SELECT rowid, {", ".join(f"[{field.name}]" for field in fields)} FROM [{table}]'
+    if rowids is None:
+        cursor = connection.execute(sql)
+        chunks = iter(lambda: cursor.fetchmany(chunk_size), [])
+    else:
+        selected = sorted(rowids)
+        batches = (selected[start:start + VALIDATION_ROWID_BATCH]
+                   for start in range(0, len(selected), VALIDATION_ROWID_BATCH))
+        chunks = (connection.execute(f'{sql} WHERE rowid IN ({", ".join("?" * len(batch))})', batch).fetchall()
+                  for batch in batches)
+    for rows in chunks:
+        if not rows:
+            continue
+        rowids, *columns = zip(*rows)
+        failures = []
+        for position, (validator, values) in enumerate(zip(validators, columns)):
+            failures.extend((index, position, rule) for index, rule in validator.validate(values))
+        failures.sort()
+        for index, position, rule in failures:
+            yield RowFinding(feature_class.name, rowids[index], fields[position].name, rule)
+
+
+def validate_geopackage(gpkg_path, schema, layers=None, chunk_size=VALIDATION_CHUNK_SIZE):
+    """ Streams the findings of every schema layer of a GeoPackage
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param layers     Optional names of the layers to validate
+    :param chunk_size Rows read at a time
+    :returns:         Generator of RowFinding objects, layer by layer
+    """
+    connection = connect(gpkg_path)
+    try:
+        for table, feature_class in feature_tables(gpkg_path, schema):
+            if layers and feature_class.name not in layers:
+                continue
+            yield from validate_table(connection, table, feature_class, schema, chunk_size)
+    finally:
+        connection.close()
+
+
+def write_row_findings(findings, f):
+    """ Writes a findings stream as CSV and counts the findings
+    :param findings   Iterable of RowFinding objects
+    :param f          Text file object
+    :returns:         Dictionary of {(layer, field, rule): count}
+    """
+    counts = {}
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(FINDING_COLUMNS)
+    for finding in findings:
+        writer.writerow(finding.as_tuple())
+        key = finding.layer, finding.field, finding.rule
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+def main(argv=None):
+    """ Validates a GeoPackage and writes the findings as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when a value failed a rule
+    """
+    parser = argparse.ArgumentParser(description='Validates the attributes of a populated NG9-1-1 GeoPackage.')
+    parser.add_argument('gpkg', help='GeoPackage to validate')
+    parser.add_argument('--layer', action='append', help='layer to validate, all schema layers by default')
+    parser.add_argument('--chunk-size', type=int, default=VALIDATION_CHUNK_SIZE, help='rows read at a time')
+    parser.add_argument('--output', help='CSV file to write instead of the console')
+    args = parser.parse_args(argv)
+
+    start = perf_counter()
+    findings = validate_geopackage(args.gpkg, LoadSchema(), args.layer, args.chunk_size)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8', newline='') as f:
+            counts = write_row_findings(findings, f)
+    else:
+        counts = write_row_findings(findings, sys.stdout)
+    for (layer, field, rule), count in counts.items():
+        print(f'{count:>10} {rule} {layer}/{field}', file=sys.stderr)
+    print(f'{sum(counts.values())} findings in {perf_counter() - start:.2f}s.', file=sys.stderr)
+    return 1 if counts else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+"""
+| Name:      watermark.py
+| Purpose:   Incremental validation of populated GeoPackages. The attribute
+|            findings of report.validation, the address range overlaps of
+|            report.ranges and the address point findings of
+|            report.addresses are kept in a state file with, for each layer,
+|            the high-water mark of its DateUpdate values and a digest of the
+|            content of every row, keyed by its NGUID and rowid. The next run
+|            only checks the rows changed since then and the rows affected by
+|            them, and merges the results into the stored findings.
+|
+| Notes:     A row is changed when it is new or its digest differs. Only the
+|            rows whose DateUpdate is at or after the stored mark, or null or
+|            not a date, are read and digested, the keys of every row are
+|            read to find the added and removed rows. DateUpdate values are
+|            compared as SQLite julianday() numbers, so ISO 8601 dates with a
+|            T or a space separator and a Z or numeric UTC offset all compare
+|            by the time they denote. The attribute rules only depend on
+|            the row itself; the overlaps are recomputed for the streets of
+|            the changed segments, before and after the edit; the changed
+|            address points and the address points within the search radius
+|            of the bounding box of a changed segment, before and after the
+|            edit, are rechecked, read through the R-tree spatial indexes
+|            (without them the address check runs in full). An edit
+|            that does not update DateUpdate is not seen, run with --full to
+|            check every row and reset the state. The state is kept in
+|            cache/watermark/ and is discarded when the schema, the search
+|            radius or WATERMARK_STATE_VERSION changes. Run
+|            `python -m report.watermark <gpkg>` from the NENA_NG911_Scripts
+|            folder to write the findings as CSV.
+"""
+
+import argparse
+import csv
+import hashlib
+import marshal
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from math import inf, nextafter
+from operator import itemgetter
+from time import perf_counter
+
+from schema import LoadSchema
+
+from .addresses import (ADDRESS_COLUMNS, ADDRESS_LAYER, ADDRESS_SEARCH_RADIUS, ADDRESS_WORKERS, AddressTask,
+                        check_addresses, is_geographic, spatial_table)
+from .profiling import connect, feature_tables
+from .ranges import OVERLAP_COLUMNS, RANGE_LAYER, STREET_NAME_FIELDS, check_ranges, normalize_name
+from .state import STATE_FOLDER, gpkg_key, read_state, run_main, write_state
+from .validation import FINDING_COLUMNS, validate_table
+
+# ==============================================================================
+# WATERMARK Constants
+# ==============================================================================
+WATERMARK_FIELD = 'DateUpdate'
+WATERMARK_BATCH_SIZE = 500             # Row ids per query of selected rows
+WATERMARK_STATE_FOLDER_PATH = None     # Overrides the default state folder (NENA_NG911_Scripts/cache/watermark)
+WATERMARK_STATE_VERSION = 3            # Increment when a check or the stored findings change
+
+# Output file name: CSV columns
+WATERMARK_OUTPUTS = {
+    'attributes.csv': FINDING_COLUMNS,
+    'ranges.csv': OVERLAP_COLUMNS,
+    'addresses.csv': ADDRESS_COLUMNS
+}
+
+
+class LayerChanges(object):
+    """ The rows of a layer changed since the previous run
+    :param table      Table name
+    :param rows       Dictionary of {(NGUID, rowid): digest} of every row
+    :param watermark  Latest DateUpdate value as a julian day number, or None
+    :param changed    Dictionary of {rowid: (NGUID, rowid)} of the new and
+                      changed rows
+    :param removed    Set of the (NGUID, rowid) keys of the removed rows
+    """
+    __slots__ = ('table', 'rows', 'watermark', 'changed', 'removed')
+
+    def __init__(self, table, rows, watermark, changed, removed):
+        self.table = table
+        self.rows = rows
+        self.watermark = watermark
+        self.changed = changed
+        self.removed = removed
+
+    @property
+    def is_full(self):
+        """ Every row of the layer is new or changed """
+        return len(self.changed) == len(self.rows)
+
+    @property
+    def keys(self):
+        """ Keys of the changed and removed rows """
+        return self.removed.union(self.changed.values())
+
+    def __repr__(self):
+        return f'LayerChanges({self.table!r}, {len(self.changed)} changed, {len(self.removed)} removed)'
+
+
+def select_rows(connection, sql, rowids):
+    """ Reads selected rows, WATERMARK_BATCH_SIZE row ids at a time
+    :param connection sqlite3 connection
+    :param sql        Query ending with the rowid expression to select on
+    :param rowids     Iterable of row ids
+    :returns:         Generator of rows
+    """
+    rowids = sorted(rowids)
+    for start in range(0, len(rowids), WATERMARK_BATCH_SIZE):
+        batch = rowids[start:start + WATERMARK_BATCH_SIZE]
+        yield from connection.execute(f'{sql} IN ({", ".join("?" * len(batch))})', batch)
+
+
+def scan_layer(connection, table, layer_state):
+    """ Finds the rows of a layer changed since the previous run
+    :param connection     sqlite3 connection
+    :param table          Table name
+    :param layer_state    Stored state of the layer, empty on the first run.
+                          Its digests are updated in place
+    :returns:             LayerChanges object
+    """
+    columns = {row[1].lower() for row in connection.execute(f'PRAGMA table_info([{table}])')}
+    nguid = '[NGUID]' if 'nguid' in columns else 'NULL'
+    tracked = WATERMARK_FIELD.lower() in columns
+    keys = {rowid: (value, rowid) for rowid, value in connection.execute(f'SELECT rowid, {nguid} FROM [{table}]')}
+    rows = layer_state.get("rows", {})
+    removed = {key for key in rows if keys.get(key[1]) != key}
+    for key in removed:
+        del rows[key]
+    changed = {}
+
+    date_update = f'julianday([{WATERMARK_FIELD}])'
+    sql = f'SELECT rowid, {date_update if tracked else "NULL"}, * FROM [{table}]'
+    watermark = layer_state.get("watermark")
+    if tracked and watermark is not None:
+        # Rows updated before the mark keep their digest, new rows are found by their key. Rows
+        # of the mark itself are read again, an edit in the same millisecond changes their digest
+        candidates = connection.execute(f'{sql} WHERE {date_update} IS NULL OR {date_update} >= ?', (watermark,))
+    else:
+        candidates = connection.execute(sql)
+    for row in candidates:
+        rowid, date = row[0], row[1]
+        if date is not None and (watermark is None or date > watermark):
+            watermark = date
+        key = keys.get(rowid)
+        if key is None:
+            continue
+        digest = hashlib.blake2b(marshal.dumps(row[2:]), digest_size=16).digest()
+        if rows.get(key) != digest:
+            rows[key] = digest
+            changed[rowid] = key
+    # New rows with a DateUpdate before the mark
+    missing = [rowid for rowid, key in keys.items() if key not in rows] if len(rows) < len(keys) else []
+    for row in select_rows(connection, f'{sql} WHERE rowid', missing):
+        rows[keys[row[0]]] = hashlib.blake2b(marshal.dumps(row[2:]), digest_size=16).digest()
+        changed[row[0]] = keys[row[0]]
+    return LayerChanges(table, rows, watermark, changed, removed)
+
+
+def update_attributes(connection, schema, feature_class, changes, stored):
+    """ Validates the attributes of the changed rows of a layer
+    :param connection     sqlite3 connection
+    :param schema         Schema object
+    :param feature_class  FeatureClass object of the layer
+    :param changes        LayerChanges object of the layer
+    :param stored         Dictionary of {key: list of (field, rule) tuples}
+                          of the layer, updated in place
+    """
+    for key in changes.keys:
+        stored.pop(key, None)
+    if not changes.changed:
+        return
+    rowids = None if changes.is_full else changes.changed
+    # Rows share their (field, rule) tuples, which are pickled once
+    pairs = {}
+    for finding in validate_table(connection, changes.table, feature_class, schema, rowids=rowids):
+        pair = finding.field, finding.rule
+        stored.setdefault(changes.changed[finding.rowid], []).append(pairs.setdefault(pair, pair))
+
+
+def update_ranges(gpkg_path, schema, connection, roads, changes, stored):
+    """ Recomputes the address range overlaps of the streets of the changed
+        road segments
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param connection sqlite3 connection
+    :param roads      SpatialTable object of the road segments
+    :param changes    LayerChanges object of the road segments
+    :param stored     Dictionary of {street: list of overlap tuples}, updated
+                      in place
+    :returns:         Number of streets checked, None for every street
+    """
+    if changes.is_full:
+        stored.clear()
+        streets = None
+    else:
+        keys = changes.keys
+        # Streets of the segments before the edit, when they overlapped another segment
+        streets = {street for street, overlaps in stored.items()
+                   if any((overlap[5], overlap[4]) in keys or (overlap[10], overlap[9]) in keys for overlap in overlaps)}
+        sql, _ = roads.select(STREET_NAME_FIELDS)
+        rows = select_rows(connection, f'{sql} WHERE f.rowid', changes.changed)
+        streets.update(normalize_name(*parts) for _, _, *parts in rows)
+        streets.discard('')
+        if not streets:
+            return 0
+        for street in streets:
+            stored.pop(street, None)
+    for overlap in check_ranges(gpkg_path, schema, streets):
+        stored.setdefault(overlap.street, []).append(overlap.as_tuple())
+    return None if streets is None else len(streets)
+
+
+def read_boxes(connection, table, keys, every=False):
+    """ Reads the bounding boxes of rows of a layer from its spatial index
+    :param connection sqlite3 connection
+    :param table      SpatialTable object with a spatial index
+    :param keys       Dictionary of {rowid: key} of the rows to read
+    :param every      Scan the whole index instead of selecting the rows
+    :returns:         Dictionary of {key: (min x, min y, max x, max y)}
+    """
+    sql = f'SELECT id, minx, miny, maxx, maxy FROM [{table.rtree}]'
+    rows = connection.execute(sql) if every else select_rows(connection, f'{sql} WHERE id', keys)
+    return {keys[rowid]: tuple(bbox) for rowid, *bbox in rows if rowid in keys}
+
+
+def address_tiles(road_boxes, point_boxes, radius):
+    """ Returns the tiles of the address points to recheck
+    :param road_boxes     Bounding boxes of the changed road segments
+    :param point_boxes    Bounding boxes of the changed address points
+    :param radius         Search radius
+    :returns:             List of (min x, min y, max x, max y) tiles: the
+                          segment boxes expanded by the search radius, and a
+                          tile holding only the location of each point
+    """
+    tiles = [(min_x - radius, min_y - radius, max_x + radius, max_y + radius)
+             for min_x, min_y, max_x, max_y in road_boxes]
+    tiles.extend((min_x, min_y, nextafter(min_x, inf), nextafter(min_y, inf)) for min_x, min_y, _, _ in point_boxes)
+    return tiles
+
+
+def update_addresses(gpkg_path, schema, connection, points, roads, point_changes, road_changes, state, radius,
+                     workers=ADDRESS_WORKERS):
+    """ Rechecks the changed address points and the address points around
+        the changed road segments, before and after the edit
+    :param gpkg_path      Path of the GeoPackage
+    :param schema         Schema object
+    :param connection     sqlite3 connection
+    :param points         SpatialTable object of the address points
+    :param roads          SpatialTable object of the road segments
+    :param point_changes  LayerChanges object of the address points
+    :param road_changes   LayerChanges object of the road segments
+    :param state          Stored address state, empty on the first run
+    :param radius         Search radius
+    :param workers        Tiles checked in parallel processes
+    :returns:             Tuple of (address state, number of address points
+                          checked, None for every point)
+    """
+    findings = state.get("findings", {})
+    boxes = state.get("roads")
+    if boxes is None or points.rtree is None or point_changes.is_full or road_changes.is_full:
+        findings = {}
+        for finding in check_addresses(gpkg_path, schema, radius, workers):
+            findings.setdefault((finding.nguid, finding.rowid), []).append(finding.as_tuple())
+        if roads.rtree is not None:
+            boxes = read_boxes(connection, roads, {key[1]: key for key in road_changes.rows}, every=True)
+        return {"findings": findings, "roads": boxes if roads.rtree is not None else None}, None
+
+    # Segments before and after the edit
+    road_boxes = [boxes.pop(key) for key in road_changes.keys if key in boxes]
+    changed_boxes = read_boxes(connection, roads, road_changes.changed)
+    boxes.update(changed_boxes)
+    road_boxes.extend(changed_boxes.values())
+    tiles = address_tiles(road_boxes, read_boxes(connection, points, point_changes.changed).values(), radius)
+    for key in point_changes.keys:
+        findings.pop(key, None)
+    checked = set()
+    for tile in tiles:
+        sql, parameters = points.select(('NGUID',), tile, True)
+        checked.update((nguid, rowid) for rowid, _, nguid in connection.execute(sql, parameters))
+    for key in checked:
+        findings.pop(key, None)
+
+    task = AddressTask(gpkg_path, points, roads, radius)
+    workers = max(1, min(workers, len(tiles)))
+    if workers == 1:
+        results = map(task, tiles)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(task, tiles, chunksize=max(1, len(tiles) // (workers * 4))))
+    for tile_findings in results:
+        # A point of overlapping tiles is checked more than once, with the same finding
+        for finding in tile_findings:
+            findings[finding.nguid, finding.rowid] = [finding.as_tuple()]
+    return {"findings": findings, "roads": boxes}, len(checked)
+
+
+def settings_digest(schema, radius):
+    """ Returns the digest of the schema sections and the search radius the
+        stored findings depend on
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for kind, hashes in sorted(schema.section_hashes.items()):
+        for name, value in sorted(hashes.items()):
+            digest.update(f'{kind}:{name}:{value}\n'.encode('utf-8'))
+    digest.update(repr(radius).encode('utf-8'))
+    return digest.digest()
+
+
+def get_state_folder():
+    """ Returns the state folder based on the default location or the
+        WATERMARK_STATE_FOLDER_PATH constant
+    """
+    return WATERMARK_STATE_FOLDER_PATH or os.path.join(STATE_FOLDER, 'watermark')
+
+
+def update_findings(gpkg_path, schema, use_cache=True, radius=None, workers=ADDRESS_WORKERS):
+    """ Checks the rows of a GeoPackage changed since the previous run and
+        merges their findings into the stored ones
+    :param gpkg_path  Path of the GeoPackage
+    :param schema     Schema object
+    :param use_cache  Reuse the stored state, otherwise every row is checked
+                      and the state is reset
+    :param radius     Search radius of the address check, by default
+                      ADDRESS_SEARCH_RADIUS of the spatial reference of the
+                      address points
+    :param workers    Address tiles checked in parallel processes
+    :returns:         Tuple of (dictionary of {WATERMARK_OUTPUTS file name:
+                      list of finding tuples}, dictionary of statistics)
+    """
+    start = perf_counter()
+    tables = feature_tables(gpkg_path, schema)
+    layers = {feature_class.name: table for table, feature_class in tables}
+    connection = connect(gpkg_path)
+    try:
+        points = spatial_table(connection, layers[ADDRESS_LAYER]) if ADDRESS_LAYER in layers else None
+        roads = spatial_table(connection, layers[RANGE_LAYER]) if RANGE_LAYER in layers else None
+        if radius is None and points is not None:
+            radius = ADDRESS_SEARCH_RADIUS[is_geographic(connection, points.table)]
+        settings = settings_digest(schema, radius)
+        state = read_state(get_state_folder(), gpkg_key(gpkg_path), WATERMARK_STATE_VERSION) if use_cache else {}
+        if state.get("settings") != settings:
+            state = {}
+        stats = {"full": not state, "layers": [], "streets": 0, "points": 0}
+
+        changes = {}
+        layer_states = state.get("layers", {})
+        attributes = {}
+        for table, feature_class in tables:
+            layer = feature_class.name
+            changes[layer] = scan_layer(connection, table, layer_states.get(layer, {}))
+            attributes[layer] = state.get("attributes", {}).get(layer, {})
+            update_attributes(connection, schema, feature_class, changes[layer], attributes[layer])
+            stats["layers"].append((layer, len(changes[layer].rows), len(changes[layer].changed),
+                                    len(changes[layer].removed)))
+
+        ranges = {}
+        if roads is not None:
+            ranges = state.get("ranges", {})
+            stats["streets"] = update_ranges(gpkg_path, schema, connection, roads, changes[RANGE_LAYER], ranges)
+        addresses = {}
+        if points is not None and roads is not None:
+            addresses, stats["points"] = update_addresses(gpkg_path, schema, connection, points, roads,
+                                                         changes[ADDRESS_LAYER], changes[RANGE_LAYER],
+                                                         state.get("addresses", {}), radius, workers)
+    finally:
+        connection.close()
+
+    # The stored state is kept as is when no row changed
+    unchanged = state and set(changes) == set(layer_states) and not any(
+        layer_changes.changed or layer_changes.removed or layer_changes.watermark != layer_states[layer]["watermark"]
+        for layer, layer_changes in changes.items())
+    if not unchanged:
+        write_state(get_state_folder(), gpkg_key(gpkg_path), WATERMARK_STATE_VERSION, {
+            "settings": settings,
+            "layers": {layer: {"rows": layer_changes.rows, "watermark": layer_changes.watermark}
+                       for layer, layer_changes in changes.items()},
+            "attributes": attributes,
+            "ranges": ranges,
+            "addresses": addresses
+        })
+    address_findings = addresses.get("findings", {})
+    findings = {
+        'attributes.csv': [(layer, key[1], field, rule) for layer, layer_findings in attributes.items()
+                           for key in sorted(layer_findings, key=itemgetter(1)) for field, rule in layer_findings[key]],
+        'ranges.csv': [overlap for street in sorted(ranges) for overlap in ranges[street]],
+        'addresses.csv': [finding for key in sorted(address_findings, key=itemgetter(1))
+                          for finding in address_findings[key]]
+    }
+    stats["seconds"] = perf_counter() - start
+    return findings, stats
+
+
+def main(argv=None):
+    """ Validates the rows of a GeoPackage changed since the previous run and
+        writes every finding as CSV
+    :param argv       Command line arguments, sys.argv by default
+    :returns:         Exit code, 1 when a row failed a rule
+    """
+    parser = argparse.ArgumentParser(description='Validates the rows of a GeoPackage changed since the previous run.')
+    parser.add_argument('gpkg', help='GeoPackage to validate')
+    parser.add_argument('--full', action='store_true', help='check every row and reset the stored state')
+    parser.add_argument('--radius', type=float, help='search radius of the address check')
+    parser.add_argument('--workers', type=int, default=ADDRESS_WORKERS, help='address tiles checked in parallel')
+    parser.add_argument('--output', default='.', help='folder to write the CSV files to, the current one by default')
+    args = parser.parse_args(argv)
+
+    findings, stats = update_findings(args.gpkg, LoadSchema(), not args.full, args.radius, args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    for name, columns in WATERMARK_OUTPUTS.items():
+        with open(os.path.join(args.output, name), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(columns)
+            writer.writerows(findings[name])
+        print(f'{len(findings[name]):>10} {name}', file=sys.stderr)
+    for layer, rows, changed, removed in stats["layers"]:
+        if changed or removed:
+            print(f'{layer}: {rows} rows, {changed} changed, {removed} removed', file=sys.stderr)
+    streets = 'every street' if stats["streets"] is None else f'{stats["streets"]} streets'
+    points = 'every address point' if stats["points"] is None else f'{stats["points"]} address points'
+    print(f'{"Full" if stats["full"] else "Incremental"} run, {streets} and {points} checked '
+          f'in {stats["seconds"]:.2f}s.', file=sys.stderr)
+    return 1 if any(findings.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run_main('report.watermark'))
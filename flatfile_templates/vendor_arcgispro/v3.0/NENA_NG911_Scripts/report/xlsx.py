@@ -0,0 +1,158 @@
+"""
+| Name:      xlsx.py
+| Purpose:   Renders the schema and its report findings as the Microsoft
+|            Excel schema report: the Feature Class Report, Domains, Section 4
+|            Layer Overview, Section 5 Fields Overview and GIS Layer Registry
+|            worksheets. Cells with a finding are filled by severity and
+|            commented with the finding message.
+|
+| Notes:     The rows of report.sheets are written either by
+|            write_report_sheets(), which streams them to a write-only
+|            workbook with shared named styles, or by build_report_sheets(),
+|            which styles each cell of an in-memory workbook. Both workbooks
+|            look the same. This module requires openpyxl, the other report
+|            modules do not.
+"""
+
+from copy import copy
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.comments import Comment
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+from .sheets import ReportCell, report_sheets
+
+# ==============================================================================
+# XLSX Constants
+# ==============================================================================
+CELL_FILL_PASS = PatternFill(start_color='C6EFCE', end_color='FF0000', fill_type="solid")
+CELL_FILL_FAIL = PatternFill(start_color='FFC7CE', end_color='FF0000', fill_type="solid")
+CELL_FILL_WARN = PatternFill(start_color='FFEB9C', end_color='FF0000', fill_type="solid")
+CELL_ALIGN_CENTER = Alignment(horizontal='center')
+CELL_ALIGN_TOP = Alignment(vertical='top')
+CELL_ALIGN_TOP_CENTER = Alignment(vertical='top', horizontal='center')
+CELL_ALIGN_TOP_WRAP = Alignment(vertical='top', wrap_text=True)
+CELL_FONT_BOLD = Font(bold=True)
+
+# Named styles of the report: (font, fill, alignment) by name. A finding adds
+# its severity to the name of a cell's style, e.g. 'Report Center' becomes
+# 'Report Center Fail'.
+REPORT_STYLES = {
+    'Report Bold': (CELL_FONT_BOLD, None, None),
+    'Report Bold Center': (CELL_FONT_BOLD, None, CELL_ALIGN_CENTER),
+    'Report Bold Center Fail': (CELL_FONT_BOLD, CELL_FILL_FAIL, CELL_ALIGN_CENTER),
+    'Report Center': (None, None, CELL_ALIGN_CENTER),
+    'Report Center Fail': (None, CELL_FILL_FAIL, CELL_ALIGN_CENTER),
+    'Report Center Warn': (None, CELL_FILL_WARN, CELL_ALIGN_CENTER),
+    'Report Fail': (None, CELL_FILL_FAIL, None),
+    'Report Warn': (None, CELL_FILL_WARN, None),
+    'Report Top': (None, None, CELL_ALIGN_TOP),
+    'Report Top Fail': (None, CELL_FILL_FAIL, CELL_ALIGN_TOP),
+    'Report Top Warn': (None, CELL_FILL_WARN, CELL_ALIGN_TOP),
+    'Report Top Center': (None, None, CELL_ALIGN_TOP_CENTER),
+    'Report Bold Top Center Fail': (CELL_FONT_BOLD, CELL_FILL_FAIL, CELL_ALIGN_TOP_CENTER),
+    'Report Top Wrap': (None, None, CELL_ALIGN_TOP_WRAP),
+    'Report Bold Top Wrap Fail': (CELL_FONT_BOLD, CELL_FILL_FAIL, CELL_ALIGN_TOP_WRAP)
+}
+
+
+def add_report_styles(wb):
+    """ Registers the REPORT_STYLES named styles in a workbook
+    :param wb         Workbook object
+    :returns:         Dictionary of NamedStyle objects by name
+    """
+    named_styles = {}
+    for name, (font, fill, alignment) in REPORT_STYLES.items():
+        style = NamedStyle(name=name)
+        if font is not None:
+            style.font = font
+        if fill is not None:
+            style.fill = fill
+        if alignment is not None:
+            style.alignment = alignment
+        wb.add_named_style(style)
+        named_styles[name] = style
+    return named_styles
+
+
+def write_report_sheets(sheets, wb_file_path):
+    """ Streams the report to disk a row at a time with a write-only
+        workbook and shared named styles
+    :param sheets       (title, column definitions, rows) tuples of
+                        report.sheets
+    :param wb_file_path Path of the .xlsx workbook
+    :returns:           n/a
+    """
+    wb = Workbook(write_only=True)
+    # Resolve the style ids of each named style once, assigning cell.style
+    # looks the name up and rebuilds them for every cell
+    style_ids = {name: style.as_tuple() for name, style in add_report_styles(wb).items()}
+    for title, columns, rows in sheets:
+        ws = wb.create_sheet(title)
+        # Column widths must be set before the first row is appended
+        for column, width, header, style, comment in columns:
+            ws.column_dimensions[column].width = width
+        for row in rows:
+            values = []
+            for cell in row:
+                if isinstance(cell, ReportCell):
+                    write_only_cell = WriteOnlyCell(ws, value=cell.value)
+                    if cell.style is not None:
+                        write_only_cell._style = copy(style_ids[cell.style])
+                    if cell.comment is not None:
+                        write_only_cell.comment = Comment(cell.comment, '')
+                    cell = write_only_cell
+                values.append(cell)
+            ws.append(values)
+    wb.save(wb_file_path)
+    wb.close()
+
+
+def build_report_sheets(sheets, wb_file_path):
+    """ Builds the report in memory, styling each cell in place
+    :param sheets       (title, column definitions, rows) tuples of
+                        report.sheets
+    :param wb_file_path Path of the .xlsx workbook
+    :returns:           n/a
+    """
+    wb = Workbook()
+    wb.remove(wb.active)
+    for title, columns, rows in sheets:
+        ws = wb.create_sheet(title)
+        for column, width, header, style, comment in columns:
+            ws.column_dimensions[column].width = width
+        for row_number, row in enumerate(rows, 1):
+            for column_number, cell in enumerate(row, 1):
+                if cell is None:
+                    continue
+                if not isinstance(cell, ReportCell):
+                    ws.cell(row=row_number, column=column_number, value=cell)
+                    continue
+                ws_cell = ws.cell(row=row_number, column=column_number, value=cell.value)
+                if cell.style is not None:
+                    font, fill, alignment = REPORT_STYLES[cell.style]
+                    if font is not None:
+                        ws_cell.font = font
+                    if fill is not None:
+                        ws_cell.fill = fill
+                    if alignment is not None:
+                        ws_cell.alignment = alignment
+                if cell.comment is not None:
+                    ws_cell.comment = Comment(cell.comment, '')
+    wb.save(wb_file_path)
+    wb.close()
+
+
+def write_schema_report(schema, findings, wb_file_path):
+    """ Streams the report of a schema and its findings with a write-only
+        workbook, see write_report_sheets()
+    """
+    write_report_sheets(report_sheets(schema, findings), wb_file_path)
+
+
+def build_schema_report(schema, findings, wb_file_path):
+    """ Builds the report of a schema and its findings in memory, see
+        build_report_sheets()
+    """
+    build_report_sheets(report_sheets(schema, findings), wb_file_path)
@@ -0,0 +1,22 @@
+from . import domains
+from . import loader
+from . import profiles
+from . import sections
+from .model import Domain, FeatureClass, FieldDefinition, FieldSpec, RegistryEntry, Schema
+from .profiles import LayerPlan, Profile
+
+# domains modules
+CompileDomain = domains.compile_domain
+ValidateColumn = domains.validate_column
+
+# loader modules
+LoadSchema = loader.load_schema
+ClearSchemaCache = loader.clear_cache
+GetLoadStats = loader.get_load_stats
+
+# profiles modules
+ResolveProfile = profiles.resolve_profile
+
+# sections modules
+BuildSectionHashes = sections.build_section_hashes
+ChangedSections = sections.changed_sections
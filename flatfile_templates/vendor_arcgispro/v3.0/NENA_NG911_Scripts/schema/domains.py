@@ -0,0 +1,136 @@
+"""
+| Name:      domains.py
+| Purpose:   Precompiled membership checks of the schema domains. Every
+|            CODED domain with values is compiled into an immutable frozenset
+|            of its codes and every RANGE domain into numeric bounds, once
+|            when the schema is compiled. validate_column() checks a whole
+|            batch of values and returns a violation mask.
+|
+| Notes:     CODED domains match case-insensitively unless their description
+|            states that the codes are case-sensitive or UPPERCASE (e.g.
+|            AdditionalCode, AdministrativeLevels0/1). A batch is checked
+|            once per distinct value, and a batch of in-range numbers with a
+|            single min() and max().
+"""
+
+import re
+
+from .model import Domain
+
+# ==============================================================================
+# DOMAINS Constants
+# ==============================================================================
+# Descriptions of domains whose codes must match case
+CASE_SENSITIVE_PATTERN = re.compile(r'case-sensitive|UPPERCASE')
+
+NUMERIC_TYPES = frozenset([int, float])
+
+
+def is_case_sensitive(domain):
+    """ Returns whether the codes of a domain must match case, as stated by
+        its description
+    """
+    return CASE_SENSITIVE_PATTERN.search(domain.description or '') is not None
+
+
+class CodedDomainCheck(object):
+    """ Membership check of a CODED domain
+    :param name           Domain name
+    :param codes          Codes of the domain
+    :param case_sensitive Codes must match case
+    """
+    __slots__ = ('name', 'codes', 'case_sensitive')
+
+    def __init__(self, name, codes, case_sensitive=True):
+        self.name = name
+        self.case_sensitive = case_sensitive
+        self.codes = frozenset(codes if case_sensitive else (str(code).casefold() for code in codes))
+
+    def __contains__(self, value):
+        if self.case_sensitive:
+            return value in self.codes
+        return isinstance(value, str) and value.casefold() in self.codes
+
+    def validate(self, values):
+        """ Returns the violation mask of a batch of values, null values do
+            not violate the domain
+        """
+        failed = {value for value in set(values) if value is not None and value not in self}
+        if not failed:
+            return [False] * len(values)
+        return [value in failed for value in values]
+
+    def __repr__(self):
+        return f'CodedDomainCheck({self.name!r}, {len(self.codes)} codes, case_sensitive={self.case_sensitive})'
+
+
+class RangeDomainCheck(object):
+    """ Bounds check of a RANGE domain
+    :param name       Domain name
+    :param low        Minimum value, inclusive
+    :param high       Maximum value, inclusive
+    """
+    __slots__ = ('name', 'low', 'high')
+
+    def __init__(self, name, low, high):
+        self.name = name
+        self.low = low
+        self.high = high
+
+    def __contains__(self, value):
+        return type(value) in NUMERIC_TYPES and self.low <= value <= self.high
+
+    def validate(self, values):
+        """ Returns the violation mask of a batch of values, null values do
+            not violate the domain
+        """
+        numbers = [value for value in values if value is not None]
+        if not numbers or (set(map(type, numbers)) <= NUMERIC_TYPES
+                           and self.low <= min(numbers) and max(numbers) <= self.high):
+            return [False] * len(values)
+        return [value is not None and value not in self for value in values]
+
+    def __repr__(self):
+        return f'RangeDomainCheck({self.name!r}, {self.low!r}, {self.high!r})'
+
+
+def compile_domain(domain):
+    """ Compiles the membership check of a domain
+    :param domain     Domain object
+    :returns:         CodedDomainCheck or RangeDomainCheck object, or None if
+                      the domain has no values to check
+    """
+    if not domain.values:
+        return None
+    if domain.is_coded:
+        return CodedDomainCheck(domain.name, domain.values, is_case_sensitive(domain))
+    if domain.is_range:
+        return RangeDomainCheck(domain.name, domain.min_value, domain.max_value)
+    return None
+
+
+def compile_domains(schema):
+    """ Compiles the checks of every domain with values
+    :param schema     Schema object
+    :returns:         Dictionary of {domain name: domain check}
+    """
+    checks = {}
+    for domain in schema.domains:
+        check = compile_domain(domain)
+        if check is not None:
+            checks[domain.name] = check
+    return checks
+
+
+def validate_column(domain, values):
+    """ Checks a batch of values against a domain
+    :param domain     Compiled domain check, e.g. schema.domain_checks[name],
+                      or a Domain object, which is compiled for the call
+    :param values     Sequence of values, None for null
+    :returns:         List of booleans, True where a value violates the domain
+    """
+    if isinstance(domain, Domain):
+        domain = compile_domain(domain)
+    if domain is None:
+        return [False] * len(values)
+    return domain.validate(values)
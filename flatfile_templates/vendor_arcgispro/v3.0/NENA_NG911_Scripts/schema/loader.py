@@ -0,0 +1,238 @@
+"""
+| Name:      loader.py
+| Purpose:   Loads the flatfile_schema_v3.yaml file through a compiled,
+|            content-hashed cache. The YAML definition is only re-parsed when
+|            the SHA-256 of the YAML bytes changes; otherwise the compiled
+|            form (schema object model, derived indexes, resolved layer
+|            profiles, section hashes and domain checks) is read back from
+|            disk.
+|
+| Notes:     The libyaml based CSafeLoader is used when PyYAML was built with
+|            libyaml support, with a fallback to the pure-Python SafeLoader.
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from glob import glob
+from time import perf_counter
+
+import yaml
+
+from .domains import compile_domains
+from .model import Schema
+from .profiles import build_profiles
+from .sections import build_section_hashes
+
+try:
+    YAML_LOADER = yaml.CSafeLoader
+except AttributeError:
+    YAML_LOADER = yaml.SafeLoader
+
+# ==============================================================================
+# SCHEMA Constants
+# ==============================================================================
+SCHEMA_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '..', '..', '..', '..', 'schema', 'v3.0', 'flatfile_schema_v3.yaml'))
+CACHE_FOLDER_PATH = None               # Overrides the default cache folder location (NENA_NG911_Scripts/cache)
+CACHE_FORMAT_VERSION = 5               # Increment when the layout of the compiled schema changes
+
+# Compiled schemas already loaded by this process, keyed by SHA-256
+_MEMORY_CACHE = {}
+
+# Load-time instrumentation, one entry per load_schema() call
+LOAD_HISTORY = []
+
+
+def get_cache_folder():
+    """ Returns the compiled schema cache folder path based on the default
+        location or the CACHE_FOLDER_PATH constant
+    :returns:         Cache folder path
+    """
+    if CACHE_FOLDER_PATH is None:
+        return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache'))
+    else:
+        return CACHE_FOLDER_PATH
+
+
+def get_cache_path(yaml_path, sha256):
+    """ Returns the path of the compiled schema for a YAML file and hash
+    :param yaml_path  Path to the YAML schema file
+    :param sha256     SHA-256 hex digest of the YAML bytes
+    :returns:         Compiled schema file path
+    """
+    stem = os.path.splitext(os.path.basename(yaml_path))[0]
+    return os.path.join(
+        get_cache_folder(),
+        f'{stem}-v{CACHE_FORMAT_VERSION}-{sha256}.pickle'
+    )
+
+
+def compile_schema(yaml_bytes, sha256):
+    """ Parses the YAML bytes and builds the compiled schema
+    :param yaml_bytes Raw bytes of the YAML schema file
+    :param sha256     SHA-256 hex digest of yaml_bytes
+    :returns:         Tuple of the compiled schema and parse seconds
+    """
+    start = perf_counter()
+    data = yaml.load(yaml_bytes.decode('utf-8'), Loader=YAML_LOADER)
+    parse_seconds = perf_counter() - start
+    compiled = Schema.from_dict(data, sha256=sha256, format=CACHE_FORMAT_VERSION)
+    compiled.profiles = build_profiles(compiled)
+    compiled.section_hashes = build_section_hashes(compiled)
+    compiled.domain_checks = compile_domains(compiled)
+    return compiled, parse_seconds
+
+
+def read_cache(cache_path, sha256):
+    """ Reads a compiled schema from disk
+    :param cache_path Path to the compiled schema file
+    :param sha256     Expected SHA-256 hex digest
+    :returns:         Compiled schema or None if missing, stale or unreadable
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            compiled = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(compiled, Schema) or compiled.sha256 != sha256 \
+            or compiled.format != CACHE_FORMAT_VERSION:
+        return None
+    return compiled
+
+
+def write_cache(cache_path, compiled):
+    """ Atomically writes a compiled schema to disk and removes stale
+        compiled versions of the same YAML file
+    :param cache_path Path to the compiled schema file
+    :param compiled   Compiled schema
+    :returns:         n/a
+    """
+    cache_folder = os.path.dirname(cache_path)
+    if not os.path.exists(cache_folder):
+        os.makedirs(cache_folder, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_folder, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(compiled, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    stem = os.path.basename(cache_path).rsplit('-v', 1)[0]
+    for stale in glob(os.path.join(cache_folder, f'{stem}-v*.pickle')):
+        if os.path.abspath(stale) != os.path.abspath(cache_path):
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def load_schema(yaml_path=None, use_cache=True, log=None):
+    """ Loads the compiled schema, parsing the YAML only when its content
+        hash is not found in the memory or disk cache
+    :param yaml_path  Path to the YAML schema file (defaults to SCHEMA_PATH)
+    :param use_cache  Read and write the compiled schema cache
+    :param log        Optional logger object
+    :returns:         Compiled Schema object
+    """
+    log = log or logging.getLogger(__name__)
+    yaml_path = os.path.abspath(yaml_path or SCHEMA_PATH)
+    stats = {
+        "path": yaml_path,
+        "loader": YAML_LOADER.__name__,
+        "source": None,
+        "hash_seconds": 0.0,
+        "cache_read_seconds": 0.0,
+        "parse_seconds": 0.0,
+        "compile_seconds": 0.0,
+        "cache_write_seconds": 0.0,
+        "total_seconds": 0.0
+    }
+    start = perf_counter()
+
+    # Hash the YAML bytes
+    with open(yaml_path, 'rb') as f:
+        yaml_bytes = f.read()
+    sha256 = hashlib.sha256(yaml_bytes).hexdigest()
+    stats["sha256"] = sha256
+    stats["hash_seconds"] = perf_counter() - start
+
+    compiled = _MEMORY_CACHE.get(sha256) if use_cache else None
+    if compiled is not None:
+        stats["source"] = 'memory'
+    elif use_cache:
+        cache_path = get_cache_path(yaml_path, sha256)
+        step = perf_counter()
+        compiled = read_cache(cache_path, sha256)
+        stats["cache_read_seconds"] = perf_counter() - step
+        if compiled is not None:
+            stats["source"] = 'warm'
+
+    if compiled is None:
+        # Cold load: full YAML parse and compile
+        step = perf_counter()
+        compiled, stats["parse_seconds"] = compile_schema(yaml_bytes, sha256)
+        stats["compile_seconds"] = perf_counter() - step - stats["parse_seconds"]
+        stats["source"] = 'cold'
+        if use_cache:
+            step = perf_counter()
+            try:
+                write_cache(get_cache_path(yaml_path, sha256), compiled)
+            except OSError as e:
+                log.warning(f'Unable to write compiled schema cache: {e}')
+            stats["cache_write_seconds"] = perf_counter() - step
+
+    if use_cache:
+        _MEMORY_CACHE[sha256] = compiled
+
+    stats["total_seconds"] = perf_counter() - start
+    LOAD_HISTORY.append(stats)
+    log.info(f'Loaded schema {os.path.basename(yaml_path)} ({stats["source"]}, '
+             f'{stats["loader"]}) in {stats["total_seconds"]:.4f}s')
+    return compiled
+
+
+def get_load_stats(last=True):
+    """ Returns the load-time instrumentation
+    :param last       Return only the most recent load
+    :returns:         Stats dictionary, or list of all stats dictionaries
+    """
+    if last:
+        return LOAD_HISTORY[-1] if LOAD_HISTORY else None
+    return list(LOAD_HISTORY)
+
+
+def clear_cache(memory=True, disk=True):
+    """ Removes compiled schemas from the memory and/or disk cache
+    :param memory     Clear the in-process cache
+    :param disk       Delete compiled schema files from the cache folder
+    :returns:         n/a
+    """
+    if memory:
+        _MEMORY_CACHE.clear()
+    if disk:
+        for cache_file in glob(os.path.join(get_cache_folder(), '*.pickle')):
+            os.remove(cache_file)
+
+
+if __name__ == '__main__':
+    # Reports cold vs warm load timings for the schema
+    clear_cache()
+    load_schema()
+    clear_cache(disk=False)
+    load_schema()
+    load_schema()
+    for load in get_load_stats(last=False):
+        print(f'{load["source"]:>6}: total {load["total_seconds"]:.4f}s | '
+              f'hash {load["hash_seconds"]:.4f}s | '
+              f'cache read {load["cache_read_seconds"]:.4f}s | '
+              f'parse {load["parse_seconds"]:.4f}s ({load["loader"]}) | '
+              f'compile {load["compile_seconds"]:.4f}s | '
+              f'cache write {load["cache_write_seconds"]:.4f}s')
@@ -0,0 +1,246 @@
+"""
+| Name:      model.py
+| Purpose:   Typed object model of the flatfile_schema_v3.yaml definition.
+|            The classes use __slots__ to keep the compiled schema compact
+|            and the Schema container builds its name-based indexes once at
+|            load time so consumers never scan the domain, field or registry
+|            lists.
+"""
+
+
+class Domain(object):
+    """ A CODED or RANGE domain from the schema's domains section """
+    __slots__ = ('name', 'description', 'field_type', 'domain_type', 'values')
+
+    def __init__(self, name, description, field_type, domain_type, values):
+        self.name = name
+        self.description = description
+        self.field_type = field_type
+        self.domain_type = domain_type
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, domain):
+        return cls(
+            name=domain["domain_name"],
+            description=domain["domain_description"],
+            field_type=domain["field_type"],
+            domain_type=domain["domain_type"],
+            values=domain["values"]
+        )
+
+    @property
+    def is_coded(self):
+        return self.domain_type == 'CODED'
+
+    @property
+    def is_range(self):
+        return self.domain_type == 'RANGE'
+
+    @property
+    def min_value(self):
+        return self.values["min"] if self.is_range and self.values else None
+
+    @property
+    def max_value(self):
+        return self.values["max"] if self.is_range and self.values else None
+
+    def __repr__(self):
+        return f'Domain({self.name!r}, {self.domain_type!r})'
+
+
+class FieldSpec(object):
+    """ A field as it is materialized in a feature class """
+    __slots__ = ('name', 'alias', 'field_type', 'precision', 'scale', 'length',
+                 'is_nullable', 'is_required', 'domain', 'default')
+
+    def __init__(self, name, alias, field_type, precision, scale, length,
+                 is_nullable, is_required, domain, default):
+        self.name = name
+        self.alias = alias
+        self.field_type = field_type
+        self.precision = precision
+        self.scale = scale
+        self.length = length
+        self.is_nullable = is_nullable
+        self.is_required = is_required
+        self.domain = domain
+        self.default = default
+
+    @classmethod
+    def from_dict(cls, field):
+        return cls(
+            name=field["field_name"],
+            alias=field["field_alias"],
+            field_type=field["field_type"],
+            precision=field["field_precision"],
+            scale=field["field_scale"],
+            length=field["field_length"],
+            is_nullable=field["field_is_nullable"],
+            is_required=field["field_is_required"],
+            domain=field["field_domain"] or '',
+            default=field["field_default"] or ''
+        )
+
+    def __repr__(self):
+        return f'FieldSpec({self.name!r}, {self.field_type!r})'
+
+
+class FieldDefinition(object):
+    """ A Section 5 attribute definition from the schema's fields section """
+    __slots__ = ('name', 'section', 'title', 'description', 'field_type',
+                 'width', 'precision', 'scale', 'required', 'has_domain')
+
+    def __init__(self, name, section, title, description, field_type, width,
+                 precision, scale, required, has_domain):
+        self.name = name
+        self.section = section
+        self.title = title
+        self.description = description
+        self.field_type = field_type
+        self.width = width
+        self.precision = precision
+        self.scale = scale
+        self.required = required
+        self.has_domain = has_domain
+
+    @classmethod
+    def from_dict(cls, name, field):
+        definition = field.get("definition") or {}
+        return cls(
+            name=name,
+            section=field.get("section"),
+            title=field.get("title"),
+            description=field.get("description"),
+            field_type=definition.get("type"),
+            width=definition.get("width"),
+            precision=definition.get("precision"),
+            scale=definition.get("scale"),
+            required=definition.get("required"),
+            has_domain=field.get("domain")
+        )
+
+    def __repr__(self):
+        return f'FieldDefinition({self.name!r}, {self.field_type!r})'
+
+
+class FeatureClass(object):
+    """ A Section 4 layer from the schema's feature_classes section """
+    __slots__ = ('name', 'alias', 'section', 'geometry_type', 'has_m', 'has_z',
+                 'primary', 'country_specific_field_removals', 'fields',
+                 'fields_by_name', 'description', 'keywords')
+
+    def __init__(self, name, alias, section, geometry_type, has_m, has_z,
+                 primary, country_specific_field_removals, fields, description,
+                 keywords):
+        self.name = name
+        self.alias = alias
+        self.section = section
+        self.geometry_type = geometry_type
+        self.has_m = has_m
+        self.has_z = has_z
+        self.primary = primary
+        self.country_specific_field_removals = country_specific_field_removals
+        self.fields = fields
+        self.fields_by_name = {field.name: field for field in fields}
+        self.description = description
+        self.keywords = keywords
+
+    @classmethod
+    def from_dict(cls, fc):
+        removals = fc.get("country_specific_field_removals") or {}
+        metadata = fc.get("metadata") or {}
+        return cls(
+            name=fc["name"],
+            alias=fc["alias"],
+            section=fc["section"],
+            geometry_type=fc["geometry_type"],
+            has_m=fc["has_m"],
+            has_z=fc["has_z"],
+            primary=fc["primary"],
+            country_specific_field_removals={
+                country: frozenset(fields or []) for country, fields in removals.items()
+            },
+            fields=tuple(FieldSpec.from_dict(field) for field in fc["fields"]),
+            description=metadata.get("description") or '',
+            keywords=tuple(metadata.get("keywords") or [])
+        )
+
+    def __repr__(self):
+        return f'FeatureClass({self.name!r}, {self.geometry_type!r})'
+
+
+class RegistryEntry(object):
+    """ A layer from the schema's gis_data_layers_registry section """
+    __slots__ = ('layer_name', 'layer_indicator')
+
+    def __init__(self, layer_name, layer_indicator):
+        self.layer_name = layer_name
+        self.layer_indicator = layer_indicator
+
+    @classmethod
+    def from_dict(cls, reg):
+        return cls(layer_name=reg["layer_name"], layer_indicator=reg["layer_indicator"])
+
+    def __repr__(self):
+        return f'RegistryEntry({self.layer_name!r}, {self.layer_indicator!r})'
+
+
+class Schema(object):
+    """ The compiled schema and its precomputed indexes """
+    __slots__ = ('sha256', 'format', 'domains', 'feature_classes', 'fields',
+                 'registry', 'domains_by_name', 'feature_classes_by_name',
+                 'fields_by_name', 'registry_by_layer_name',
+                 'layer_indicator_by_layer', 'fields_using_domain',
+                 'field_names_in_use', 'profiles', 'section_hashes', 'domain_checks')
+
+    def __init__(self, domains, feature_classes, fields, registry, sha256=None, format=None):
+        self.sha256 = sha256
+        self.format = format
+        self.domains = domains
+        self.feature_classes = feature_classes
+        self.fields = fields
+        self.registry = registry
+
+        # Indexes
+        self.domains_by_name = {domain.name: domain for domain in domains}
+        self.feature_classes_by_name = {fc.name: fc for fc in feature_classes}
+        self.fields_by_name = {field.name: field for field in fields}
+        self.registry_by_layer_name = {reg.layer_name: reg for reg in registry}
+        self.layer_indicator_by_layer = {reg.layer_name: reg.layer_indicator for reg in registry}
+        fields_using_domain = {}
+        for fc in feature_classes:
+            for field in fc.fields:
+                if field.domain:
+                    fields_using_domain.setdefault(field.domain, []).append((fc.name, field.name))
+        self.fields_using_domain = {name: tuple(usage) for name, usage in fields_using_domain.items()}
+        self.field_names_in_use = frozenset(field.name for fc in feature_classes for field in fc.fields)
+
+        # Resolved (cldxf_support, primary) profiles, see schema.profiles
+        self.profiles = {}
+        # Content hashes of each domain, feature class, field definition and
+        # registry entry, see schema.sections
+        self.section_hashes = {}
+        # Compiled CODED and RANGE domain checks by domain name, see schema.domains
+        self.domain_checks = {}
+
+    @classmethod
+    def from_dict(cls, data, sha256=None, format=None):
+        """ Builds the object model from the parsed YAML schema
+        :param data       Parsed YAML schema
+        :param sha256     SHA-256 hex digest of the YAML bytes
+        :param format     Compiled schema format version
+        :returns:         Schema object
+        """
+        return cls(
+            domains=tuple(Domain.from_dict(domain) for domain in data["domains"]),
+            feature_classes=tuple(FeatureClass.from_dict(fc) for fc in data["feature_classes"]),
+            fields=tuple(FieldDefinition.from_dict(name, field) for name, field in data["fields"].items()),
+            registry=tuple(RegistryEntry.from_dict(reg) for reg in data["gis_data_layers_registry"]),
+            sha256=sha256,
+            format=format
+        )
+
+    def __repr__(self):
+        return (f'Schema({len(self.domains)} domains, {len(self.feature_classes)} feature classes, '
+                f'{len(self.fields)} fields, {len(self.registry)} registry entries)')
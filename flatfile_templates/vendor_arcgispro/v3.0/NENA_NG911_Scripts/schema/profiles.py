@@ -0,0 +1,148 @@
+"""
+| Name:      profiles.py
+| Purpose:   Resolves the layers, fields, domains and default values to
+|            materialize for each CLDXF support option and primary Service
+|            Boundary setting. Every (cldxf_support, primary) combination is
+|            resolved once when the schema is compiled and stored with the
+|            compiled schema, so template backends iterate a precomputed plan
+|            instead of re-evaluating the CLDXF rules per field.
+"""
+
+from .model import FieldSpec
+
+# ==============================================================================
+# PROFILE Constants
+# ==============================================================================
+CLDXF_OPTIONS = ('Combined', 'CLDXF-CA', 'CLDXF-US')
+PRIMARY_OPTIONS = (True, False)
+
+# Fields whose domain is not applied for a CLDXF variant
+CLDXF_DOMAIN_REMOVALS = {
+    'CLDXF-CA': frozenset(['Place_Type'])
+}
+
+
+class LayerPlan(object):
+    """ The resolved fields and default values of a single feature class """
+    __slots__ = ('feature_class', 'fields', 'skipped_fields', 'defaults')
+
+    def __init__(self, feature_class, fields, skipped_fields, defaults):
+        self.feature_class = feature_class
+        self.fields = fields
+        self.skipped_fields = skipped_fields
+        self.defaults = defaults
+
+    @property
+    def name(self):
+        return self.feature_class.name
+
+    def __repr__(self):
+        return f'LayerPlan({self.name!r}, {len(self.fields)} fields)'
+
+
+class Profile(object):
+    """ The resolved template contents for a (cldxf_support, primary) combination """
+    __slots__ = ('cldxf_support', 'primary', 'domains', 'layers', 'layers_by_name')
+
+    def __init__(self, cldxf_support, primary, domains, layers):
+        self.cldxf_support = cldxf_support
+        self.primary = primary
+        self.domains = domains
+        self.layers = layers
+        self.layers_by_name = {layer.name: layer for layer in layers}
+
+    @property
+    def key(self):
+        return self.cldxf_support, self.primary
+
+    def __repr__(self):
+        return f'Profile({self.cldxf_support!r}, primary={self.primary}, {len(self.layers)} layers)'
+
+
+def build_profile(schema, cldxf_support, primary):
+    """ Resolves the template contents for a CLDXF option and primary setting
+    :param schema         Schema object
+    :param cldxf_support  CLDXF support option [Combined | CLDXF-CA | CLDXF-US]
+    :param primary        Only include primary Service Boundary layers
+    :returns:             Profile object
+    """
+    if cldxf_support not in CLDXF_OPTIONS:
+        raise ValueError(f'{cldxf_support} is not a recognized CLDXF support option.')
+
+    domain_removals = CLDXF_DOMAIN_REMOVALS.get(cldxf_support, frozenset())
+    layers = []
+    for fc in schema.feature_classes:
+        if primary and not fc.primary:
+            continue
+
+        # Determine what CLDXF version to support
+        cldxf_field_removals = frozenset()
+        for cldxf_country, removals in fc.country_specific_field_removals.items():
+            if cldxf_support == f'CLDXF-{cldxf_country}':
+                cldxf_field_removals = removals
+
+        fields = []
+        skipped_fields = []
+        for field in fc.fields:
+            if field.name in cldxf_field_removals:
+                skipped_fields.append(field.name)
+                continue
+            # Domain handling due to differences in CLDXF versions
+            if field.domain and field.name in domain_removals:
+                field = FieldSpec(
+                    name=field.name,
+                    alias=field.alias,
+                    field_type=field.field_type,
+                    precision=field.precision,
+                    scale=field.scale,
+                    length=field.length,
+                    is_nullable=field.is_nullable,
+                    is_required=field.is_required,
+                    domain='',
+                    default=field.default
+                )
+            fields.append(field)
+
+        layers.append(LayerPlan(
+            feature_class=fc,
+            fields=tuple(fields),
+            skipped_fields=tuple(skipped_fields),
+            defaults=tuple((field.name, field.default) for field in fields if len(field.default) > 0)
+        ))
+
+    return Profile(
+        cldxf_support=cldxf_support,
+        primary=primary,
+        domains=schema.domains,
+        layers=tuple(layers)
+    )
+
+
+def build_profiles(schema):
+    """ Resolves every (cldxf_support, primary) combination
+    :param schema         Schema object
+    :returns:             Dictionary of Profile objects keyed by (cldxf_support, primary)
+    """
+    return {
+        (cldxf_support, primary): build_profile(schema, cldxf_support, primary)
+        for cldxf_support in CLDXF_OPTIONS
+        for primary in PRIMARY_OPTIONS
+    }
+
+
+def resolve_profile(schema, cldxf_support, primary):
+    """ Returns the memoized profile for a CLDXF option and primary setting
+    :param schema         Schema object
+    :param cldxf_support  CLDXF support option [Combined | CLDXF-CA | CLDXF-US]
+    :param primary        Only include primary Service Boundary layers, either
+                          a bool or the 'true' | 'false' toolbox parameter
+    :returns:             Profile object
+    """
+    if isinstance(primary, str):
+        primary = primary == 'true'
+    key = (cldxf_support, bool(primary))
+    profile = schema.profiles.get(key)
+    if profile is None:
+        profile = build_profile(schema, cldxf_support, key[1])
+        schema.profiles[key] = profile
+    return profile
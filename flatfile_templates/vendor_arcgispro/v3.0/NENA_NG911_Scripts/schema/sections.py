@@ -0,0 +1,77 @@
+"""
+| Name:      sections.py
+| Purpose:   Section-level content hashes of the compiled schema: one
+|            SHA-256 per domain, feature class, field definition and GIS
+|            Layer Registry entry. Consumers compare the hashes of two
+|            schema revisions to find the sections that changed, e.g. the
+|            incremental schema report of report.incremental.
+|
+| Notes:     The hashes are built when the schema is compiled and stored with
+|            it, so a warm load does not rehash the schema. Hashes depend on
+|            the order of lists and coded values, which are rendered in
+|            order.
+"""
+
+import hashlib
+
+# ==============================================================================
+# SECTIONS Constants
+# ==============================================================================
+# Schema sections by kind: (Schema attribute, name attribute of the items)
+SECTION_KINDS = {
+    'domain': ('domains', 'name'),
+    'feature_class': ('feature_classes', 'name'),
+    'field': ('fields', 'name'),
+    'registry': ('registry', 'layer_name')
+}
+
+# Slots derived from other slots, left out of the hashes
+DERIVED_SLOTS = frozenset(['fields_by_name'])
+
+
+def section_state(value):
+    """ Returns a hashable, ordered representation of a schema object """
+    slots = getattr(type(value), '__slots__', None)
+    if slots is not None:
+        return (type(value).__name__,) + tuple(
+            (slot, section_state(getattr(value, slot))) for slot in slots if slot not in DERIVED_SLOTS)
+    if isinstance(value, dict):
+        return tuple((key, section_state(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(section_state(item) for item in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(repr(item) for item in value))
+    return value
+
+
+def section_hash(value):
+    """ Returns the SHA-256 hex digest of a schema object """
+    return hashlib.sha256(repr(section_state(value)).encode('utf-8')).hexdigest()
+
+
+def build_section_hashes(schema):
+    """ Hashes every domain, feature class, field definition and registry
+        entry of a schema
+    :param schema     Schema object
+    :returns:         Dictionary of {kind: {name: SHA-256 hex digest}}
+    """
+    hashes = {}
+    for kind, (attribute, name_attribute) in SECTION_KINDS.items():
+        hashes[kind] = {getattr(item, name_attribute): section_hash(item) for item in getattr(schema, attribute)}
+    return hashes
+
+
+def changed_sections(previous, current):
+    """ Compares the section hashes of two schema revisions
+    :param previous   Section hashes of the previous revision
+    :param current    Section hashes of the current revision
+    :returns:         Dictionary of {kind: sorted names added, removed or
+                      changed}, kinds without changes are omitted
+    """
+    changes = {}
+    for kind in SECTION_KINDS:
+        before, after = previous.get(kind, {}), current.get(kind, {})
+        names = sorted(name for name in set(before) | set(after) if before.get(name) != after.get(name))
+        if names:
+            changes[kind] = names
+    return changes
@@ -1,5 +1,25 @@
+from . import artifacts
+from . import events
 from . import logger
+from . import metadata
+
+# artifacts modules
+ArtifactKey = artifacts.artifact_key
+FetchArtifacts = artifacts.fetch_artifacts
+StoreArtifacts = artifacts.store_artifacts
+GetArtifactCacheStats = artifacts.get_cache_stats
+
+# events modules
+EventBus = events.EventBus
+TemplateError = events.TemplateError
+LogSink = events.LogSink
+ConsoleSink = events.ConsoleSink
+ArcpyProgressSink = events.ArcpyProgressSink
+JsonLinesSink = events.JsonLinesSink
 
 # logger modules
 CreateLogger = logger.create_logger
 DeleteOldLogs = logger.delete_old_logs
+
+# metadata modules
+WriteMetadata = metadata.write_metadata
@@ -0,0 +1,316 @@
+"""
+| Name:      artifacts.py
+| Purpose:   Content-addressed cache of built template databases. Each built
+|            .gdb / .gpkg / .gpkg.xml is stored under a key derived from the
+|            compiled schema hash and every main(**params) parameter that
+|            affects the output, so a repeat request becomes a file copy
+|            instead of a rebuild. Entries are evicted least recently used
+|            first once the cache exceeds ARTIFACT_CACHE_MAX_BYTES.
+|
+| Notes:     The database name, output folder and overwrite option do not
+|            affect the database contents and are not part of the key; cached
+|            artifacts are renamed when they are copied to the output folder.
+|            Each process counts its hits and misses in its own statistics
+|            file, so concurrent batch workers never overwrite each other's
+|            counts; the files are summed when the statistics are read.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from time import time
+
+try:
+    import fcntl
+    FICLONE = 0x40049409               # Linux copy-on-write clone (reflink)
+except ImportError:
+    fcntl = None
+
+# ==============================================================================
+# ARTIFACT Constants
+# ==============================================================================
+ARTIFACT_CACHE_FOLDER_PATH = None      # Overrides the default cache folder location (NENA_NG911_Scripts/cache/artifacts)
+ARTIFACT_CACHE_MAX_BYTES = 2 * 1024 ** 3  # Total size of the cached artifacts before eviction
+ARTIFACT_CACHE_VERSION = 1             # Increment when the template builders change their output
+
+# Parameters that do not affect the contents of the built databases
+IGNORED_PARAMS = frozenset([
+    'params_type',
+    'output_folder',
+    'output_template_name',
+    'allow_overwrite',
+    'use_cache',
+    'upgrade',
+    'event_log',
+    'plan'
+])
+
+# Artifact suffixes, in the order they are restored
+ARTIFACT_SUFFIXES = ('.gdb', '.gpkg', '.gpkg.xml')
+ENTRY_FILE = 'entry.json'
+STATS_FOLDER = 'stats'                 # One <process id>.json counter file per process
+STATS_NAMES = ('hits', 'misses', 'stores', 'evictions')
+
+
+def get_artifact_folder():
+    """ Returns the artifact cache folder path based on the default location
+        or the ARTIFACT_CACHE_FOLDER_PATH constant
+    :returns:         Artifact cache folder path
+    """
+    if ARTIFACT_CACHE_FOLDER_PATH is None:
+        return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'cache', 'artifacts'))
+    else:
+        return ARTIFACT_CACHE_FOLDER_PATH
+
+
+def artifact_key(schema_sha256, params, builder):
+    """ Returns the cache key of a template build
+    :param schema_sha256  SHA-256 hex digest of the compiled schema
+    :param params         Dictionary of script parameters
+    :param builder        Name of the script building the template
+    :returns:             SHA-256 hex digest
+    """
+    key_params = {name: str(value) for name, value in params.items() if name not in IGNORED_PARAMS}
+    payload = json.dumps({
+        "version": ARTIFACT_CACHE_VERSION,
+        "builder": builder,
+        "schema": schema_sha256,
+        "params": key_params
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def copy_file(src, dst):
+    """ Copies a file, cloning it where the file system supports reflinks
+    :param src        Source file path
+    :param dst        Destination file path
+    :returns:         Destination file path
+    """
+    if fcntl is not None:
+        try:
+            with open(src, 'rb') as src_file, open(dst, 'wb') as dst_file:
+                fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+            shutil.copystat(src, dst)
+            return dst
+        except OSError:
+            pass
+    return shutil.copy2(src, dst)
+
+
+def copy_artifact(src, dst):
+    """ Copies a .gdb folder or a file artifact """
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, copy_function=copy_file)
+    else:
+        copy_file(src, dst)
+
+
+def get_size(path):
+    """ Returns the size in bytes of a file or folder """
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    size = 0
+    for root, _, files in os.walk(path):
+        size += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return size
+
+
+def get_stats_path(pid=None):
+    """ Returns the statistics file path of a process
+    :param pid        Process id, defaults to the current process
+    :returns:         Statistics file path
+    """
+    return os.path.join(get_artifact_folder(), STATS_FOLDER, f'{os.getpid() if pid is None else pid}.json')
+
+
+def read_stats_file(path):
+    """ Returns the counters of a statistics file, or {} if it is unreadable """
+    try:
+        with open(path, 'r') as stats_file:
+            return json.load(stats_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def read_stats():
+    """ Returns the persisted hit/miss statistics, summed over every process """
+    stats = dict.fromkeys(STATS_NAMES, 0)
+    folder = os.path.join(get_artifact_folder(), STATS_FOLDER)
+    if not os.path.isdir(folder):
+        return stats
+    for name in os.listdir(folder):
+        if not name.endswith('.json'):
+            continue
+        for counter, value in read_stats_file(os.path.join(folder, name)).items():
+            stats[counter] = stats.get(counter, 0) + value
+    return stats
+
+
+def update_stats(**increments):
+    """ Adds the increments to the statistics of the current process. Only
+        this process writes its file, so the read-modify-write needs no lock
+    """
+    path = get_stats_path()
+    folder = os.path.dirname(path)
+    os.makedirs(folder, exist_ok=True)
+    stats = read_stats_file(path)
+    for name, increment in increments.items():
+        stats[name] = stats.get(name, 0) + increment
+    fd, tmp_path = tempfile.mkstemp(dir=folder, suffix='.tmp')
+    with os.fdopen(fd, 'w') as stats_file:
+        json.dump(stats, stats_file)
+    os.replace(tmp_path, path)
+
+
+def list_entries():
+    """ Returns the cache entries, least recently used first
+    :returns:         List of (key, entry path, last used, size) tuples
+    """
+    folder = get_artifact_folder()
+    entries = []
+    if not os.path.exists(folder):
+        return entries
+    for key in os.listdir(folder):
+        entry_path = os.path.join(folder, key)
+        entry_file = os.path.join(entry_path, ENTRY_FILE)
+        if not os.path.isfile(entry_file):
+            continue
+        with open(entry_file, 'r') as f:
+            size = json.load(f)["size"]
+        entries.append((key, entry_path, os.path.getmtime(entry_file), size))
+    entries.sort(key=lambda entry: entry[2])
+    return entries
+
+
+def fetch_artifacts(key, output_folder, db_name, log=None):
+    """ Copies the cached artifacts of a key to the output folder
+    :param key            Cache key, see artifact_key()
+    :param output_folder  Path to the output folder
+    :param db_name        Name of the output database, without suffix
+    :param log            Optional logger
+    :returns:             List of restored paths, or None on a cache miss
+    """
+    entry_path = os.path.join(get_artifact_folder(), key)
+    entry_file = os.path.join(entry_path, ENTRY_FILE)
+    if not os.path.isfile(entry_file):
+        update_stats(misses=1)
+        if log:
+            log.info(f'Template cache miss ({key[:12]}).')
+        return None
+
+    restored = []
+    for suffix in ARTIFACT_SUFFIXES:
+        src = os.path.join(entry_path, f'artifact{suffix}')
+        if os.path.exists(src):
+            dst = os.path.join(output_folder, f'{db_name}{suffix}')
+            copy_artifact(src, dst)
+            restored.append(dst)
+
+    # Mark the entry as most recently used
+    os.utime(entry_file)
+    update_stats(hits=1)
+    if log:
+        log.info(f'Template cache hit ({key[:12]}), restored {", ".join(restored)}.')
+    return restored
+
+
+def store_artifacts(key, paths, params=None, log=None):
+    """ Stores built artifacts under a key and evicts old entries
+    :param key        Cache key, see artifact_key()
+    :param paths      Paths of the built .gdb, .gpkg and .gpkg.xml artifacts
+    :param params     Optional dictionary of script parameters, for reference
+    :param log        Optional logger
+    :returns:         Entry path
+    """
+    folder = get_artifact_folder()
+    os.makedirs(folder, exist_ok=True)
+    entry_path = os.path.join(folder, key)
+    if os.path.exists(os.path.join(entry_path, ENTRY_FILE)):
+        return entry_path
+    if os.path.exists(entry_path):
+        # Left behind by an interrupted eviction
+        shutil.rmtree(entry_path, ignore_errors=True)
+
+    # Stage in a temporary folder so readers never see a partial entry
+    tmp_path = tempfile.mkdtemp(dir=folder, prefix=f'{key[:12]}-', suffix='.tmp')
+    try:
+        files = []
+        for path in paths:
+            suffix = next((s for s in sorted(ARTIFACT_SUFFIXES, key=len, reverse=True) if path.endswith(s)), None)
+            if suffix is None or not os.path.exists(path):
+                continue
+            copy_artifact(path, os.path.join(tmp_path, f'artifact{suffix}'))
+            files.append(f'artifact{suffix}')
+        size = get_size(tmp_path)
+        with open(os.path.join(tmp_path, ENTRY_FILE), 'w') as entry_file:
+            json.dump({
+                "key": key,
+                "files": files,
+                "size": size,
+                "created": time(),
+                "params": {name: str(value) for name, value in (params or {}).items() if name not in IGNORED_PARAMS}
+            }, entry_file, indent=2)
+        os.replace(tmp_path, entry_path)
+    except OSError:
+        # Another process stored the same key first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.exists(os.path.join(entry_path, ENTRY_FILE)):
+            raise
+        return entry_path
+
+    update_stats(stores=1)
+    if log:
+        log.info(f'Stored template in cache ({key[:12]}, {size} bytes).')
+    evict(log=log)
+    return entry_path
+
+
+def evict(max_bytes=None, log=None):
+    """ Removes least recently used entries until the cache fits max_bytes
+    :param max_bytes  Maximum total size, defaults to ARTIFACT_CACHE_MAX_BYTES
+    :param log        Optional logger
+    :returns:         Number of evicted entries
+    """
+    max_bytes = ARTIFACT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = list_entries()
+    total = sum(entry[3] for entry in entries)
+    evicted = 0
+    for key, entry_path, _, size in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_path, ignore_errors=True)
+        total -= size
+        evicted += 1
+        if log:
+            log.info(f'Evicted template from cache ({key[:12]}, {size} bytes).')
+    if evicted:
+        update_stats(evictions=evicted)
+    return evicted
+
+
+def get_cache_stats():
+    """ Returns the hit/miss statistics and current size of the cache
+    :returns:         Dictionary of cache statistics
+    """
+    stats = read_stats()
+    entries = list_entries()
+    lookups = stats.get("hits", 0) + stats.get("misses", 0)
+    stats.update({
+        "entries": len(entries),
+        "bytes": sum(entry[3] for entry in entries),
+        "max_bytes": ARTIFACT_CACHE_MAX_BYTES,
+        "hit_rate": stats.get("hits", 0) / lookups if lookups else 0.0
+    })
+    return stats
+
+
+def clear_cache():
+    """ Removes every cached artifact and the statistics """
+    shutil.rmtree(get_artifact_folder(), ignore_errors=True)
+
+
+if __name__ == '__main__':
+    for name, value in get_cache_stats().items():
+        print(f'{name}: {value}')
@@ -0,0 +1,305 @@
+"""
+| Name:      events.py
+| Purpose:   Structured progress events for the NENA scripts. Scripts emit
+|            typed events (phase start/end, object created, detail, warning
+|            and error) to an EventBus which buffers them and hands batches
+|            to pluggable sinks (log file and console, ArcGIS progressor,
+|            JSON lines). Sinks are only called when a phase changes, a
+|            warning or error is raised, or EVENT_FLUSH_SECONDS has passed, so
+|            per-field and per-value messages no longer cost one ArcPy
+|            message and progressor update each.
+|
+| Notes:     EventBus.error() raises TemplateError after the error has been
+|            delivered to the sinks, so callers decide how a run ends instead
+|            of the helper calling sys.exit().
+"""
+
+import json
+import sys
+from time import perf_counter, time
+
+# ==============================================================================
+# EVENT Constants
+# ==============================================================================
+EVENT_FLUSH_SECONDS = 0.25             # Minimum seconds between batched sink updates
+BANNER = '#' * 80
+
+
+class TemplateError(Exception):
+    """ Raised when a script cannot continue """
+
+
+class Event(object):
+    """ Base class of the progress events """
+    __slots__ = ('message', 'timestamp')
+    kind = 'info'
+    level = 'INFO'
+    progress = False
+
+    def __init__(self, message):
+        self.message = message
+        self.timestamp = time()
+
+    def as_dict(self):
+        return {"kind": self.kind, "level": self.level, "message": self.message, "timestamp": self.timestamp}
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.message!r})'
+
+
+class Info(Event):
+    """ A general message """
+    __slots__ = ()
+
+
+class Detail(Event):
+    """ A per-field or per-value message, logged but not sent to ArcGIS """
+    __slots__ = ()
+    kind = 'detail'
+    level = 'DEBUG'
+
+
+class PhaseStarted(Event):
+    """ A build phase, e.g. 'Creating Domains...', has started """
+    __slots__ = ('phase',)
+    kind = 'phase_start'
+
+    def __init__(self, phase):
+        super().__init__(phase)
+        self.phase = phase
+
+
+class PhaseEnded(Event):
+    """ A build phase has ended """
+    __slots__ = ('phase', 'seconds', 'count')
+    kind = 'phase_end'
+
+    def __init__(self, phase, seconds, count):
+        super().__init__(f'{phase} completed {count} steps in {seconds:.3f}s.')
+        self.phase = phase
+        self.seconds = seconds
+        self.count = count
+
+    def as_dict(self):
+        event = super().as_dict()
+        event.update({"phase": self.phase, "seconds": self.seconds, "count": self.count})
+        return event
+
+
+class ObjectCreated(Event):
+    """ A domain, feature class or database has been created, advancing the
+        progressor by one step
+    """
+    __slots__ = ('object_type', 'name')
+    kind = 'created'
+    progress = True
+
+    def __init__(self, object_type, name, message=None):
+        super().__init__(message or f'Created {object_type}: {name}')
+        self.object_type = object_type
+        self.name = name
+
+    def as_dict(self):
+        event = super().as_dict()
+        event.update({"object_type": self.object_type, "name": self.name})
+        return event
+
+
+class WarningEvent(Event):
+    """ A warning """
+    __slots__ = ()
+    kind = 'warning'
+    level = 'WARNING'
+
+
+class ErrorEvent(Event):
+    """ An error that ends the run """
+    __slots__ = ()
+    kind = 'error'
+    level = 'ERROR'
+
+
+# Events delivered to the sinks immediately, together with the buffered events
+IMMEDIATE_EVENTS = (PhaseStarted, PhaseEnded, WarningEvent, ErrorEvent)
+
+
+class LogSink(object):
+    """ Writes every event to a logger (file and console handlers) """
+
+    def __init__(self, log):
+        self.log = log
+
+    def handle(self, events):
+        for event in events:
+            if isinstance(event, PhaseStarted):
+                self.log.info(BANNER)
+                self.log.info(event.message)
+                self.log.info(BANNER)
+            elif event.level == 'ERROR':
+                self.log.error(event.message)
+            elif event.level == 'WARNING':
+                self.log.warning(event.message)
+            elif event.level == 'DEBUG':
+                self.log.debug(event.message)
+            else:
+                self.log.info(event.message)
+
+    def close(self):
+        pass
+
+
+class ConsoleSink(object):
+    """ Prints events to a stream, for callers without a logger """
+
+    def __init__(self, stream=None, details=False):
+        self.stream = stream or sys.stdout
+        self.details = details
+
+    def handle(self, events):
+        lines = [f'{event.level}: {event.message}' for event in events
+                 if self.details or not isinstance(event, Detail)]
+        if lines:
+            self.stream.write('\n'.join(lines) + '\n')
+
+    def close(self):
+        self.stream.flush()
+
+
+class ArcpyProgressSink(object):
+    """ Sends batched messages to the ArcGIS Pro geoprocessing window and
+        moves the step progressor once per batch
+    """
+
+    def __init__(self, arcpy_module, max_steps=None):
+        self.arcpy = arcpy_module
+        self.position = 0
+        if max_steps:
+            # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/setprogressor.htm
+            self.arcpy.SetProgressor(type='step', min_range=0, max_range=max_steps, step_value=1)
+
+    def handle(self, events):
+        messages = []
+        steps = 0
+        label = None
+        for event in events:
+            if isinstance(event, Detail):
+                continue
+            if isinstance(event, ErrorEvent):
+                # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/adderror.htm
+                self.arcpy.AddError(event.message)
+            elif isinstance(event, WarningEvent):
+                # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/addwarning.htm
+                self.arcpy.AddWarning(event.message)
+            else:
+                messages.append(event.message)
+            if event.progress:
+                steps += 1
+                label = event.message
+        if messages:
+            # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/addmessage.htm
+            self.arcpy.AddMessage('\n'.join(messages))
+        if steps:
+            self.position += steps
+            # https://pro.arcgis.com/en/pro-app/latest/arcpy/functions/setprogressorposition.htm
+            self.arcpy.SetProgressorLabel(label)
+            self.arcpy.SetProgressorPosition(self.position)
+
+    def close(self):
+        pass
+
+
+class JsonLinesSink(object):
+    """ Appends one JSON object per event to a file """
+
+    def __init__(self, path, details=True):
+        self.stream = open(path, 'a', encoding='utf-8')
+        self.details = details
+
+    def handle(self, events):
+        self.stream.write(''.join(
+            json.dumps(event.as_dict()) + '\n' for event in events
+            if self.details or not isinstance(event, Detail)
+        ))
+        self.stream.flush()
+
+    def close(self):
+        self.stream.close()
+
+
+class EventBus(object):
+    """ Buffers events and delivers them to the sinks in batches """
+
+    def __init__(self, sinks=None, flush_seconds=EVENT_FLUSH_SECONDS):
+        self.sinks = list(sinks or [])
+        self.flush_seconds = flush_seconds
+        self.buffer = []
+        self.last_flush = perf_counter()
+        self.phase = None
+        self.phase_start = None
+        self.phase_count = 0
+        self.counts = {}
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+
+    def emit(self, event):
+        """ Buffers an event, flushing the buffer when the event must be
+            delivered immediately or the flush interval has passed
+        :param event      Event object
+        :returns:         n/a
+        """
+        self.buffer.append(event)
+        self.counts[event.kind] = self.counts.get(event.kind, 0) + 1
+        if event.progress:
+            self.phase_count += 1
+        if isinstance(event, IMMEDIATE_EVENTS) or perf_counter() - self.last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self):
+        """ Delivers the buffered events to every sink """
+        if self.buffer:
+            events, self.buffer = self.buffer, []
+            for sink in self.sinks:
+                sink.handle(events)
+        self.last_flush = perf_counter()
+
+    def info(self, message):
+        self.emit(Info(message))
+
+    def detail(self, message):
+        self.emit(Detail(message))
+
+    def created(self, object_type, name, message=None):
+        self.emit(ObjectCreated(object_type, name, message))
+
+    def warning(self, message):
+        self.emit(WarningEvent(message))
+
+    def error(self, message):
+        """ Delivers an error to the sinks and raises TemplateError
+        :param message    Error message
+        :raises:          TemplateError
+        """
+        self.emit(ErrorEvent(message))
+        raise TemplateError(message)
+
+    def start_phase(self, phase):
+        """ Ends the current phase, if any, and starts a new one """
+        self.end_phase()
+        self.phase = phase
+        self.phase_start = perf_counter()
+        self.phase_count = 0
+        self.emit(PhaseStarted(phase))
+
+    def end_phase(self):
+        """ Ends the current phase, reporting its duration """
+        if self.phase is not None:
+            phase, self.phase = self.phase, None
+            self.emit(PhaseEnded(phase, perf_counter() - self.phase_start, self.phase_count))
+
+    def close(self):
+        """ Ends the current phase, flushes and closes the sinks """
+        self.end_phase()
+        self.flush()
+        for sink in self.sinks:
+            sink.close()
@@ -26,7 +26,7 @@ def get_log_folder():
     :returns:         Log folder path
     """
     if LOG_FOLDER_PATH is None:
-        return os.path.join(os.path.dirname(__file__), '..\\', 'logs')
+        return os.path.join(os.path.dirname(__file__), '..', 'logs')
     else:
         return LOG_FOLDER_PATH
 
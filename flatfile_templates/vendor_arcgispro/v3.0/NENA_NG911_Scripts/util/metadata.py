@@ -0,0 +1,188 @@
+"""
+| Name:      metadata.py
+| Purpose:   Builds the ISO 19115-3 metadata of a template database and its
+|            layers directly from the schema and the METADATA constants, and
+|            streams the combined .gpkg.xml document with an incremental XML
+|            writer. The document has the same layout as the ISO19115_3
+|            export of ArcGIS Pro: a GISDataModel element with the database
+|            metadata followed by one LayerMetadata element per layer.
+|
+| Notes:     This code is not dependent on ArcGIS Pro. Nothing is exported
+|            or re-parsed per layer; the document is written once.
+"""
+
+import os
+from xml.sax.saxutils import XMLGenerator
+
+from . import constants as CONSTANTS
+
+# ==============================================================================
+# METADATA Constants
+# ==============================================================================
+NAMESPACES = (
+    ('mdb', 'http://standards.iso.org/iso/19115/-3/mdb/1.0'),
+    ('gco', 'http://standards.iso.org/iso/19115/-3/gco/1.0'),
+    ('cit', 'http://standards.iso.org/iso/19115/-3/cit/1.0'),
+    ('mri', 'http://standards.iso.org/iso/19115/-3/mri/1.0'),
+    ('mcc', 'http://standards.iso.org/iso/19115/-3/mcc/1.0')
+)
+ROOT_ELEMENT = 'NENAStandardforNG9-1-1GISDataModel'
+METADATA_STANDARD_TITLE = 'ISO 19115-3 Geographic Information - Metadata - Part 1: Fundamentals'
+METADATA_STANDARD_EDITION = '2014'
+SCOPE_CODE_LIST = 'standards.iso.org/19115/-3/lan/1.0/codelists.xml#MD_ScopeCode'
+MISSING = {'gco:nilReason': 'missing'}
+
+
+class ItemMetadata(object):
+    """ The identification metadata of the database or a layer """
+    __slots__ = ('title', 'abstract', 'purpose', 'credit', 'keywords')
+
+    def __init__(self, title, abstract, purpose, credit=None, keywords=()):
+        self.title = title
+        self.abstract = abstract
+        self.purpose = purpose
+        self.credit = credit
+        self.keywords = keywords
+
+    def __repr__(self):
+        return f'ItemMetadata({self.title!r})'
+
+
+def database_metadata():
+    """ Returns the database metadata from the METADATA constants
+    :returns:         ItemMetadata object
+    """
+    return ItemMetadata(
+        title=CONSTANTS.MD_TITLE,
+        abstract=CONSTANTS.MD_DESCRIPTION,
+        purpose=CONSTANTS.MD_SUMMARY,
+        credit=CONSTANTS.MD_CREDIT,
+        keywords=tuple(keyword.strip() for keyword in CONSTANTS.MD_KEYWORDS.split(','))
+    )
+
+
+def layer_metadata(fc):
+    """ Returns the metadata of a feature class from its schema metadata
+    :param fc         FeatureClass object
+    :returns:         ItemMetadata object
+    """
+    return ItemMetadata(
+        title=fc.alias,
+        abstract=fc.description,
+        purpose=fc.description,
+        keywords=fc.keywords
+    )
+
+
+class MetadataWriter(object):
+    """ Streams ISO 19115-3 metadata documents to a binary file object """
+
+    def __init__(self, stream, encoding='utf-8'):
+        self.xml = XMLGenerator(stream, encoding, short_empty_elements=False)
+
+    def start(self, name, attrs=None):
+        self.xml.startElement(name, attrs or {})
+        self.xml.ignorableWhitespace('\n')
+
+    def end(self, name):
+        self.xml.endElement(name)
+        self.xml.ignorableWhitespace('\n')
+
+    def empty(self, name, attrs=None):
+        self.start(name, attrs)
+        self.end(name)
+
+    def character_string(self, name, text):
+        """ Writes <name><gco:CharacterString>text</gco:CharacterString></name> """
+        self.start(name)
+        self.xml.startElement('gco:CharacterString', {})
+        self.xml.characters(text)
+        self.xml.endElement('gco:CharacterString')
+        self.xml.ignorableWhitespace('\n')
+        self.end(name)
+
+    def start_document(self):
+        self.xml.startDocument()
+        self.xml.startElement(ROOT_ELEMENT, {f'xmlns:{prefix}': uri for prefix, uri in NAMESPACES})
+
+    def end_document(self):
+        self.xml.endElement(ROOT_ELEMENT)
+        self.xml.endDocument()
+
+    def write_database(self, item):
+        """ Writes the GISDataModel element of the database metadata """
+        self.xml.startElement('GISDataModel', {})
+        self.write_md_metadata(item)
+        self.xml.endElement('GISDataModel')
+
+    def write_layer(self, name, item):
+        """ Writes the LayerMetadata element of a layer """
+        self.xml.startElement('LayerMetadata', {'name': name})
+        self.write_md_metadata(item)
+        self.xml.endElement('LayerMetadata')
+
+    def write_md_metadata(self, item):
+        """ Writes an mdb:MD_Metadata document """
+        self.start('mdb:MD_Metadata')
+        self.start('mdb:metadataScope')
+        self.start('mdb:MD_MetadataScope')
+        self.start('mdb:resourceScope')
+        self.xml.startElement('mcc:MD_ScopeCode', {'codeList': SCOPE_CODE_LIST, 'codeListValue': 'dataset'})
+        self.xml.characters('dataset')
+        self.end('mcc:MD_ScopeCode')
+        self.end('mdb:resourceScope')
+        self.end('mdb:MD_MetadataScope')
+        self.end('mdb:metadataScope')
+        self.empty('mdb:contact', MISSING)
+        self.empty('mdb:dateInfo', MISSING)
+        self.start('mdb:metadataStandard')
+        self.start('cit:CI_Citation')
+        self.character_string('cit:title', METADATA_STANDARD_TITLE)
+        self.character_string('cit:edition', METADATA_STANDARD_EDITION)
+        self.end('cit:CI_Citation')
+        self.end('mdb:metadataStandard')
+
+        self.start('mdb:identificationInfo')
+        self.start('mri:MD_DataIdentification')
+        self.start('mri:citation')
+        self.start('cit:CI_Citation')
+        self.character_string('cit:title', item.title)
+        self.end('cit:CI_Citation')
+        self.end('mri:citation')
+        if item.abstract:
+            self.character_string('mri:abstract', item.abstract)
+        if item.purpose:
+            self.character_string('mri:purpose', item.purpose)
+        if item.credit:
+            self.character_string('mri:credit', item.credit)
+        if item.keywords:
+            self.start('mri:descriptiveKeywords')
+            self.start('mri:MD_Keywords')
+            for keyword in item.keywords:
+                self.character_string('mri:keyword', keyword)
+            self.end('mri:MD_Keywords')
+            self.end('mri:descriptiveKeywords')
+        self.empty('mri:defaultLocale', MISSING)
+        self.end('mri:MD_DataIdentification')
+        self.end('mdb:identificationInfo')
+        self.xml.endElement('mdb:MD_Metadata')
+
+
+def write_metadata(output_path, feature_classes):
+    """ Streams the combined database and layer metadata document
+    :param output_path      Path of the .xml document to create
+    :param feature_classes  FeatureClass objects of the template layers
+    :returns:               Number of layer metadata documents written
+    """
+    tmp_path = f'{output_path}.tmp'
+    count = 0
+    with open(tmp_path, 'wb') as stream:
+        writer = MetadataWriter(stream)
+        writer.start_document()
+        writer.write_database(database_metadata())
+        for fc in feature_classes:
+            writer.write_layer(fc.name, layer_metadata(fc))
+            count += 1
+        writer.end_document()
+    os.replace(tmp_path, output_path)
+    return count